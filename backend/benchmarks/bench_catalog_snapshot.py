@@ -0,0 +1,68 @@
+"""Benchmark columnar catalog snapshot queries and memory against a list of product dicts.
+
+Run from the backend directory:
+    python -m benchmarks.bench_catalog_snapshot --products 1000000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+from benchmarks.generate_catalog import product_batches
+from benchmarks.vocabulary import CATEGORIES
+from services.catalog_snapshot import PROJECTION, CatalogSnapshot
+
+QUERIES = {
+    "category": dict(categories=[CATEGORIES[0]]),
+    "price range": dict(min_price=200, max_price=800),
+    "3 categories, in stock, price range": dict(categories=CATEGORIES[:3], in_stock=True, min_price=100, max_price=2000),
+    "sort by discount": dict(sort="discount"),
+    "in stock, 20%+ off, by discount": dict(in_stock=True, min_discount=20, sort="discount"),
+    "category, by price desc": dict(categories=[CATEGORIES[1]], sort="price_desc"),
+}
+
+def median_ms(run, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return 1000 * float(np.median(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    now = datetime.utcnow()
+    tracemalloc.start()
+    products = [
+        {field: product.get(field) for field in PROJECTION if field != "_id"}
+        for batch in product_batches(args.products, 10_000, rng, now) for product in batch
+    ]
+    dicts_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    snapshot = CatalogSnapshot()
+    started = time.perf_counter()
+    for start in range(0, len(products), 5000):
+        snapshot.add(products[start:start + 5000])
+    asyncio.run(snapshot.compact())
+    build = time.perf_counter() - started
+    del products
+    stats = snapshot.stats()
+
+    print(f"{len(snapshot):,} products: snapshot built and compacted in {build:.1f}s")
+    print(f"  memory: {stats['column_bytes'] / 2**20:,.0f} MiB of columns and sort orders "
+          f"vs {dicts_bytes / 2**20:,.0f} MiB as projected dicts")
+    print(f"  median of {args.repeats} runs, one page of 50 plus facets:")
+    for name, query in QUERIES.items():
+        browse_ms = median_ms(lambda: snapshot.browse(**query, limit=50), args.repeats)
+        _, total, _ = snapshot.browse(**query, limit=50)
+        print(f"  {name:40s} {total:>9,} matches  {browse_ms:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Benchmark mission progress planning throughput over synthetic cart and order events.
+
+Run from the backend directory:
+    python -m benchmarks.bench_missions --events 200000
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+from benchmarks.vocabulary import synthetic_products
+from services.missions import plan_updates
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    products = {product["id"]: product for product in synthetic_products(args.products)}
+    product_ids = list(products)
+    missions = {"snacks": ["mission-1"], "brands": ["mission-2", "mission-4"], "categories": ["mission-3"]}
+    now = datetime.utcnow()
+    batch_events = [
+        (f"user-{rng.randrange(args.users)}", rng.sample(product_ids, rng.choice([1, 1, 1, 3, 6])), now)
+        for _ in range(args.events)
+    ]
+
+    # Carry `seen` forward between batches the way the progress documents would
+    seen = {}
+    writes = 0
+    elapsed = 0.0
+    for start in range(0, len(batch_events), args.batch_size):
+        batch = batch_events[start:start + args.batch_size]
+        started = time.perf_counter()
+        updates = plan_updates(batch, products, seen, missions)
+        elapsed += time.perf_counter() - started
+        writes += len(updates)
+        for user_id, update in updates.items():
+            user_seen = seen.setdefault(user_id, {})
+            for field, values in update._doc["$addToSet"].items():
+                user_seen.setdefault(field.split(".", 1)[1], []).extend(values["$each"])
+    print(f"Planned {args.events:,} events in {elapsed:.2f}s ({args.events / elapsed:,.0f} events/s); "
+          f"{writes:,} user writes in {-(-args.events // args.batch_size):,} bulk_writes "
+          f"({args.events / max(writes, 1):.1f} events per write)")
+
+if __name__ == "__main__":
+    main()
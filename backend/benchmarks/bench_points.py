@@ -0,0 +1,62 @@
+"""Benchmark loyalty point writes with and without write-behind coalescing.
+
+Needs a MongoDB server; writes to a scratch database that is dropped afterwards.
+Run from the backend directory:
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_points --events 20000 --users 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+async def run(args):
+    os.environ["DB_NAME"] = args.db  # before the database module binds its collections
+    from database import client, ensure_indexes, users_collection
+    from services.points import PointsLedger
+
+    await client.drop_database(args.db)
+    await ensure_indexes()
+    user_ids = [f"user-{i}" for i in range(args.users)]
+    await users_collection.insert_many([{"id": user_id, "points": 0} for user_id in user_ids])
+
+    async def drive(write):
+        """Issue args.events writes round-robin over the users from args.concurrency workers"""
+        async def worker(offset):
+            for i in range(offset, args.events, args.concurrency):
+                await write(user_ids[i % len(user_ids)])
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(offset) for offset in range(args.concurrency)))
+        return time.perf_counter() - started
+
+    elapsed = await drive(lambda user_id: users_collection.update_one({"id": user_id}, {"$inc": {"points": 1}}))
+    print(f"Direct $inc:    {args.events / elapsed:9,.0f} events/s, {args.events:,} user-document writes")
+
+    ledger = PointsLedger(max_entries=args.flush_entries)
+    flusher = asyncio.create_task(ledger.run(args.flush_seconds))
+    try:
+        started = time.perf_counter()
+        await drive(lambda user_id: ledger.add(user_id, 1, reason="bench"))
+        await ledger.flush()  # count the time until every point is on a user document
+        elapsed = time.perf_counter() - started
+    finally:
+        flusher.cancel()
+    print(f"Ledger + flush: {args.events / elapsed:9,.0f} events/s, {ledger.ledger_writes:,} ledger inserts, "
+          f"{ledger.flushes:,} flushes, at most {ledger.flushes * args.users:,} user-document writes")
+
+    expected = 2 * args.events
+    actual = sum([user["points"] async for user in users_collection.find({}, {"points": 1})])
+    print(f"Points applied: {actual:,} of {expected:,}")
+    await client.drop_database(args.db)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=50, help="hot users the events are spread over")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--flush-entries", type=int, default=500)
+    parser.add_argument("--flush-seconds", type=float, default=1.0)
+    parser.add_argument("--db", default="bench_points")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
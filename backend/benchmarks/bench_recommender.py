@@ -0,0 +1,62 @@
+"""Benchmark the co-purchase recommender build and queries over synthetic orders.
+
+Run from the backend directory:
+    python -m benchmarks.bench_recommender --orders 1000000
+"""
+import argparse
+import time
+import numpy as np
+from services.recommender import CoPurchaseRecommender
+
+def synthetic_baskets(count: int, products: int, seed: int = 7):
+    """Baskets of 1-12 products drawn from a Zipf-like popularity curve"""
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, products + 1) ** 0.8
+    popularity /= popularity.sum()
+    sizes = np.clip(rng.geometric(0.3, size=count), 1, 12)
+    items = rng.choice(products, size=int(sizes.sum()), p=popularity)
+    ids = np.array([f"prod-{i}" for i in range(products)], dtype=object)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    for i in range(count):
+        yield list(ids[items[offsets[i]:offsets[i + 1]]])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    baskets = list(synthetic_baskets(args.orders, args.products))
+    model = CoPurchaseRecommender(merge_threshold=2 ** 62)
+    started = time.perf_counter()
+    for start in range(0, len(baskets), 20000):
+        model.add_baskets(baskets[start:start + 20000])
+    counted = time.perf_counter() - started
+    model.merge()
+    built = time.perf_counter() - started
+    print(f"Built from {args.orders:,} orders in {built:.1f}s "
+          f"(pair counting {counted:.1f}s, CSR merge {built - counted:.1f}s): "
+          f"{len(model):,} products, {model.nnz:,} non-zeros")
+
+    model.merge_threshold = 200_000
+    incremental = list(synthetic_baskets(10_000, args.products, seed=11))
+    started = time.perf_counter()
+    for basket in incremental:
+        model.add_baskets([basket])
+    elapsed = time.perf_counter() - started
+    print(f"Incremental: {len(incremental):,} single-order updates in {elapsed:.2f}s "
+          f"({elapsed / len(incremental) * 1e6:.0f} µs/order, {model._pending_pairs:,} pairs pending)")
+
+    rng = np.random.default_rng(3)
+    timings = []
+    for _ in range(args.queries):
+        recent = [f"prod-{i}" for i in rng.integers(0, args.products, size=rng.integers(1, 15))]
+        started = time.perf_counter()
+        model.recommend(recent, k=10)
+        timings.append((time.perf_counter() - started) * 1000)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    print(f"Query (1-14 recent items, k=10): p50 {p50:.2f} ms  p95 {p95:.2f} ms  p99 {p99:.2f} ms")
+
+if __name__ == "__main__":
+    main()
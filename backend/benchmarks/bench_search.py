@@ -0,0 +1,50 @@
+"""Benchmark the in-memory product search index over a synthetic catalog.
+
+Run from the backend directory:
+    python -m benchmarks.bench_search --products 500000
+"""
+import argparse
+import time
+import numpy as np
+from benchmarks.vocabulary import synthetic_products
+from services.search import ProductSearchIndex
+
+def time_queries(index: ProductSearchIndex, queries, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, limit=20)
+            timings.append((time.perf_counter() - started) * 1000)
+    return np.percentile(timings, [50, 95, 99])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    index = ProductSearchIndex()
+    started = time.perf_counter()
+    index.add_many(synthetic_products(args.products))
+    print(f"Indexed {args.products:,} products in {time.perf_counter() - started:.1f}s")
+
+    workloads = {
+        "single rare term": ["neckband", "planner", "detergent"],
+        "multi term": ["organic rice", "wireless neckband headphones", "herbal shampoo soap"],
+        "common term": ["food", "premium"],
+        "typo": ["neckbnad", "detergnet", "shampo", "headphnes"],
+    }
+    for name, queries in workloads.items():
+        p50, p95, p99 = time_queries(index, queries, args.repeat)
+        print(f"{name:>18}: p50 {p50:6.2f} ms  p95 {p95:6.2f} ms  p99 {p99:6.2f} ms")
+
+    added = 1000
+    started = time.perf_counter()
+    for product in synthetic_products(added, seed=99):
+        product["id"] += "-new"
+        index.add(product)
+    print(f"Incremental add: {(time.perf_counter() - started) * 1000 / added:.3f} ms per product")
+
+if __name__ == "__main__":
+    main()
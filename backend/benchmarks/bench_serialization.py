@@ -0,0 +1,59 @@
+"""Benchmark list-response serialization: validated models vs the trusted row path.
+
+Run from the backend directory:
+    python -m benchmarks.bench_serialization --products 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from benchmarks.vocabulary import synthetic_products
+from models import Product
+from serialization import RowSerializer, dumps
+
+def best_of(repeats: int, run) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime.utcnow().replace(microsecond=123000)  # Mongo keeps milliseconds
+    documents = [
+        {**product, "original_price": None, "in_stock": True, "created_at": now - timedelta(minutes=i)}
+        for i, product in enumerate(synthetic_products(args.products))
+    ]
+    field = create_response_field(name="Response", type_=List[Product])
+    loop = asyncio.new_event_loop()
+    rows = RowSerializer(Product)
+
+    def validated():
+        # What a route returning [Product(**doc)] with response_model=List[Product] does
+        products = [Product(**document) for document in documents]
+        content = loop.run_until_complete(serialize_response(field=field, response_content=products))
+        return JSONResponse(content).body
+
+    def trusted():
+        return dumps(rows.many(documents))
+
+    assert json.loads(validated()) == json.loads(trusted()), "serialized payloads differ"
+    baseline = best_of(args.repeats, validated)
+    fast = best_of(args.repeats, trusted)
+    print(f"{args.products:,} products, best of {args.repeats}:")
+    print(f"  validated models + JSONResponse  {baseline * 1000:8.1f} ms")
+    print(f"  RowSerializer + orjson           {fast * 1000:8.1f} ms  ({baseline / fast:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
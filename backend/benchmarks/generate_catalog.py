@@ -0,0 +1,161 @@
+"""Fill a database with a synthetic catalog, users and carts for load tests.
+
+Uses MONGO_URL and DB_NAME like the server. Run from the backend directory:
+    python -m benchmarks.generate_catalog --products 1000000 --users 100000 --cart-rows 10000000 --drop
+
+--drop empties the target collections first (destructive!) so the bulk load
+runs without secondary indexes; they are rebuilt once at the end.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+import numpy as np
+from benchmarks.vocabulary import ADJECTIVES, CATEGORIES, NOUNS
+from database import cart_items_collection, ensure_indexes, products_collection, users_collection
+
+CITIES = ["Chennai", "Mumbai", "Delhi", "Bengaluru", "Hyderabad", "Kolkata", "Pune", "Ahmedabad",
+          "Jaipur", "Lucknow", "Kochi", "Coimbatore", "Indore", "Bhopal", "Nagpur", "Surat"]
+FIRST_NAMES = ["Raj", "Priya", "Arjun", "Ananya", "Vikram", "Meera", "Karthik", "Divya", "Rohan", "Sneha",
+               "Aditya", "Kavya", "Rahul", "Pooja", "Siddharth", "Lakshmi"]
+IMAGE = "https://images.unsplash.com/photo-1555939594-58d7cb561ad1?w=200&h=150&fit=crop"
+
+def product_batches(count: int, batch_size: int, rng: np.random.Generator, now: datetime):
+    brands = ["".join(rng.choice(list("bcdfghklmnprstvz")) + rng.choice(list("aeiou")) for _ in range(3)).title()
+              for _ in range(5000)]
+    for start in range(0, count, batch_size):
+        n = min(batch_size, count - start)
+        # Log-normal prices (median around ₹300); 40% of products carry a discount
+        prices = np.clip(rng.lognormal(5.7, 1.0, n), 10, 50000).astype(int)
+        discounted = rng.random(n) < 0.4
+        originals = np.where(discounted, (prices * rng.uniform(1.1, 1.6, n)).astype(int), 0)
+        brand = rng.integers(len(brands), size=n)
+        adjective, noun = rng.integers(len(ADJECTIVES), size=n), rng.integers(len(NOUNS), size=n)
+        category = rng.integers(len(CATEGORIES), size=n)
+        in_stock = rng.random(n) < 0.95
+        age = rng.integers(0, 365 * 24 * 3600, size=n)
+        yield [
+            {
+                "id": f"gen-prod-{start + i}",
+                "name": f"{brands[brand[i]]} {ADJECTIVES[adjective[i]].title()} {NOUNS[noun[i]].title()}",
+                "price": int(prices[i]),
+                "original_price": int(originals[i]) if discounted[i] else None,
+                "image": IMAGE,
+                "category": CATEGORIES[category[i]],
+                "description": f"{ADJECTIVES[adjective[i]]} {NOUNS[noun[i]]} by {brands[brand[i]]}",
+                "in_stock": bool(in_stock[i]),
+                "created_at": now - timedelta(seconds=int(age[i])),
+            }
+            for i in range(n)
+        ]
+
+def user_batches(count: int, batch_size: int, rng: np.random.Generator, now: datetime):
+    for start in range(0, count, batch_size):
+        n = min(batch_size, count - start)
+        names, cities = rng.integers(len(FIRST_NAMES), size=n), rng.integers(len(CITIES), size=n)
+        points = rng.integers(0, 10000, size=n)
+        yield [
+            {
+                "id": f"gen-user-{start + i}",
+                "name": FIRST_NAMES[names[i]],
+                "location": CITIES[cities[i]],
+                "points": int(points[i]),
+                "savings_this_month": int(points[i] // 3),
+                "created_at": now,
+            }
+            for i in range(n)
+        ]
+
+def cart_batches(rows: int, users: int, products: int, batch_size: int, rng: np.random.Generator, now: datetime):
+    """About `rows` cart rows: users in order, each with distinct products drawn by Zipf-like popularity"""
+    popularity = 1.0 / np.arange(1, products + 1) ** 0.7
+    cumulative = np.cumsum(popularity / popularity.sum())
+    per_user = rows / users
+    block = max(1, int(batch_size / per_user))
+    emitted = 0
+    for first_user in range(0, users, block):
+        if emitted >= rows:
+            break
+        user_ids = np.arange(first_user, min(first_user + block, users))
+        user = np.repeat(user_ids, rng.poisson(per_user, size=len(user_ids)))
+        product = np.minimum(np.searchsorted(cumulative, rng.random(len(user))), products - 1)
+        # Users never span blocks, so deduplicating within the block keeps (user, product) unique overall
+        keys = np.unique(user.astype(np.int64) * products + product)[:rows - emitted]
+        user, product = keys // products, keys % products
+        quantity = rng.integers(1, 4, size=len(keys))
+        yield [
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": f"gen-user-{user[j]}",
+                "product_id": f"gen-prod-{product[j]}",
+                "product_name": f"Product {product[j]}",
+                "price": int(50 + product[j] % 2000),
+                "image": IMAGE,
+                "quantity": int(quantity[j]),
+                "added_at": now,
+            }
+            for j in range(len(keys))
+        ]
+        emitted += len(keys)
+
+async def load(collection, batches, concurrency: int) -> int:
+    """insert_many every batch, keeping up to `concurrency` batches in flight; returns documents inserted"""
+    inserted = 0
+    errors = 0
+    in_flight = set()
+
+    async def insert(batch):
+        nonlocal inserted, errors
+        try:
+            result = await collection.insert_many(batch, ordered=False)
+            inserted += len(result.inserted_ids)
+        except Exception as e:  # BulkWriteError: duplicates from an earlier run without --drop
+            details = getattr(e, "details", {}) or {}
+            inserted += details.get("nInserted", 0)
+            errors += len(details.get("writeErrors", [])) or len(batch)
+
+    started = time.perf_counter()
+    for batch in batches:
+        if len(in_flight) >= concurrency:
+            _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        in_flight.add(asyncio.create_task(insert(batch)))
+        await asyncio.sleep(0)  # let finished inserts report while we generate the next batch
+    if in_flight:
+        await asyncio.wait(in_flight)
+    elapsed = time.perf_counter() - started
+    print(f"{collection.name}: {inserted:,} documents in {elapsed:.1f}s "
+          f"({inserted / elapsed:,.0f} docs/s){f', {errors:,} rejected' if errors else ''}")
+    return inserted
+
+async def run(args):
+    rng = np.random.default_rng(args.seed)
+    now = datetime.utcnow()
+    targets = [products_collection, users_collection, cart_items_collection]
+    if args.drop:
+        await asyncio.gather(*(collection.drop() for collection in targets))
+
+    await load(products_collection, product_batches(args.products, args.batch_size, rng, now), args.concurrency)
+    await load(users_collection, user_batches(args.users, args.batch_size, rng, now), args.concurrency)
+    if args.cart_rows:
+        await load(cart_items_collection,
+                   cart_batches(args.cart_rows, args.users, args.products, args.batch_size, rng, now),
+                   args.concurrency)
+
+    started = time.perf_counter()
+    await ensure_indexes()
+    print(f"Indexes ensured in {time.perf_counter() - started:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--cart-rows", type=int, default=10_000_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=8, help="insert_many batches in flight")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="drop products, users and cart_items first")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
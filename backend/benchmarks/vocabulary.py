@@ -0,0 +1,25 @@
+"""Word lists and an in-memory product generator shared by the synthetic catalog benchmarks"""
+
+import random
+
+CATEGORIES = ["food", "electronics", "beauty", "home", "baby", "stationery", "sports", "grocery"]
+ADJECTIVES = ["organic", "premium", "wireless", "fresh", "classic", "compact", "natural", "deluxe",
+              "smart", "eco", "ultra", "family", "instant", "herbal", "portable", "spicy"]
+NOUNS = ["noodles", "neckband", "facewash", "notebook", "detergent", "shampoo", "charger", "rice",
+         "biscuits", "headphones", "diapers", "planner", "bottle", "speaker", "soap", "coffee"]
+
+def synthetic_products(count: int, seed: int = 7):
+    """Deterministic product dicts for benchmarks that don't touch Mongo"""
+    rng = random.Random(seed)
+    # A long tail of made-up brand words gives the vocabulary a realistic size
+    brands = ["".join(rng.choice("bcdfghklmnprstvz") + rng.choice("aeiou") for _ in range(3)) for _ in range(20000)]
+    for i in range(count):
+        name = f"{rng.choice(brands)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.randint(1, 5)}kg"
+        yield {
+            "id": f"prod-{i}",
+            "name": name.title(),
+            "price": rng.randint(20, 5000),
+            "image": "",
+            "category": rng.choice(CATEGORIES),
+            "description": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} from {rng.choice(brands)}",
+        }
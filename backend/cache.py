@@ -0,0 +1,117 @@
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import os
+import time
+
+class TTLCache:
+    """LRU cache whose entries expire after `ttl` seconds.
+
+    Entries live in namespaces so a write can drop exactly the queries it affects.
+    Each invalidation bumps the namespace's generation, so a load that started
+    before the write can't store its (possibly stale) result afterwards.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (namespace, key) -> (expires_at, value)
+        self._namespaces = defaultdict(set)  # namespace -> keys currently cached
+        self._generations = defaultdict(int)  # namespace -> invalidations so far
+        self._counters = defaultdict(lambda: {"hits": 0, "misses": 0, "invalidations": 0, "stale_loads": 0})
+        self.evictions = 0
+
+    def get(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get((namespace, key))
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(namespace, key)
+            self._counters[namespace]["misses"] += 1
+            return default
+        self._entries.move_to_end((namespace, key))
+        self._counters[namespace]["hits"] += 1
+        return entry[1]
+
+    def generation(self, namespace: str) -> int:
+        """Token to pass to set() for a value loaded after this call"""
+        return self._generations[namespace]
+
+    def set(self, namespace: str, key: Hashable, value: Any, generation: Optional[int] = None):
+        """Cache value, unless `generation` is given and the namespace was invalidated since"""
+        if generation is not None and generation != self._generations[namespace]:
+            self._counters[namespace]["stale_loads"] += 1
+            return
+        self._entries[(namespace, key)] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end((namespace, key))
+        self._namespaces[namespace].add(key)
+        while len(self._entries) > self.max_entries:
+            (old_namespace, old_key), _ = self._entries.popitem(last=False)
+            self._namespaces[old_namespace].discard(old_key)
+            self.evictions += 1
+
+    async def get_or_load(self, namespace: str, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value, or await loader() and cache its result"""
+        sentinel = object()
+        value = self.get(namespace, key, sentinel)
+        if value is sentinel:
+            generation = self._generations[namespace]
+            value = await loader()
+            self.set(namespace, key, value, generation)
+        return value
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            self._generations[namespace] += 1
+            for key in self._namespaces.pop(namespace, set()):
+                self._entries.pop((namespace, key), None)
+            self._counters[namespace]["invalidations"] += 1
+
+    def _remove(self, namespace: str, key: Hashable):
+        self._entries.pop((namespace, key), None)
+        self._namespaces[namespace].discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(counter["hits"] for counter in self._counters.values())
+        misses = sum(counter["misses"] for counter in self._counters.values())
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "evictions": self.evictions,
+            "namespaces": {
+                namespace: {**counter, "entries": len(self._namespaces.get(namespace, ()))}
+                for namespace, counter in self._counters.items()
+            },
+        }
+
+class SingleFlight:
+    """Coalesce concurrent loads with the same key into one in-flight call"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(loader())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one cancelled waiter doesn't cancel the load for the others
+        return await asyncio.shield(future)
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+# Shared cache for products, bundles, meal plans and smart tips
+catalog_cache = TTLCache(
+    max_entries=int(os.environ.get("CATALOG_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.environ.get("CATALOG_CACHE_TTL_SECONDS", "60")),
+)
@@ -1,12 +1,132 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, monitoring
+from pymongo.errors import OperationFailure
+from typing import Optional
+import asyncio
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from metrics import mongo_command_metrics, registry
 
 load_dotenv()
 
-# MongoDB connection
+logger = logging.getLogger(__name__)
+
+# The one MongoDB client for the process; every module imports its collections from here.
+# Pool settings come from the environment so they can be tuned per deployment.
+MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "100"))
+MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "10"))
+MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "60000"))
+WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+# zlib ships with Python; add zstd or snappy here once their libraries are installed
+COMPRESSORS = os.environ.get("MONGO_COMPRESSORS", "zlib")
+
+registry.describe("mongo_pool_connections", "gauge", "Pooled MongoDB connections by state")
+registry.describe("mongo_pool_checkout_wait_seconds", "histogram", "Time spent waiting to check out a pooled connection")
+registry.describe("mongo_pool_checkout_failures_total", "counter", "Failed connection checkouts by reason")
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool gauges and checkout-wait times, summed over all servers.
+
+    pymongo checks connections out on Motor's executor threads, and a checkout's
+    started and finished events fire on the same thread, so the start time is
+    kept in a thread-local.
+    """
+
+    def __init__(self):
+        self._started = threading.local()
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _adjust(self, **deltas):
+        with self._lock:
+            for field, delta in deltas.items():
+                setattr(self, field, getattr(self, field) + delta)
+        for field, delta in deltas.items():
+            registry.add_gauge("mongo_pool_connections", (("state", field),), delta)
+
+    def connection_check_out_started(self, event):
+        self._started.at = time.perf_counter()
+        self._adjust(waiting=1)
+
+    def connection_checked_out(self, event):
+        wait = time.perf_counter() - getattr(self._started, "at", time.perf_counter())
+        self._adjust(waiting=-1, in_use=1)
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        registry.observe("mongo_pool_checkout_wait_seconds", (), wait)
+
+    def connection_check_out_failed(self, event):
+        self._adjust(waiting=-1)
+        with self._lock:
+            self.failures += 1
+        registry.inc("mongo_pool_checkout_failures_total", (("reason", str(event.reason)),))
+
+    def connection_checked_in(self, event):
+        self._adjust(in_use=-1)
+
+    def connection_created(self, event):
+        self._adjust(open=1)
+
+    def connection_closed(self, event):
+        self._adjust(open=-1)
+
+    # Lifecycle events carry nothing we report
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_pool_size": MAX_POOL_SIZE,
+                "open": self.open,
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "saturation": round(self.in_use / MAX_POOL_SIZE, 3),
+                "checkouts": self.checkouts,
+                "checkout_failures": self.failures,
+                "avg_checkout_wait_ms": round(1000 * self.wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_checkout_wait_ms": round(1000 * self.wait_max, 3),
+            }
+
+pool_stats = PoolStats()
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=MAX_POOL_SIZE,
+    minPoolSize=MIN_POOL_SIZE,
+    maxIdleTimeMS=MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=CONNECT_TIMEOUT_MS,
+    compressors=COMPRESSORS,
+    event_listeners=[mongo_command_metrics, pool_stats],
+)
 db = client[os.environ['DB_NAME']]
 
 # Collections
@@ -18,186 +138,147 @@ loyalty_missions_collection = db.loyalty_missions
 meal_plans_collection = db.meal_plans
 refill_alerts_collection = db.refill_alerts
 smart_tips_collection = db.smart_tips
+orders_collection = db.orders
+mission_progress_collection = db.mission_progress
+points_ledger_collection = db.points_ledger
+locks_collection = db.locks
+roulette_config_collection = db.roulette_config
+roulette_spins_collection = db.roulette_spins
+roulette_limits_collection = db.roulette_limits
+job_state_collection = db.job_state
 
-async def init_sample_data():
-    """Initialize the database with sample data"""
-    
-    # Check if data already exists
-    if await products_collection.count_documents({}) > 0:
-        return
-    
-    # Sample Products
-    sample_products = [
-        {
-            "id": "prod-1",
-            "name": "Masala Maggi",
-            "price": 120,
-            "original_price": 150,
-            "image": "https://images.unsplash.com/photo-1555939594-58d7cb561ad1?w=200&h=150&fit=crop",
-            "category": "food",
-            "description": "Delicious instant noodles"
-        },
-        {
-            "id": "prod-2", 
-            "name": "Bluetooth Neckband",
-            "price": 799,
-            "original_price": 999,
-            "image": "https://images.unsplash.com/photo-1484704849700-f032a568e944?w=200&h=150&fit=crop",
-            "category": "electronics",
-            "description": "High quality wireless neckband"
-        },
-        {
-            "id": "prod-3",
-            "name": "Organic Face Wash", 
-            "price": 299,
-            "original_price": 349,
-            "image": "https://images.unsplash.com/photo-1556228720-195a672e8a03?w=200&h=150&fit=crop",
-            "category": "beauty",
-            "description": "Natural organic face wash"
-        }
-    ]
-    
-    # Sample Bundles
-    sample_bundles = [
-        {
-            "id": "bundle-1",
-            "name": "Healthy Breakfast Pack",
-            "price": 399,
-            "original_price": 459,
-            "savings": 60,
-            "items_count": 5,
-            "image": "https://images.unsplash.com/photo-1551782450-a2132b4ba21d?w=300&h=200&fit=crop",
-            "product_ids": ["prod-1", "prod-3"]
-        },
-        {
-            "id": "bundle-2",
-            "name": "Rainy Day Essentials", 
-            "price": 599,
-            "original_price": 699,
-            "savings": 100,
-            "items_count": 7,
-            "image": "https://images.unsplash.com/photo-1544551763-46a013bb70d5?w=300&h=200&fit=crop",
-            "product_ids": ["prod-2", "prod-3"]
-        },
-        {
-            "id": "bundle-3",
-            "name": "Back-to-College Kit",
-            "price": 899, 
-            "original_price": 1099,
-            "savings": 200,
-            "items_count": 8,
-            "image": "https://images.unsplash.com/photo-1481627834876-b7833e8f5570?w=300&h=200&fit=crop",
-            "product_ids": ["prod-1", "prod-2"]
-        }
-    ]
-    
-    # Sample User
-    sample_user = {
-        "id": "user-1",
-        "name": "Raj",
-        "location": "Chennai", 
-        "points": 2450,
-        "savings_this_month": 1320
-    }
-    
-    # Sample Loyalty Missions
-    sample_missions = [
-        {
-            "id": "mission-1",
-            "title": "Buy 2 new snacks",
-            "reward": "+100 points",
-            "progress": 0,
-            "target": 2,
-            "mission_type": "snacks",
-            "active": True
-        },
-        {
-            "id": "mission-2",
-            "title": "Try 1 new brand", 
-            "reward": "Cashback unlocked",
-            "progress": 0,
-            "target": 1,
-            "mission_type": "brands",
-            "active": True
-        },
-        {
-            "id": "mission-3",
-            "title": "Buy from 3 different categories",
-            "reward": "Spin unlocked", 
-            "progress": 1,
-            "target": 3,
-            "mission_type": "categories",
-            "active": True
-        }
-    ]
-    
-    # Sample Meal Plans
-    sample_meal_plans = [
-        {
-            "id": "meal-1",
-            "goal_type": "Weight Loss",
-            "monday": ["Oats", "Grilled Chicken Salad", "Green Tea"],
-            "tuesday": ["Smoothie Bowl", "Quinoa Bowl", "Herbal Tea"],
-            "wednesday": ["Avocado Toast", "Fish Curry", "Lemon Water"],
-            "thursday": ["Protein Shake", "Veggie Wrap", "Green Tea"],
-            "friday": ["Greek Yogurt", "Chicken Breast", "Herbal Tea"],
-            "saturday": ["Oatmeal", "Tuna Salad", "Green Tea"],
-            "sunday": ["Smoothie", "Grilled Fish", "Lemon Water"],
-            "estimated_cost": 450,
-            "calories_per_day": 1200
-        },
-        {
-            "id": "meal-2", 
-            "goal_type": "Family Dinners",
-            "monday": ["Pancakes", "Veg Biryani", "Milk"],
-            "tuesday": ["Poha", "Dal Chawal", "Lassi"],
-            "wednesday": ["Sandwich", "Chicken Curry", "Chai"],
-            "thursday": ["Paratha", "Mixed Vegetables", "Milk"],
-            "friday": ["Dosa", "Sambar Rice", "Buttermilk"],
-            "saturday": ["Idli", "Chole Bhature", "Lassi"],
-            "sunday": ["Upma", "Biryani", "Chai"],
-            "estimated_cost": 680,
-            "calories_per_day": 1800
-        },
-        {
-            "id": "meal-3",
-            "goal_type": "High Protein",
-            "monday": ["Protein Shake", "Grilled Fish", "Nuts"],
-            "tuesday": ["Egg Sandwich", "Chicken Breast", "Protein Bar"],
-            "wednesday": ["Greek Yogurt", "Lentil Curry", "Almonds"],
-            "thursday": ["Protein Smoothie", "Tofu Stir Fry", "Protein Bar"],
-            "friday": ["Egg Omelette", "Fish Curry", "Mixed Nuts"],
-            "saturday": ["Protein Pancakes", "Chicken Salad", "Protein Shake"],
-            "sunday": ["Greek Yogurt", "Grilled Chicken", "Almonds"],
-            "estimated_cost": 520,
-            "calories_per_day": 1600
-        }
-    ]
-    
-    # Sample Smart Tips
-    sample_smart_tips = [
-        {
-            "id": "tip-1",
-            "title": "Switch to Walmart brand detergent",
-            "savings": "₹75/month",
-            "image": "https://images.unsplash.com/photo-1556909114-f6e7ad7d3136?w=200&h=150&fit=crop",
-            "active": True
-        },
-        {
-            "id": "tip-2",
-            "title": "Buy groceries in bulk",
-            "savings": "₹120/month",
-            "image": "https://images.unsplash.com/photo-1542838132-92c53300491e?w=200&h=150&fit=crop", 
-            "active": True
+# Index registry: every collection's indexes, declared next to its handle.
+# Names are fixed so ensure_indexes() stays idempotent across restarts.
+# Filtered list endpoints page by `id` (see pagination.py), so their indexes end in `id`.
+def _unique_id_index():
+    return IndexModel([("id", ASCENDING)], name="id_unique", unique=True, background=True)
+
+INDEXES = {
+    users_collection.name: [
+        _unique_id_index(),
+    ],
+    products_collection.name: [
+        _unique_id_index(),
+        IndexModel([("category", ASCENDING), ("id", ASCENDING)], name="category_id", background=True),
+        # Price-range listings page on (price, id), see get_products
+        IndexModel([("price", ASCENDING), ("id", ASCENDING)], name="price_id", background=True),
+        IndexModel(
+            [("category", ASCENDING), ("price", ASCENDING), ("id", ASCENDING)], name="category_price_id", background=True
+        ),
+        IndexModel([("created_at", ASCENDING)], name="created_at", background=True),
+    ],
+    bundles_collection.name: [
+        _unique_id_index(),
+    ],
+    cart_items_collection.name: [
+        _unique_id_index(),
+        IndexModel(
+            [("user_id", ASCENDING), ("product_id", ASCENDING)],
+            name="user_product_unique", unique=True, background=True
+        ),
+    ],
+    loyalty_missions_collection.name: [
+        _unique_id_index(),
+        IndexModel([("active", ASCENDING), ("id", ASCENDING)], name="active_id", background=True),
+    ],
+    meal_plans_collection.name: [
+        _unique_id_index(),
+        IndexModel([("goal_type", ASCENDING)], name="goal_type", background=True),
+    ],
+    refill_alerts_collection.name: [
+        _unique_id_index(),
+        IndexModel(
+            [("user_id", ASCENDING), ("active", ASCENDING), ("id", ASCENDING)],
+            name="user_active_id", background=True
+        ),
+    ],
+    smart_tips_collection.name: [
+        _unique_id_index(),
+        IndexModel([("active", ASCENDING), ("id", ASCENDING)], name="active_id", background=True),
+    ],
+    orders_collection.name: [
+        _unique_id_index(),
+        IndexModel(
+            [("user_id", ASCENDING), ("idempotency_key", ASCENDING)],
+            name="user_idempotency_key_unique", unique=True, background=True,
+            partialFilterExpression={"idempotency_key": {"$type": "string"}}
+        ),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created_at", background=True),
+        # Incremental consumers (recommender, refill predictor) scan orders newer than a watermark
+        IndexModel([("created_at", ASCENDING)], name="created_at", background=True),
+    ],
+    job_state_collection.name: [_unique_id_index()],
+    mission_progress_collection.name: [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True, background=True),
+    ],
+    points_ledger_collection.name: [
+        _unique_id_index(),
+        # Only unapplied entries are ever looked up by flush, so the index stays small
+        IndexModel(
+            [("flush_id", ASCENDING), ("created_at", ASCENDING)],
+            name="unapplied_flush_id", background=True, partialFilterExpression={"applied": False}
+        ),
+    ],
+    roulette_config_collection.name: [_unique_id_index()],
+    locks_collection.name: [_unique_id_index()],
+    roulette_spins_collection.name: [
+        _unique_id_index(),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created_at", background=True),
+    ],
+    roulette_limits_collection.name: [
+        # One counter per user per window; the unique index is what makes the limit atomic
+        IndexModel([("user_id", ASCENDING), ("window", ASCENDING)], name="user_window_unique", unique=True, background=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0, background=True),
+    ],
+}
+
+async def ensure_indexes():
+    """Create all registered indexes (no-op for ones that already exist)"""
+    async def create(name, indexes):
+        try:
+            await db[name].create_indexes(indexes)
+        except OperationFailure as e:
+            # A conflicting definition or duplicate data must not block startup
+            logger.warning(f"Could not create indexes on {name}: {e}")
+
+    await asyncio.gather(*(create(name, indexes) for name, indexes in INDEXES.items()))
+
+async def index_report():
+    """Compare registered indexes with what exists, using $indexStats usage counters"""
+    async def collection_report(name, indexes):
+        declared = {index.document["name"] for index in indexes}
+        stats = await db[name].aggregate([{"$indexStats": {}}]).to_list(None)
+        accesses = {stat["name"]: stat["accesses"]["ops"] for stat in stats}
+        existing = set(accesses) - {"_id_"}
+        return {
+            "missing": sorted(declared - existing),
+            "unused": sorted(index for index in existing if accesses[index] == 0),
+            "undeclared": sorted(existing - declared),
+            "accesses": accesses,
         }
-    ]
-    
-    # Insert sample data
-    await products_collection.insert_many(sample_products)
-    await bundles_collection.insert_many(sample_bundles)
-    await users_collection.insert_one(sample_user)
-    await loyalty_missions_collection.insert_many(sample_missions)
-    await meal_plans_collection.insert_many(sample_meal_plans)
-    await smart_tips_collection.insert_many(sample_smart_tips)
-    
-    print("✅ Sample data initialized successfully")
\ No newline at end of file
+
+    names = list(INDEXES)
+    reports = await asyncio.gather(*(collection_report(name, INDEXES[name]) for name in names))
+    return dict(zip(names, reports))
+
+async def ping(timeout: Optional[float] = None) -> float:
+    """Round-trip a ping through the pool; returns milliseconds"""
+    started = time.perf_counter()
+    await asyncio.wait_for(client.admin.command("ping"), timeout)
+    return (time.perf_counter() - started) * 1000
+
+async def warm_up(connections: int = MIN_POOL_SIZE):
+    """Open `connections` pooled connections up front so the first requests don't pay for handshakes.
+
+    Concurrent pings each need their own connection, so the pool grows to
+    that many before startup finishes.
+    """
+    started = time.perf_counter()
+    await ping()  # fails fast with ServerSelectionTimeoutError when Mongo is unreachable
+    await asyncio.gather(*(ping() for _ in range(max(connections - 1, 0))))
+    logger.info(
+        f"MongoDB pool warmed up: {pool_stats.open} connections in {(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+
+def close():
+    client.close()
@@ -0,0 +1,29 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Event types and their payloads
+CART_ITEM_ADDED = "cart.item_added"  # user_id, product_id, quantity, at
+ORDER_PLACED = "order.placed"  # user_id, order_id, items (OrderItem dicts), at
+
+Handler = Callable[[Dict[str, Any]], None]
+_handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+def subscribe(event_type: str, handler: Handler):
+    """Register a handler; handlers run inline on the request path, so they should only enqueue"""
+    if handler not in _handlers[event_type]:
+        _handlers[event_type].append(handler)
+
+def unsubscribe(event_type: str, handler: Handler):
+    if handler in _handlers[event_type]:
+        _handlers[event_type].remove(handler)
+
+def publish(event_type: str, payload: Dict[str, Any]):
+    for handler in _handlers[event_type]:
+        try:
+            handler(payload)
+        except Exception:
+            # A broken consumer must never fail the request that produced the event
+            logger.exception(f"Handler {handler!r} failed for {event_type}")
@@ -0,0 +1,185 @@
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Sequence
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+from fastapi import Request, Response
+from pymongo import ReturnDocument
+from cache import TTLCache, catalog_cache
+from database import job_state_collection
+from pagination import NEXT_CURSOR_HEADER
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt; without it responses fall back to gzip
+    brotli = None
+
+CACHE_CONTROL = os.environ.get("CATALOG_CACHE_CONTROL", "public, max-age=10, must-revalidate")
+COMPRESS_MIN_BYTES = 512
+
+VERSIONS_JOB_ID = "catalog_versions"
+# catalog_cache namespaces built from each versioned collection
+CATALOG_CACHE_NAMESPACES = {
+    "products": ("products", "bundles_expanded", "product"),
+    "bundles": ("bundles", "bundles_expanded", "bundle"),
+    "meal_plans": ("meal_plans", "meal_plan"),
+    "smart_tips": ("smart_tips",),
+}
+
+class CollectionVersions:
+    """Per-collection counters bumped by every write handler.
+
+    A cached response is keyed by the versions of the collections it was built
+    from, so one bump retires every response that could have changed. The
+    counters live in job_state: a bump is an $inc there, seen at once by the
+    worker that wrote and by the others on their next poll (keep_fresh).
+    A rise also drops the catalog_cache namespaces built from that collection,
+    so a response rebuilt under the new version can't reuse another worker's
+    stale model and pin it in etag_cache.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._versions: Dict[str, int] = defaultdict(int)
+
+    def _merge(self, state: Optional[dict]):
+        risen = []
+        for name, version in ((state or {}).get("versions") or {}).items():
+            # Counters only grow; never step back to an older read
+            if version > self._versions[name]:
+                self._versions[name] = version
+                risen.append(name)
+        if risen:
+            catalog_cache.invalidate(*{ns for name in risen for ns in CATALOG_CACHE_NAMESPACES.get(name, ())})
+
+    async def bump(self, *collections: str):
+        try:
+            state = await self.collection.find_one_and_update(
+                {"id": VERSIONS_JOB_ID},
+                {"$inc": {f"versions.{collection}": 1 for collection in collections}},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+        except Exception as e:
+            # The write itself succeeded; at least stop this worker from serving what it replaced
+            logger.warning(f"Catalog version bump failed, dropping cached representations: {e}")
+            representation_cache.invalidate("representations")
+            etag_cache.invalidate("etags")
+            return
+        self._merge(state)
+
+    async def poll(self):
+        self._merge(await self.collection.find_one({"id": VERSIONS_JOB_ID}, {"_id": 0, "versions": 1}))
+
+    async def keep_fresh(self, interval: float):
+        """Pick up other workers' bumps every `interval` seconds"""
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning(f"Catalog version poll failed: {e}")
+            await asyncio.sleep(interval)
+
+    def get(self, collections: Sequence[str]) -> tuple:
+        return tuple(self._versions[collection] for collection in collections)
+
+class Representation:
+    """A rendered JSON body with its ETag and pre-compressed variants"""
+
+    __slots__ = ("etag", "body", "gzip", "br", "headers")
+
+    def __init__(self, body: bytes, headers: Dict[str, str]):
+        # Content only, so every worker (and restart) gives identical bodies the same tag
+        self.etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        self.body = body
+        self.headers = headers
+        large = len(body) >= COMPRESS_MIN_BYTES
+        self.gzip = gzip.compress(body, compresslevel=6, mtime=0) if large else None
+        self.br = brotli.compress(body, quality=5) if large and brotli is not None else None
+
+    def encoded(self, accept_encoding: str):
+        """Best body for the client's Accept-Encoding, with its Content-Encoding (or None)"""
+        if self.br is not None and "br" in accept_encoding:
+            return self.br, "br"
+        if self.gzip is not None and "gzip" in accept_encoding:
+            return self.gzip, "gzip"
+        return self.body, None
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 specifies for If-None-Match
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={
+        "ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"
+    })
+
+async def conditional_response(
+    request: Request,
+    collections: Sequence[str],
+    key: Hashable,
+    load: Callable[[], Awaitable[Any]],
+    paged: bool = False,
+) -> Response:
+    """Serve a catalog read with an ETag, answering If-None-Match from memory.
+
+    `collections` are the ones the response is built from; `load` builds the
+    content (an `(items, next_cursor)` pair when `paged`). A matching
+    If-None-Match gets a 304 from the ETag map, which outlives the rendered
+    bodies; while a body is cached, a mismatch gets the stored bytes. Neither
+    touches Mongo.
+    """
+    versions = catalog_versions.get(collections)
+    cache_key = (key, versions)
+    if_none_match = request.headers.get("if-none-match")
+    etag = etag_cache.get("etags", cache_key)
+    if etag is not None and _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+
+    representation = representation_cache.get("representations", cache_key)
+    if representation is None:
+        content = await load()
+        headers = {}
+        if paged:
+            content, next_cursor = content
+            if next_cursor:
+                headers[NEXT_CURSOR_HEADER] = next_cursor
+        representation = Representation(dumps(content), headers)
+        representation_cache.set("representations", cache_key, representation)
+        etag_cache.set("etags", cache_key, representation.etag)
+
+    if _etag_matches(if_none_match, representation.etag):
+        return _not_modified(representation.etag)
+
+    body, encoding = representation.encoded(request.headers.get("accept-encoding", ""))
+    headers = {
+        **representation.headers,
+        "ETag": representation.etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+catalog_versions = CollectionVersions(job_state_collection)
+
+# Rendered bodies are bigger than the models in catalog_cache, so they get their own bound
+representation_cache = TTLCache(
+    max_entries=int(os.environ.get("REPRESENTATION_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.environ.get("CATALOG_CACHE_TTL_SECONDS", "60")),
+)
+
+# ETags are tiny and stay valid until a version bump, so they are kept far longer than the bodies
+etag_cache = TTLCache(
+    max_entries=int(os.environ.get("ETAG_CACHE_MAX_ENTRIES", "20000")),
+    ttl=float(os.environ.get("ETAG_CACHE_TTL_SECONDS", "3600")),
+)
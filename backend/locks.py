@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+import logging
+import os
+import socket
+import uuid
+from pymongo.errors import DuplicateKeyError
+from database import locks_collection
+
+logger = logging.getLogger(__name__)
+
+class MongoLease:
+    """A named lock held in Mongo until released or until `ttl` runs out.
+
+    Acquiring is one upsert that only matches when the lease is free (expired
+    or already ours). While another owner holds it, the upsert collides with
+    the unique id index, so exactly one contender wins. The expiry lets a
+    crashed holder's lease lapse on its own.
+    """
+
+    def __init__(self, name: str, ttl: timedelta = timedelta(seconds=60)):
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+
+    async def acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await locks_collection.find_one_and_update(
+                {"id": self.name, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.ttl, "acquired_at": now}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        self.held = True
+        return True
+
+    async def release(self):
+        if self.held:
+            await locks_collection.delete_one({"id": self.name, "owner": self.owner})
+            self.held = False
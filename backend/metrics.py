@@ -0,0 +1,210 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+from pymongo import monitoring
+
+# Upper bounds in seconds, roughly x2 apart from 0.25ms to 30s. Fixed buckets keep every
+# histogram at a constant size however many observations it takes.
+LATENCY_BUCKETS = (
+    0.00025, 0.0005, 0.001, 0.002, 0.004, 0.008, 0.016, 0.032, 0.064, 0.128,
+    0.256, 0.512, 1.0, 2.0, 4.0, 8.0, 16.0, 30.0,
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Histogram:
+    """Fixed-bucket histogram with interpolated quantile estimates"""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate by linear interpolation inside the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Registry:
+    """Labelled counters, gauges and histograms, rendered in Prometheus text format.
+
+    Observations can come from pymongo's monitoring threads as well as the
+    event loop, so updates take one uncontended lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = defaultdict(dict)
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, labels: Labels, amount: float = 1.0):
+        with self._lock:
+            self._counters[name][labels] += amount
+
+    def add_gauge(self, name: str, labels: Labels, amount: float):
+        with self._lock:
+            self._gauges[name][labels] += amount
+
+    def observe(self, name: str, labels: Labels, value: float):
+        with self._lock:
+            histogram = self._histograms[name].get(labels)
+            if histogram is None:
+                histogram = self._histograms[name][labels] = Histogram()
+            histogram.observe(value)
+
+    @staticmethod
+    def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+        pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+        return f"{{{pairs}}}" if pairs else ""
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in self._counters.items():
+                self._header(lines, name, "counter")
+                lines.extend(f"{name}{self._format_labels(labels)} {value:g}" for labels, value in series.items())
+            for name, series in self._gauges.items():
+                self._header(lines, name, "gauge")
+                lines.extend(f"{name}{self._format_labels(labels)} {value:g}" for labels, value in series.items())
+            for name, series in self._histograms.items():
+                self._header(lines, name, "histogram")
+                for labels, histogram in series.items():
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                        cumulative += bucket_count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{self._format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+                # Precomputed percentiles for dashboards that don't run histogram_quantile()
+                quantile_name = f"{name}_quantile"
+                lines.append(f"# TYPE {quantile_name} gauge")
+                for labels, histogram in series.items():
+                    for q in QUANTILES:
+                        lines.append(
+                            f"{quantile_name}{self._format_labels(labels + (('quantile', f'{q:g}'),))} "
+                            f"{histogram.quantile(q):.6f}"
+                        )
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, default_kind: str):
+        kind, help_text = self._help.get(name, (default_kind, ""))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+registry = Registry()
+registry.describe("http_requests_total", "counter", "HTTP requests by route, method and status")
+registry.describe("http_requests_in_flight", "gauge", "HTTP requests currently being served")
+registry.describe("http_request_duration_seconds", "histogram", "HTTP request latency by route and method")
+registry.describe("mongo_commands_total", "counter", "MongoDB commands by collection, command and outcome")
+registry.describe("mongo_command_duration_seconds", "histogram", "MongoDB command latency by collection and command")
+registry.describe("mongo_command_documents_total", "counter", "Documents returned or written by MongoDB commands")
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request.
+
+    Routes are labelled by their path template (/api/products/{product_id}),
+    never the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+        in_flight = (("method", method),)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        registry.add_gauge("http_requests_in_flight", in_flight, 1)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            registry.add_gauge("http_requests_in_flight", in_flight, -1)
+            route = scope.get("route")
+            path = getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+            labels = (("route", path), ("method", method))
+            registry.observe("http_request_duration_seconds", labels, elapsed)
+            registry.inc("http_requests_total", labels + (("status", str(status)),))
+
+# Commands whose reply carries a document count: in a cursor batch, or as `n`
+_CURSOR_COMMANDS = {"find", "aggregate", "getMore"}
+_COUNTED_COMMANDS = {"insert", "update", "delete", "findAndModify", "count"}
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Per-collection, per-command latency and document counts from pymongo command events"""
+
+    def __init__(self):
+        self._collections: Dict[Tuple[int, int], str] = {}  # (request id, operation id) -> collection
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        if isinstance(target, str):
+            self._collections[(event.request_id, event.operation_id)] = target
+
+    def _record(self, event, outcome: str, reply: Optional[dict] = None):
+        collection = self._collections.pop((event.request_id, event.operation_id), None)
+        if collection is None:
+            return  # admin and handshake commands
+        labels = (("collection", collection), ("command", event.command_name))
+        registry.observe("mongo_command_duration_seconds", labels, event.duration_micros / 1e6)
+        registry.inc("mongo_commands_total", labels + (("outcome", outcome),))
+        if reply is None:
+            return
+        documents = 0
+        if event.command_name in _CURSOR_COMMANDS:
+            cursor = reply.get("cursor") or {}
+            documents = len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+        elif event.command_name in _COUNTED_COMMANDS:
+            documents = reply.get("n", 0)
+        if documents:
+            registry.inc("mongo_command_documents_total", labels, documents)
+
+    def succeeded(self, event):
+        self._record(event, "ok", event.reply)
+
+    def failed(self, event):
+        self._record(event, "error")
+
+mongo_command_metrics = MongoCommandMetrics()
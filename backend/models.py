@@ -16,6 +16,15 @@ class UserCreate(BaseModel):
     name: str
     location: str
 
+class PointsLedgerEntry(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    delta: int
+    reason: str = "api"
+    applied: bool = False
+    flush_id: Optional[str] = None  # set when a flush claims the entry
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 # Product Models
 class Product(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -36,6 +45,45 @@ class ProductCreate(BaseModel):
     category: str
     description: Optional[str] = None
 
+class ProductBatchRequest(BaseModel):
+    ids: List[str] = Field(..., max_length=500)
+
+class ProductLookup(BaseModel):
+    id: str
+    found: bool
+    product: Optional[Product] = None
+
+class ProductBatchResponse(BaseModel):
+    results: List[ProductLookup]  # one entry per requested id, in request order
+    missing: List[str]
+
+class PriceRange(BaseModel):
+    min: int
+    max: int
+
+class ProductFacets(BaseModel):
+    categories: Dict[str, int]  # matches per category, ignoring the category filter
+    in_stock: int
+    discounted: int
+    price: Optional[PriceRange] = None  # None when nothing matches
+
+class ProductBrowseResult(BaseModel):
+    products: List[Product]
+    total: int
+    facets: ProductFacets
+
+class ProductImportError(BaseModel):
+    line: int  # 1-based line number in the uploaded NDJSON
+    id: Optional[str] = None
+    error: str
+
+class ProductImportResult(BaseModel):
+    lines: int
+    inserted: int
+    failed: int
+    errors: List[ProductImportError]  # the first IMPORT_MAX_ERRORS failures
+    errors_truncated: bool = False
+
 # Bundle Models
 class Bundle(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -48,6 +96,10 @@ class Bundle(BaseModel):
     product_ids: List[str] = []
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class BundleWithProducts(Bundle):
+    products: List[Product] = []
+    missing_product_ids: List[str] = []  # product_ids with no matching product
+
 class BundleCreate(BaseModel):
     name: str
     price: int
@@ -78,6 +130,46 @@ class CartItemCreate(BaseModel):
 class CartItemUpdate(BaseModel):
     quantity: int
 
+class CartOperation(BaseModel):
+    op: str  # "add", "update" or "remove"
+    product_id: Optional[str] = None
+    bundle_id: Optional[str] = None  # add only: expands to the bundle's products
+    item_id: Optional[str] = None  # update/remove target, alternative to product_id
+    quantity: int = 1  # update to 0 or less removes the item
+    product_name: Optional[str] = None  # add only: looked up from the catalog when omitted
+    price: Optional[int] = None
+    image: Optional[str] = None
+
+class CartBatchRequest(BaseModel):
+    operations: List[CartOperation] = Field(..., max_length=500)
+
+# Order Models
+class OrderItem(BaseModel):
+    product_id: str
+    product_name: str
+    price: int
+    quantity: int
+    image: str
+
+class Order(BaseModel):
+    id: str = Field(default_factory=lambda: f"WMT{uuid.uuid4().hex[:12].upper()}")
+    user_id: str
+    items: List[OrderItem]
+    total_items: int
+    total_amount: int
+    status: str = "placed"
+    estimated_delivery: str = "2 hours"
+    idempotency_key: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CheckoutResponse(BaseModel):
+    message: str
+    order_id: str
+    total_items: int
+    total_amount: int
+    estimated_delivery: str
+    replayed: bool = False  # True when an Idempotency-Key retry returned the original order
+
 # Loyalty Mission Models
 class LoyaltyMission(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -95,6 +187,26 @@ class LoyaltyMissionCreate(BaseModel):
     target: int
     mission_type: str
 
+class RouletteReward(BaseModel):
+    label: str
+    weight: float = Field(..., gt=0)
+
+class RouletteConfig(BaseModel):
+    rewards: List[RouletteReward] = Field(..., min_length=1, max_length=100)
+    version: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class RouletteConfigUpdate(BaseModel):
+    rewards: List[RouletteReward] = Field(..., min_length=1, max_length=100)
+
+class RouletteSpin(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    reward: str
+    config_version: int
+    cart_total: int
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 # Meal Plan Models
 class MealPlan(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -131,6 +243,8 @@ class RefillAlert(BaseModel):
     discount: str
     image: str
     active: bool = True
+    product_id: Optional[str] = None
+    due_at: Optional[datetime] = None  # predicted reorder date; days_left is recomputed from it on read
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class RefillAlertCreate(BaseModel):
@@ -160,7 +274,29 @@ class CartSummary(BaseModel):
     total_items: int
     total_amount: int
 
+class CartTotals(BaseModel):
+    user_id: str
+    line_items: int  # distinct products in the cart
+    total_items: int
+    total_amount: int
+
+class CartOperationResult(BaseModel):
+    index: int
+    op: str
+    status: str  # "ok", "not_found" (update/remove target missing) or "error"
+    product_ids: List[str] = []
+    detail: Optional[str] = None
+
+class CartBatchResult(BaseModel):
+    results: List[CartOperationResult]
+    summary: CartTotals
+
+class SectionTiming(BaseModel):
+    status: str  # "ok", "timeout" or "error"
+    elapsed_ms: float
+
 class UserProfile(BaseModel):
     user: User
     cart_summary: CartSummary
-    active_missions: List[LoyaltyMission]
\ No newline at end of file
+    active_missions: List[LoyaltyMission]
+    timings: Dict[str, SectionTiming] = {}
\ No newline at end of file
@@ -0,0 +1,68 @@
+from fastapi import HTTPException, Response
+from pymongo import ASCENDING
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import base64
+import json
+
+# List endpoints keep returning plain JSON arrays; the cursor for the next page
+# travels in this header and is absent on the last page.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_key: str, last_value: Any) -> str:
+    payload = json.dumps({"k": sort_key, "v": last_value}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(sort_key: str, cursor: str) -> Any:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["k"] != sort_key:
+            raise ValueError(sort_key)
+        return payload["v"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_page(
+    collection,
+    filter_query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_key: Union[str, Sequence[str]] = "id",
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return one page of documents ordered by sort_key, plus the cursor for the next page.
+
+    Pages resume with `sort_key > last value` instead of skip(), so with an index
+    on the filter fields followed by sort_key every page costs the same. A
+    compound sort_key (ending in a unique field) resumes after the last
+    document's whole key, for filters that need a range field in the index.
+    """
+    keys = (sort_key,) if isinstance(sort_key, str) else tuple(sort_key)
+    name = ",".join(keys)
+    query = dict(filter_query)
+    if cursor:
+        last = decode_cursor(name, cursor)
+        if len(keys) == 1:
+            query[sort_key] = {"$gt": last}
+        else:
+            if not isinstance(last, list) or len(last) != len(keys):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            # (a, b) > (x, y)  <=>  a > x, or a == x and b > y
+            after = [
+                {**{key: value for key, value in zip(keys[:i], last)}, keys[i]: {"$gt": last[i]}}
+                for i in range(len(keys))
+            ]
+            # The leading bound lets the planner start the index scan at the cursor
+            query = {"$and": [query, {keys[0]: {"$gte": last[0]}}, {"$or": after}]}
+
+    documents = await collection.find(query, {"_id": 0}).sort(
+        [(key, ASCENDING) for key in keys]
+    ).limit(limit + 1).to_list(limit + 1)
+    if len(documents) <= limit:
+        return documents, None
+    last_document = documents[limit - 1]
+    last_value = last_document[keys[0]] if len(keys) == 1 else [last_document[key] for key in keys]
+    return documents[:limit], encode_cursor(name, last_value)
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -1,47 +1,63 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from models import CartItem, CartItemCreate, CartItemUpdate, CartSummary
+from fastapi import APIRouter, Header, HTTPException
+from typing import List, Optional
+from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models import (
+    CartItem, CartItemCreate, CartItemUpdate, CartSummary, CartTotals, CartBatchRequest, CartBatchResult,
+    CheckoutResponse
+)
 from database import cart_items_collection
+from services.cart_summary import get_cart_summary, get_cart_totals
+from services.cart_writes import cart_item_upsert, apply_cart_batch
+from services.checkout import place_order
+from serialization import trusted_response
+import events
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
 @router.get("/{user_id}", response_model=CartSummary)
 async def get_cart(user_id: str):
     """Get user's cart"""
-    cart_items = await cart_items_collection.find({"user_id": user_id}).to_list(100)
-    
-    total_items = sum(item["quantity"] for item in cart_items)
-    total_amount = sum(item["price"] * item["quantity"] for item in cart_items)
-    
-    return CartSummary(
-        items=[CartItem(**item) for item in cart_items],
-        total_items=total_items,
-        total_amount=total_amount
-    )
+    return trusted_response(await get_cart_summary(user_id))
+
+@router.get("/{user_id}/summary", response_model=CartTotals)
+async def get_cart_totals_only(user_id: str):
+    """Get cart totals without item payloads"""
+    return await get_cart_totals(user_id)
 
 @router.post("/{user_id}/items", response_model=CartItem)
 async def add_to_cart(user_id: str, item_data: CartItemCreate):
-    """Add item to cart"""
-    # Check if item already exists in cart
-    existing_item = await cart_items_collection.find_one({
-        "user_id": user_id,
-        "product_id": item_data.product_id
-    })
-    
-    if existing_item:
-        # Update quantity
-        new_quantity = existing_item["quantity"] + item_data.quantity
-        await cart_items_collection.update_one(
-            {"id": existing_item["id"]},
-            {"$set": {"quantity": new_quantity}}
+    """Add item to cart, or increase its quantity if the product is already there"""
+    filter_query, update = cart_item_upsert(user_id, item_data)
+    try:
+        cart_item = await cart_items_collection.find_one_and_update(
+            filter_query, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lost an insert race on (user_id, product_id); the retry matches the winner's row
+        cart_item = await cart_items_collection.find_one_and_update(
+            filter_query, update, upsert=True, return_document=ReturnDocument.AFTER
         )
-        updated_item = await cart_items_collection.find_one({"id": existing_item["id"]})
-        return CartItem(**updated_item)
-    else:
-        # Add new item
-        cart_item = CartItem(**item_data.dict())
-        await cart_items_collection.insert_one(cart_item.dict())
-        return cart_item
+    events.publish(events.CART_ITEM_ADDED, {
+        "user_id": user_id, "product_id": item_data.product_id,
+        "quantity": item_data.quantity, "at": datetime.utcnow()
+    })
+    return CartItem(**cart_item)
+
+@router.post("/{user_id}/batch", response_model=CartBatchResult)
+async def batch_update_cart(user_id: str, batch: CartBatchRequest):
+    """Apply many add/update/remove operations (including whole bundles) in one request"""
+    results = await apply_cart_batch(user_id, batch.operations)
+    now = datetime.utcnow()
+    for result in results:
+        if result.op == "add" and result.status == "ok":
+            for product_id in result.product_ids:
+                events.publish(events.CART_ITEM_ADDED, {
+                    "user_id": user_id, "product_id": product_id,
+                    "quantity": batch.operations[result.index].quantity, "at": now
+                })
+    return CartBatchResult(results=results, summary=await get_cart_totals(user_id))
 
 @router.put("/{user_id}/items/{item_id}", response_model=CartItem)
 async def update_cart_item(user_id: str, item_id: str, update_data: CartItemUpdate):
@@ -56,15 +72,15 @@ async def update_cart_item(user_id: str, item_id: str, update_data: CartItemUpda
             raise HTTPException(status_code=404, detail="Cart item not found")
         return {"message": "Item removed from cart"}
     
-    result = await cart_items_collection.update_one(
+    updated_item = await cart_items_collection.find_one_and_update(
         {"id": item_id, "user_id": user_id},
-        {"$set": {"quantity": update_data.quantity}}
+        {"$set": {"quantity": update_data.quantity}},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.modified_count == 0:
+    if not updated_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
-    updated_item = await cart_items_collection.find_one({"id": item_id})
     return CartItem(**updated_item)
 
 @router.delete("/{user_id}/items/{item_id}")
@@ -86,26 +102,25 @@ async def clear_cart(user_id: str):
     result = await cart_items_collection.delete_many({"user_id": user_id})
     return {"message": f"Removed {result.deleted_count} items from cart"}
 
-@router.post("/{user_id}/checkout")
-async def checkout(user_id: str):
+@router.post("/{user_id}/checkout", response_model=CheckoutResponse)
+async def checkout(
+    user_id: str,
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key return the original order")
+):
     """Process checkout"""
-    # Get cart items
-    cart_items = await cart_items_collection.find({"user_id": user_id}).to_list(100)
-    
-    if not cart_items:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    total_amount = sum(item["price"] * item["quantity"] for item in cart_items)
-    total_items = sum(item["quantity"] for item in cart_items)
-    
-    # Clear cart after checkout
-    await cart_items_collection.delete_many({"user_id": user_id})
+    order, replayed = await place_order(user_id, idempotency_key)
+    if not replayed:
+        events.publish(events.ORDER_PLACED, {
+            "user_id": user_id, "order_id": order.id,
+            "items": [item.dict() for item in order.items], "at": order.created_at
+        })
     
     # In a real app, you would process payment here
-    return {
-        "message": "Order placed successfully",
-        "order_id": f"WMT{user_id[-4:]}001",
-        "total_items": total_items,
-        "total_amount": total_amount,
-        "estimated_delivery": "2 hours"
-    }
\ No newline at end of file
+    return CheckoutResponse(
+        message="Order placed successfully",
+        order_id=order.id,
+        total_items=order.total_items,
+        total_amount=order.total_amount,
+        estimated_delivery=order.estimated_delivery,
+        replayed=replayed
+    )
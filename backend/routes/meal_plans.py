@@ -1,47 +1,80 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Optional
 from models import MealPlan, MealPlanCreate
 from database import meal_plans_collection
+from cache import catalog_cache
+from http_cache import catalog_versions, conditional_response
 
 router = APIRouter(prefix="/meal-plans", tags=["meal-plans"])
 
 @router.get("/", response_model=List[MealPlan])
-async def get_meal_plans(goal_type: Optional[str] = Query(None, description="Filter by goal type")):
+async def get_meal_plans(request: Request, goal_type: Optional[str] = Query(None, description="Filter by goal type")):
     """Get all meal plans with optional goal filter"""
-    filter_query = {}
-    if goal_type:
-        filter_query["goal_type"] = goal_type
-    
-    meal_plans = await meal_plans_collection.find(filter_query).to_list(100)
-    return [MealPlan(**plan) for plan in meal_plans]
+    async def load():
+        filter_query = {}
+        if goal_type:
+            filter_query["goal_type"] = goal_type
+        
+        meal_plans = await meal_plans_collection.find(filter_query).to_list(100)
+        return [MealPlan(**plan) for plan in meal_plans]
+
+    return await conditional_response(
+        request, ("meal_plans",), ("meal_plans", goal_type),
+        lambda: catalog_cache.get_or_load("meal_plans", ("list", goal_type), load)
+    )
 
 @router.get("/{plan_id}", response_model=MealPlan)
-async def get_meal_plan(plan_id: str):
+async def get_meal_plan(plan_id: str, request: Request):
     """Get meal plan by ID"""
-    meal_plan = await meal_plans_collection.find_one({"id": plan_id})
-    if not meal_plan:
-        raise HTTPException(status_code=404, detail="Meal plan not found")
-    return MealPlan(**meal_plan)
+    async def load():
+        meal_plan = catalog_cache.get("meal_plan", plan_id)
+        if meal_plan is None:
+            generation = catalog_cache.generation("meal_plan")
+            meal_plan = await meal_plans_collection.find_one({"id": plan_id})
+            if not meal_plan:
+                raise HTTPException(status_code=404, detail="Meal plan not found")
+            meal_plan = MealPlan(**meal_plan)
+            catalog_cache.set("meal_plan", plan_id, meal_plan, generation)
+        return meal_plan
+
+    return await conditional_response(request, ("meal_plans",), ("meal_plan", plan_id), load)
+
+async def find_meal_plan_by_goal(goal_type: str) -> Optional[MealPlan]:
+    """Cached lookup of the meal plan for a goal; misses are not cached"""
+    meal_plan = catalog_cache.get("meal_plans", ("goal", goal_type))
+    if meal_plan is None:
+        generation = catalog_cache.generation("meal_plans")
+        meal_plan = await meal_plans_collection.find_one({"goal_type": goal_type})
+        if not meal_plan:
+            return None
+        meal_plan = MealPlan(**meal_plan)
+        catalog_cache.set("meal_plans", ("goal", goal_type), meal_plan, generation)
+    return meal_plan
 
 @router.get("/goal/{goal_type}", response_model=MealPlan)
-async def get_meal_plan_by_goal(goal_type: str):
+async def get_meal_plan_by_goal(goal_type: str, request: Request):
     """Get meal plan by goal type"""
-    meal_plan = await meal_plans_collection.find_one({"goal_type": goal_type})
-    if not meal_plan:
-        raise HTTPException(status_code=404, detail=f"Meal plan for {goal_type} not found")
-    return MealPlan(**meal_plan)
+    async def load():
+        meal_plan = await find_meal_plan_by_goal(goal_type)
+        if not meal_plan:
+            raise HTTPException(status_code=404, detail=f"Meal plan for {goal_type} not found")
+        return meal_plan
+
+    return await conditional_response(request, ("meal_plans",), ("meal_plan_goal", goal_type), load)
 
 @router.post("/", response_model=MealPlan)
 async def create_meal_plan(plan_data: MealPlanCreate):
     """Create a new meal plan"""
     meal_plan = MealPlan(**plan_data.dict())
     await meal_plans_collection.insert_one(meal_plan.dict())
+    catalog_cache.invalidate("meal_plans")
+    await catalog_versions.bump("meal_plans")
     return meal_plan
 
 @router.get("/ingredients/{goal_type}")
 async def get_meal_plan_ingredients(goal_type: str):
     """Get shopping list for meal plan ingredients"""
-    meal_plan = await meal_plans_collection.find_one({"goal_type": goal_type})
+    meal_plan = await find_meal_plan_by_goal(goal_type)
     if not meal_plan:
         raise HTTPException(status_code=404, detail=f"Meal plan for {goal_type} not found")
     
@@ -83,5 +116,7 @@ async def get_meal_plan_ingredients(goal_type: str):
 @router.get("/goals/available")
 async def get_available_goals():
     """Get list of available meal plan goals"""
-    goals = await meal_plans_collection.distinct("goal_type")
+    goals = await catalog_cache.get_or_load(
+        "meal_plans", ("goals",), lambda: meal_plans_collection.distinct("goal_type")
+    )
     return {"goals": goals}
\ No newline at end of file
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from models import LoyaltyMission, LoyaltyMissionCreate
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import List, Optional
+from pymongo import ReturnDocument
+from models import LoyaltyMission, LoyaltyMissionCreate, RouletteConfig, RouletteConfigUpdate
 from database import loyalty_missions_collection
-import random
+from pagination import fetch_page, set_next_cursor
+from services.missions import get_user_progress
+from services.roulette import roulette_wheel, spin
 
 router = APIRouter(prefix="/missions", tags=["missions"])
 
 @router.get("/", response_model=List[LoyaltyMission])
-async def get_missions(active_only: bool = True):
-    """Get all loyalty missions"""
+async def get_missions(
+    response: Response,
+    active_only: bool = True,
+    limit: int = Query(100, ge=1, le=500, description="Number of missions to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header")
+):
+    """Get loyalty missions, paginated by cursor"""
     filter_query = {"active": True} if active_only else {}
-    missions = await loyalty_missions_collection.find(filter_query).to_list(100)
+    missions, next_cursor = await fetch_page(loyalty_missions_collection, filter_query, limit, cursor)
+    set_next_cursor(response, next_cursor)
     return [LoyaltyMission(**mission) for mission in missions]
 
 @router.get("/{mission_id}", response_model=LoyaltyMission)
@@ -31,55 +40,40 @@ async def create_mission(mission_data: LoyaltyMissionCreate):
 @router.put("/{mission_id}/progress")
 async def update_mission_progress(mission_id: str, progress_increment: int = 1):
     """Update mission progress"""
-    mission = await loyalty_missions_collection.find_one({"id": mission_id})
-    if not mission:
-        raise HTTPException(status_code=404, detail="Mission not found")
-    
-    new_progress = min(mission["progress"] + progress_increment, mission["target"])
-    
-    await loyalty_missions_collection.update_one(
+    # Increment and clamp to target server-side so concurrent updates can't overwrite each other
+    mission = await loyalty_missions_collection.find_one_and_update(
         {"id": mission_id},
-        {"$set": {"progress": new_progress}}
+        [{"$set": {"progress": {"$min": [{"$add": ["$progress", progress_increment]}, "$target"]}}}],
+        projection={"_id": 0, "progress": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if not mission:
+        raise HTTPException(status_code=404, detail="Mission not found")
     
-    return {"message": "Mission progress updated", "new_progress": new_progress}
+    return {"message": "Mission progress updated", "new_progress": mission["progress"]}
 
 @router.post("/roulette/spin")
 async def spin_roulette(user_id: str):
-    """Spin the loyalty roulette wheel"""
-    # Check if user has unlocked spin (cart value > 500)
-    # For now, we'll simulate this
-    
-    rewards = [
-        "10% Off Next Order",
-        "Free Delivery", 
-        "₹50 Cashback",
-        "2x Points",
-        "₹100 Off ₹500",
-        "Free Sample Box",
-        "Weekend Special",
-        "Spin Again!"
-    ]
-    
-    # Randomly select a reward
-    selected_reward = random.choice(rewards)
-    
+    """Spin the loyalty roulette wheel; needs a qualifying cart value and a spin left today"""
+    entry, spins_left = await spin(user_id)
     return {
-        "reward": selected_reward,
-        "message": f"Congratulations! You won: {selected_reward}"
+        "reward": entry.reward,
+        "message": f"Congratulations! You won: {entry.reward}",
+        "spin_id": entry.id,
+        "spins_left": spins_left
     }
 
+@router.get("/roulette/config", response_model=RouletteConfig)
+async def get_roulette_config():
+    """Get the roulette rewards and their weights"""
+    return await roulette_wheel.config()
+
+@router.put("/roulette/config", response_model=RouletteConfig)
+async def update_roulette_config(config: RouletteConfigUpdate):
+    """Replace the roulette rewards and weights"""
+    return await roulette_wheel.update(config.rewards)
+
 @router.get("/user/{user_id}/progress")
 async def get_user_mission_progress(user_id: str):
-    """Get user's mission progress (mock implementation)"""
-    # In a real app, this would track user-specific progress
-    missions = await loyalty_missions_collection.find({"active": True}).to_list(100)
-    
-    # Add mock user-specific progress
-    for mission in missions:
-        if mission["mission_type"] == "categories":
-            mission["user_progress"] = 1  # User has bought from 1 category
-        else:
-            mission["user_progress"] = 0
-    
-    return {"missions": missions, "user_id": user_id}
\ No newline at end of file
+    """Get user's mission progress"""
+    return {"missions": await get_user_progress(user_id), "user_id": user_id}
@@ -1,101 +1,304 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
-from models import Product, ProductCreate, Bundle, BundleCreate
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Union
+from models import (
+    Product, ProductCreate, Bundle, BundleCreate, BundleWithProducts,
+    ProductBatchRequest, ProductBatchResponse, ProductLookup, ProductImportResult, ProductBrowseResult
+)
 from database import products_collection, bundles_collection
+from cache import catalog_cache, SingleFlight
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, fetch_page
+from http_cache import catalog_versions, conditional_response
+from serialization import RowSerializer, trusted_response
+from services.bundles import hydrate_bundles
+from services.search import product_search_index
+from services.vector_index import product_vector_index
+from services.trending import trending_engine
+from services.catalog_transfer import export_products, import_products
+from services.catalog_snapshot import SORTS, catalog_snapshot
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+BATCH_MAX_IDS = 500
+product_lookups = SingleFlight()
+product_rows = RowSerializer(Product)
+
 @router.get("/", response_model=List[Product])
 async def get_products(
     category: Optional[str] = Query(None, description="Filter by category"),
-    limit: int = Query(50, description="Number of products to return")
+    min_price: Optional[int] = Query(None, ge=0, description="Minimum price (inclusive)"),
+    max_price: Optional[int] = Query(None, ge=0, description="Maximum price (inclusive)"),
+    limit: int = Query(50, ge=1, le=500, description="Number of products to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header")
+):
+    """Get products with optional category and price filters, paginated by cursor.
+
+    Price-filtered listings are ordered by price (then id), so each page is an
+    index range scan; the others are ordered by id.
+    """
+    async def load():
+        filter_query = {}
+        sort_key = "id"
+        if category:
+            filter_query["category"] = category
+        if min_price is not None or max_price is not None:
+            filter_query["price"] = {}
+            if min_price is not None:
+                filter_query["price"]["$gte"] = min_price
+            if max_price is not None:
+                filter_query["price"]["$lte"] = max_price
+            sort_key = ("price", "id")
+        
+        products, next_cursor = await fetch_page(products_collection, filter_query, limit, cursor, sort_key)
+        return product_rows.many(products), next_cursor
+
+    products, next_cursor = await catalog_cache.get_or_load(
+        "products", (category, min_price, max_price, limit, cursor), load
+    )
+    return trusted_response(products, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+async def lookup_products(ids: List[str]) -> ProductBatchResponse:
+    """Resolve ids from the product cache, fetching the rest with one $in query.
+
+    Identical concurrent fetches share a single query.
+    """
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IDS} ids per request")
+
+    found = {}
+    uncached = []
+    for product_id in dict.fromkeys(ids):
+        product = catalog_cache.get("product", product_id)
+        if product is None:
+            uncached.append(product_id)
+        else:
+            found[product_id] = product
+
+    if uncached:
+        async def load():
+            # Taken inside the shared load, so every waiter checks the generation the query started at
+            generation = catalog_cache.generation("product")
+            documents = await products_collection.find(
+                {"id": {"$in": uncached}}, {"_id": 0}
+            ).to_list(len(uncached))
+            return generation, [Product(**document) for document in documents]
+
+        generation, products = await product_lookups.do(tuple(sorted(uncached)), load)
+        for product in products:
+            found[product.id] = product
+            catalog_cache.set("product", product.id, product, generation)
+
+    return ProductBatchResponse(
+        results=[ProductLookup(id=product_id, found=product_id in found, product=found.get(product_id))
+                 for product_id in ids],
+        missing=[product_id for product_id in dict.fromkeys(ids) if product_id not in found]
+    )
+
+@router.get("/batch", response_model=ProductBatchResponse)
+async def get_products_batch(
+    ids: List[str] = Query(..., description="Product ids, repeated or comma-separated")
+):
+    """Get several products by ID in one call"""
+    return await lookup_products([product_id for value in ids for product_id in value.split(",") if product_id])
+
+@router.post("/batch", response_model=ProductBatchResponse)
+async def post_products_batch(batch: ProductBatchRequest):
+    """Get several products by ID in one call, for id lists too long for a query string"""
+    return await lookup_products(batch.ids)
+
+@router.get("/search")
+async def search_products(
+    q: str = Query(..., min_length=1, description="Free-text query over name, category and description"),
+    limit: int = Query(20, ge=1, le=100, description="Number of results to return")
+):
+    """Ranked product text search served from the in-memory index"""
+    results = product_search_index.search(q, limit)
+    return {
+        "query": q,
+        "results": [{**summary, "score": round(score, 4)} for summary, score in results]
+    }
+
+@router.get("/browse", response_model=ProductBrowseResult)
+async def browse_products(
+    category: Optional[List[str]] = Query(None, description="Categories to include, repeated or comma-separated"),
+    min_price: Optional[int] = Query(None, ge=0, description="Minimum price (inclusive)"),
+    max_price: Optional[int] = Query(None, ge=0, description="Maximum price (inclusive)"),
+    in_stock: Optional[bool] = Query(None, description="Only products in (or out of) stock"),
+    min_discount: Optional[float] = Query(None, ge=0, le=100, description="Minimum percent off original price"),
+    sort: Optional[str] = Query(None, description=f"One of: {', '.join(SORTS)}"),
+    limit: int = Query(50, ge=1, le=500, description="Number of products to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header")
 ):
-    """Get all products with optional category filter"""
-    filter_query = {}
-    if category:
-        filter_query["category"] = category
-    
-    products = await products_collection.find(filter_query).limit(limit).to_list(limit)
-    return [Product(**product) for product in products]
+    """Filter, sort and facet the catalog from the in-memory columnar snapshot"""
+    if sort is not None and sort not in SORTS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort: {sort}")
+    if not catalog_snapshot.ready:
+        raise HTTPException(status_code=503, detail="Catalog snapshot is still loading")
+    categories = [name for value in category for name in value.split(",") if name] if category else None
+    filters = dict(categories=categories, min_price=min_price, max_price=max_price,
+                   in_stock=in_stock, min_discount=min_discount)
+    cursor_key = f"browse:{sort or 'catalog'}"
+    offset = decode_cursor(cursor_key, cursor) if cursor else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    ids, total, facets = catalog_snapshot.browse(**filters, sort=sort, offset=offset, limit=limit)
+    lookup = await lookup_products(ids)
+    result = {
+        "products": [entry.product for entry in lookup.results if entry.found],
+        "total": total,
+        "facets": facets,
+    }
+    next_offset = offset + len(ids)
+    headers = {NEXT_CURSOR_HEADER: encode_cursor(cursor_key, next_offset)} if next_offset < total else None
+    return trusted_response(result, headers)
+
+@router.get("/export")
+async def export_catalog(category: Optional[str] = Query(None, description="Only export this category")):
+    """Stream the catalog as NDJSON, one product per line"""
+    return StreamingResponse(
+        export_products(category),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="products.ndjson"'},
+    )
+
+@router.post("/import", response_model=ProductImportResult)
+async def import_catalog(request: Request):
+    """Bulk-create products from an NDJSON body (one ProductCreate object per line, optionally with an id)"""
+    result = await import_products(request.stream())
+    if result.inserted:
+        catalog_cache.invalidate("products", "bundles_expanded")
+        await catalog_versions.bump("products")
+        # The search and vector indexes and the catalog snapshot pick new products up on their next refresh
+    return result
 
 @router.get("/{product_id}", response_model=Product)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     """Get product by ID"""
-    product = await products_collection.find_one({"id": product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+    async def load():
+        product = catalog_cache.get("product", product_id)
+        if product is None:
+            generation = catalog_cache.generation("product")
+            product = await products_collection.find_one({"id": product_id})
+            if not product:
+                raise HTTPException(status_code=404, detail="Product not found")
+            product = Product(**product)
+            catalog_cache.set("product", product_id, product, generation)
+        return product
+
+    return await conditional_response(request, ("products",), ("product", product_id), load)
 
 @router.post("/", response_model=Product)
 async def create_product(product_data: ProductCreate):
     """Create a new product"""
     product = Product(**product_data.dict())
     await products_collection.insert_one(product.dict())
+    # Existing product details are unaffected; only list queries and hydrated
+    # bundles (which may reference the new id) can change
+    catalog_cache.invalidate("products", "bundles_expanded")
+    await catalog_versions.bump("products")
+    product_search_index.add(product.dict())
+    catalog_snapshot.add([product.dict()])
+    product_vector_index.add_products([product.dict()])
     return product
 
 @router.get("/trending/location", response_model=List[Product])
 async def get_trending_products(location: str = Query(..., description="User location")):
     """Get trending products for a specific location"""
-    # For now, return products from specific categories as "trending"
-    trending_categories = ["food", "electronics", "beauty"]
-    products = await products_collection.find(
-        {"category": {"$in": trending_categories}}
-    ).limit(10).to_list(10)
-    return [Product(**product) for product in products]
+    # Served from the snapshot the trending engine refreshes in the background
+    if trending_engine.refreshed_at is None:
+        # Startup, before the first refresh: at least serve the category fallback
+        await trending_engine.load_fallback(products_collection)
+    return trending_engine.trending(location)
 
 # Bundle routes
-@router.get("/bundles/", response_model=List[Bundle])
-async def get_bundles(limit: int = Query(10, description="Number of bundles to return")):
-    """Get all smart bundles"""
-    bundles = await bundles_collection.find().limit(limit).to_list(limit)
-    return [Bundle(**bundle) for bundle in bundles]
-
-@router.get("/bundles/{bundle_id}", response_model=Bundle)
-async def get_bundle(bundle_id: str):
+EXPAND_DESCRIPTION = "Set to 'products' to embed each bundle's products with live pricing"
+
+def _check_expand(expand: Optional[str]) -> bool:
+    if expand not in (None, "products"):
+        raise HTTPException(status_code=400, detail=f"Unsupported expand value: {expand}")
+    return expand == "products"
+
+def _bundle_sources(expand: bool):
+    # Expanded bundles embed live product data, so product writes change them too
+    return ("bundles", "products") if expand else ("bundles",)
+
+@router.get("/bundles/", response_model=Union[List[BundleWithProducts], List[Bundle]])
+async def get_bundles(
+    request: Request,
+    limit: int = Query(10, ge=1, le=500, description="Number of bundles to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION)
+):
+    """Get all smart bundles, paginated by cursor"""
+    expanded = _check_expand(expand)
+
+    async def load_page():
+        bundles, next_cursor = await fetch_page(bundles_collection, {}, limit, cursor)
+        return [Bundle(**bundle) for bundle in bundles], next_cursor
+
+    async def load():
+        bundles, next_cursor = await catalog_cache.get_or_load("bundles", (limit, cursor), load_page)
+        if expanded:
+            bundles = await catalog_cache.get_or_load(
+                "bundles_expanded", (limit, cursor), lambda: hydrate_bundles(bundles)
+            )
+        return bundles, next_cursor
+
+    return await conditional_response(
+        request, _bundle_sources(expanded), ("bundles", limit, cursor, expanded), load, paged=True
+    )
+
+@router.get("/bundles/{bundle_id}", response_model=Union[BundleWithProducts, Bundle])
+async def get_bundle(
+    bundle_id: str, request: Request, expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION)
+):
     """Get bundle by ID"""
-    bundle = await bundles_collection.find_one({"id": bundle_id})
-    if not bundle:
-        raise HTTPException(status_code=404, detail="Bundle not found")
-    return Bundle(**bundle)
+    expanded = _check_expand(expand)
+
+    async def load():
+        bundle = catalog_cache.get("bundle", bundle_id)
+        if bundle is None:
+            generation = catalog_cache.generation("bundle")
+            bundle = await bundles_collection.find_one({"id": bundle_id})
+            if not bundle:
+                raise HTTPException(status_code=404, detail="Bundle not found")
+            bundle = Bundle(**bundle)
+            catalog_cache.set("bundle", bundle_id, bundle, generation)
+        if expanded:
+            hydrated = await catalog_cache.get_or_load(
+                "bundles_expanded", bundle_id, lambda: hydrate_bundles([bundle])
+            )
+            return hydrated[0]
+        return bundle
+
+    return await conditional_response(request, _bundle_sources(expanded), ("bundle", bundle_id, expanded), load)
 
 @router.post("/bundles/", response_model=Bundle)
 async def create_bundle(bundle_data: BundleCreate):
     """Create a new bundle"""
     bundle = Bundle(**bundle_data.dict(), savings=bundle_data.original_price - bundle_data.price)
     await bundles_collection.insert_one(bundle.dict())
+    catalog_cache.invalidate("bundles", "bundles_expanded")
+    await catalog_versions.bump("bundles")
     return bundle
 
 @router.get("/search/visual")
 async def visual_search(query: str = Query(..., description="Search query from image")):
-    """Simulate AI visual search results"""
-    # Mock AI search results - in real implementation, this would use ML/AI
-    mock_results = [
-        {
-            "id": "match-1",
-            "name": "Premium Notebook - 200 pages",
-            "price": 120,
-            "original_price": 150,
-            "match_percentage": 95,
-            "image": "https://images.unsplash.com/photo-1481627834876-b7833e8f5570?w=200&h=150&fit=crop",
-            "category": "stationery"
-        },
-        {
-            "id": "match-2", 
-            "name": "Student Diary - Hardcover",
-            "price": 80,
-            "original_price": 100,
-            "match_percentage": 87,
-            "image": "https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=200&h=150&fit=crop",
-            "category": "stationery"
-        },
-        {
-            "id": "match-3",
-            "name": "Office Planner - Weekly", 
-            "price": 250,
-            "original_price": 300,
-            "match_percentage": 82,
-            "image": "https://images.unsplash.com/photo-1484480974693-6ca0a78fb36b?w=200&h=150&fit=crop",
-            "category": "stationery"
-        }
-    ]
-    return {"results": mock_results, "query": query}
\ No newline at end of file
+    """Match a camera capture's description to catalog items by embedding similarity"""
+    matches = product_vector_index.search(product_vector_index.embed(query), k=3)[0]
+    lookup = await lookup_products([product_id for product_id, _ in matches])
+    results = []
+    for (product_id, similarity), result in zip(matches, lookup.results):
+        if result.found and similarity > 0:
+            product = result.product
+            results.append({
+                "id": product.id,
+                "name": product.name,
+                "price": product.price,
+                "original_price": product.original_price,
+                "match_percentage": round(similarity * 100),
+                "image": product.image,
+                "category": product.category
+            })
+    return {"results": results, "query": query}
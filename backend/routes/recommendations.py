@@ -1,53 +1,67 @@
-from fastapi import APIRouter, Query
-from typing import List
-from models import SmartTip, SmartTipCreate, RefillAlert, RefillAlertCreate
-from database import smart_tips_collection, refill_alerts_collection
+from fastapi import APIRouter, Query, Request, Response
+from typing import List, Optional
+from pymongo import DESCENDING
+from models import Product, SmartTip, SmartTipCreate, RefillAlert, RefillAlertCreate
+from database import (
+    smart_tips_collection, refill_alerts_collection, orders_collection,
+    cart_items_collection, products_collection
+)
+from cache import catalog_cache
+from pagination import fetch_page, set_next_cursor
+from http_cache import catalog_versions, conditional_response
+from serialization import RowSerializer
+from services.recommender import co_purchase_recommender
+from services.refill import visible_alert_filter, days_left
+from datetime import datetime
+import asyncio
+
+RECENT_ORDERS = 5  # orders whose items seed personalized recommendations
+product_rows = RowSerializer(Product)
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
 @router.get("/smart-tips", response_model=List[SmartTip])
-async def get_smart_tips(active_only: bool = True):
-    """Get all smart tips for users"""
-    filter_query = {"active": True} if active_only else {}
-    tips = await smart_tips_collection.find(filter_query).to_list(100)
-    return [SmartTip(**tip) for tip in tips]
+async def get_smart_tips(
+    request: Request,
+    active_only: bool = True,
+    limit: int = Query(100, ge=1, le=500, description="Number of tips to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header")
+):
+    """Get smart tips for users, paginated by cursor"""
+    async def load():
+        filter_query = {"active": True} if active_only else {}
+        tips, next_cursor = await fetch_page(smart_tips_collection, filter_query, limit, cursor)
+        return [SmartTip(**tip) for tip in tips], next_cursor
+
+    return await conditional_response(
+        request, ("smart_tips",), ("smart_tips", active_only, limit, cursor),
+        lambda: catalog_cache.get_or_load("smart_tips", (active_only, limit, cursor), load), paged=True
+    )
 
 @router.post("/smart-tips", response_model=SmartTip)
 async def create_smart_tip(tip_data: SmartTipCreate):
     """Create a new smart tip"""
     tip = SmartTip(**tip_data.dict())
     await smart_tips_collection.insert_one(tip.dict())
+    catalog_cache.invalidate("smart_tips")
+    await catalog_versions.bump("smart_tips")
     return tip
 
 @router.get("/refill-alerts/{user_id}", response_model=List[RefillAlert])
-async def get_refill_alerts(user_id: str):
-    """Get refill alerts for a user"""
-    alerts = await refill_alerts_collection.find({"user_id": user_id, "active": True}).to_list(100)
-    
-    # If no user-specific alerts, return default alerts
-    if not alerts:
-        default_alerts = [
-            {
-                "id": "refill-1",
-                "user_id": user_id,
-                "product_name": "Baby Wipes",
-                "days_left": 3,
-                "discount": "₹20 Off",
-                "image": "https://images.unsplash.com/photo-1584464491033-06628f3a6b7b?w=200&h=150&fit=crop",
-                "active": True
-            },
-            {
-                "id": "refill-2", 
-                "user_id": user_id,
-                "product_name": "Detergent Powder",
-                "days_left": 5,
-                "discount": "₹50 Off",
-                "image": "https://images.unsplash.com/photo-1556909114-f6e7ad7d3136?w=200&h=150&fit=crop",
-                "active": True
-            }
-        ]
-        return [RefillAlert(**alert) for alert in default_alerts]
-    
+async def get_refill_alerts(
+    user_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500, description="Number of alerts to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header")
+):
+    """Get refill alerts for a user, paginated by cursor"""
+    now = datetime.utcnow()
+    alerts, next_cursor = await fetch_page(
+        refill_alerts_collection, visible_alert_filter(user_id, now), limit, cursor
+    )
+    set_next_cursor(response, next_cursor)
+    for alert in alerts:
+        alert["days_left"] = days_left(alert.get("due_at"), alert["days_left"], now)
     return [RefillAlert(**alert) for alert in alerts]
 
 @router.post("/refill-alerts", response_model=RefillAlert)
@@ -84,31 +98,30 @@ async def get_exclusive_drops(user_id: str = Query(..., description="User ID")):
     return {"drops": drops, "user_id": user_id}
 
 @router.get("/personalized/{user_id}")
-async def get_personalized_recommendations(user_id: str):
-    """Get personalized recommendations based on user history"""
-    # Mock personalized recommendations
-    recommendations = {
-        "top_products": [
-            {"name": "Organic Rice - 5kg", "purchase_count": 8, "savings": "₹120"},
-            {"name": "Detergent Powder", "purchase_count": 6, "savings": "₹80"}, 
-            {"name": "Cooking Oil - 1L", "purchase_count": 5, "savings": "₹45"}
-        ],
-        "suggested_switches": [
-            {
-                "current_product": "Premium Brand Detergent",
-                "suggested_product": "Walmart Brand Detergent",
-                "monthly_savings": "₹75",
-                "quality_rating": 4.5
-            }
-        ],
-        "reorder_suggestions": [
-            {
-                "product": "Organic Rice - 5kg",
-                "last_purchase": "15 days ago",
-                "typical_reorder": "20 days",
-                "discount": "₹30 off"
-            }
-        ]
+async def get_personalized_recommendations(
+    user_id: str,
+    limit: int = Query(10, ge=1, le=50, description="Number of products to suggest")
+):
+    """Get products frequently bought together with the user's recent orders and cart"""
+    orders, cart_items = await asyncio.gather(
+        orders_collection.find({"user_id": user_id}, {"_id": 0, "items.product_id": 1})
+        .sort("created_at", DESCENDING).limit(RECENT_ORDERS).to_list(RECENT_ORDERS),
+        cart_items_collection.find({"user_id": user_id}, {"_id": 0, "product_id": 1}).to_list(None),
+    )
+    recent = list(dict.fromkeys(
+        [item["product_id"] for item in cart_items]
+        + [item["product_id"] for order in orders for item in order.get("items", [])]
+    ))
+
+    scored = co_purchase_recommender.recommend(recent, k=limit)
+    products = {
+        product["id"]: product
+        for product in await products_collection.find(
+            {"id": {"$in": [product_id for product_id, _ in scored]}}, {"_id": 0}
+        ).to_list(None)
     }
-    
-    return {"recommendations": recommendations, "user_id": user_id}
\ No newline at end of file
+    suggestions = [
+        {**product_rows(products[product_id]), "score": round(score, 4)}
+        for product_id, score in scored if product_id in products
+    ]
+    return {"recommendations": {"suggested_products": suggestions, "based_on": recent}, "user_id": user_id}
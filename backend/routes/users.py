@@ -1,16 +1,62 @@
 from fastapi import APIRouter, HTTPException
-from typing import List
-from models import User, UserCreate, UserProfile, CartSummary
-from database import users_collection, cart_items_collection, loyalty_missions_collection
+from typing import Any, Awaitable, Dict, List
+from pymongo.errors import PyMongoError
+from models import User, UserCreate, UserProfile, CartSummary, SectionTiming
+from database import users_collection, loyalty_missions_collection
+from services.cart_summary import get_cart_summary
+from services.points import points_ledger
+import asyncio
+import logging
+import os
+import time
 
 router = APIRouter(prefix="/users", tags=["users"])
+logger = logging.getLogger(__name__)
+
+# Per-section time budgets for the profile fan-out, in seconds
+PROFILE_TIMEOUTS = {
+    "user": float(os.environ.get("PROFILE_USER_TIMEOUT_SECONDS", "2.0")),
+    "cart": float(os.environ.get("PROFILE_CART_TIMEOUT_SECONDS", "1.0")),
+    "missions": float(os.environ.get("PROFILE_MISSIONS_TIMEOUT_SECONDS", "0.5")),
+}
+# Sections the profile can't be served without
+CRITICAL_SECTIONS = {"user"}
+
+async def _profile_section(name: str, query: Awaitable[Any], timings: Dict[str, SectionTiming]) -> Any:
+    """Await one profile sub-query within its budget; failures yield None instead of raising.
+
+    The user section only absorbs Mongo errors (the caller turns those into a
+    504); anything else it raises is a bug and propagates. Other sections
+    degrade on any exception.
+    """
+    started = time.perf_counter()
+    result, status = None, "ok"
+    try:
+        result = await asyncio.wait_for(query, PROFILE_TIMEOUTS[name])
+    except asyncio.TimeoutError:
+        status = "timeout"
+    except PyMongoError as e:
+        logger.warning(f"Profile section {name} failed: {e}")
+        status = "error"
+    except Exception as e:
+        if name in CRITICAL_SECTIONS:
+            raise
+        logger.exception(f"Profile section {name} failed: {e}")
+        status = "error"
+    timings[name] = SectionTiming(status=status, elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+    return result
 
 @router.get("/{user_id}", response_model=User)
 async def get_user(user_id: str):
-    """Get user by ID"""
+    """Get user by ID.
+
+    `points` is eventually consistent across workers: it includes this
+    worker's unflushed changes, and other workers' within a flush interval.
+    """
     user = await users_collection.find_one({"id": user_id})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    user["points"] = user.get("points", 0) + points_ledger.pending(user_id)
     return User(**user)
 
 @router.post("/", response_model=User)
@@ -22,39 +68,39 @@ async def create_user(user_data: UserCreate):
 
 @router.get("/{user_id}/profile", response_model=UserProfile)
 async def get_user_profile(user_id: str):
-    """Get complete user profile with cart and missions"""
-    # Get user
-    user = await users_collection.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Get cart items
-    cart_items = await cart_items_collection.find({"user_id": user_id}).to_list(100)
-    total_items = sum(item["quantity"] for item in cart_items)
-    total_amount = sum(item["price"] * item["quantity"] for item in cart_items)
-    
-    cart_summary = CartSummary(
-        items=cart_items,
-        total_items=total_items,
-        total_amount=total_amount
+    """Get complete user profile with cart and missions.
+
+    The three sub-queries run concurrently. A slow or failing cart or missions
+    query degrades to an empty section; `timings` reports what each leg did.
+    """
+    timings = {}
+    user, cart_summary, missions = await asyncio.gather(
+        _profile_section("user", users_collection.find_one({"id": user_id}), timings),
+        _profile_section("cart", get_cart_summary(user_id), timings),
+        _profile_section("missions", loyalty_missions_collection.find({"active": True}).to_list(10), timings),
     )
     
-    # Get active missions
-    missions = await loyalty_missions_collection.find({"active": True}).to_list(10)
+    if timings["user"].status != "ok":
+        raise HTTPException(status_code=504, detail="User lookup timed out or failed")
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user["points"] = user.get("points", 0) + points_ledger.pending(user_id)
     
     return UserProfile(
         user=User(**user),
-        cart_summary=cart_summary,
-        active_missions=missions
+        cart_summary=cart_summary or CartSummary(items=[], total_items=0, total_amount=0),
+        active_missions=missions or [],
+        timings=timings
     )
 
 @router.put("/{user_id}/points")
 async def update_user_points(user_id: str, points: int):
-    """Update user points"""
-    result = await users_collection.update_one(
-        {"id": user_id},
-        {"$inc": {"points": points}}
-    )
-    if result.modified_count == 0:
+    """Update user points.
+
+    The change is durable once this returns, but reaches the user's `points`
+    on other workers only after the next flush (POINTS_FLUSH_SECONDS).
+    """
+    # Append to the ledger; the user document is updated by the next coalesced flush
+    if await points_ledger.add(user_id, points) is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"message": "Points updated successfully"}
\ No newline at end of file
+    return {"message": "Points updated successfully"}
@@ -0,0 +1,249 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+import asyncio
+import logging
+from pymongo import UpdateOne
+from database import (
+    db, products_collection, bundles_collection, users_collection, loyalty_missions_collection,
+    meal_plans_collection, smart_tips_collection, job_state_collection
+)
+from locks import MongoLease
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the manifest below changes; every deployment applies it once
+SEED_VERSION = 1
+SEED_JOB_ID = "seed"
+
+# Sample Products
+SAMPLE_PRODUCTS = [
+    {
+        "id": "prod-1",
+        "name": "Masala Maggi",
+        "price": 120,
+        "original_price": 150,
+        "image": "https://images.unsplash.com/photo-1555939594-58d7cb561ad1?w=200&h=150&fit=crop",
+        "category": "food",
+        "description": "Delicious instant noodles"
+    },
+    {
+        "id": "prod-2",
+        "name": "Bluetooth Neckband",
+        "price": 799,
+        "original_price": 999,
+        "image": "https://images.unsplash.com/photo-1484704849700-f032a568e944?w=200&h=150&fit=crop",
+        "category": "electronics",
+        "description": "High quality wireless neckband"
+    },
+    {
+        "id": "prod-3",
+        "name": "Organic Face Wash",
+        "price": 299,
+        "original_price": 349,
+        "image": "https://images.unsplash.com/photo-1556228720-195a672e8a03?w=200&h=150&fit=crop",
+        "category": "beauty",
+        "description": "Natural organic face wash"
+    }
+]
+
+# Sample Bundles
+SAMPLE_BUNDLES = [
+    {
+        "id": "bundle-1",
+        "name": "Healthy Breakfast Pack",
+        "price": 399,
+        "original_price": 459,
+        "savings": 60,
+        "items_count": 5,
+        "image": "https://images.unsplash.com/photo-1551782450-a2132b4ba21d?w=300&h=200&fit=crop",
+        "product_ids": ["prod-1", "prod-3"]
+    },
+    {
+        "id": "bundle-2",
+        "name": "Rainy Day Essentials",
+        "price": 599,
+        "original_price": 699,
+        "savings": 100,
+        "items_count": 7,
+        "image": "https://images.unsplash.com/photo-1544551763-46a013bb70d5?w=300&h=200&fit=crop",
+        "product_ids": ["prod-2", "prod-3"]
+    },
+    {
+        "id": "bundle-3",
+        "name": "Back-to-College Kit",
+        "price": 899,
+        "original_price": 1099,
+        "savings": 200,
+        "items_count": 8,
+        "image": "https://images.unsplash.com/photo-1481627834876-b7833e8f5570?w=300&h=200&fit=crop",
+        "product_ids": ["prod-1", "prod-2"]
+    }
+]
+
+# Sample Users
+SAMPLE_USERS = [{
+    "id": "user-1",
+    "name": "Raj",
+    "location": "Chennai",
+    "points": 2450,
+    "savings_this_month": 1320
+}]
+
+# Sample Loyalty Missions
+SAMPLE_MISSIONS = [
+    {
+        "id": "mission-1",
+        "title": "Buy 2 new snacks",
+        "reward": "+100 points",
+        "progress": 0,
+        "target": 2,
+        "mission_type": "snacks",
+        "active": True
+    },
+    {
+        "id": "mission-2",
+        "title": "Try 1 new brand",
+        "reward": "Cashback unlocked",
+        "progress": 0,
+        "target": 1,
+        "mission_type": "brands",
+        "active": True
+    },
+    {
+        "id": "mission-3",
+        "title": "Buy from 3 different categories",
+        "reward": "Spin unlocked",
+        "progress": 1,
+        "target": 3,
+        "mission_type": "categories",
+        "active": True
+    }
+]
+
+# Sample Meal Plans
+SAMPLE_MEAL_PLANS = [
+    {
+        "id": "meal-1",
+        "goal_type": "Weight Loss",
+        "monday": ["Oats", "Grilled Chicken Salad", "Green Tea"],
+        "tuesday": ["Smoothie Bowl", "Quinoa Bowl", "Herbal Tea"],
+        "wednesday": ["Avocado Toast", "Fish Curry", "Lemon Water"],
+        "thursday": ["Protein Shake", "Veggie Wrap", "Green Tea"],
+        "friday": ["Greek Yogurt", "Chicken Breast", "Herbal Tea"],
+        "saturday": ["Oatmeal", "Tuna Salad", "Green Tea"],
+        "sunday": ["Smoothie", "Grilled Fish", "Lemon Water"],
+        "estimated_cost": 450,
+        "calories_per_day": 1200
+    },
+    {
+        "id": "meal-2",
+        "goal_type": "Family Dinners",
+        "monday": ["Pancakes", "Veg Biryani", "Milk"],
+        "tuesday": ["Poha", "Dal Chawal", "Lassi"],
+        "wednesday": ["Sandwich", "Chicken Curry", "Chai"],
+        "thursday": ["Paratha", "Mixed Vegetables", "Milk"],
+        "friday": ["Dosa", "Sambar Rice", "Buttermilk"],
+        "saturday": ["Idli", "Chole Bhature", "Lassi"],
+        "sunday": ["Upma", "Biryani", "Chai"],
+        "estimated_cost": 680,
+        "calories_per_day": 1800
+    },
+    {
+        "id": "meal-3",
+        "goal_type": "High Protein",
+        "monday": ["Protein Shake", "Grilled Fish", "Nuts"],
+        "tuesday": ["Egg Sandwich", "Chicken Breast", "Protein Bar"],
+        "wednesday": ["Greek Yogurt", "Lentil Curry", "Almonds"],
+        "thursday": ["Protein Smoothie", "Tofu Stir Fry", "Protein Bar"],
+        "friday": ["Egg Omelette", "Fish Curry", "Mixed Nuts"],
+        "saturday": ["Protein Pancakes", "Chicken Salad", "Protein Shake"],
+        "sunday": ["Greek Yogurt", "Grilled Chicken", "Almonds"],
+        "estimated_cost": 520,
+        "calories_per_day": 1600
+    }
+]
+
+# Sample Smart Tips
+SAMPLE_SMART_TIPS = [
+    {
+        "id": "tip-1",
+        "title": "Switch to Walmart brand detergent",
+        "savings": "₹75/month",
+        "image": "https://images.unsplash.com/photo-1556909114-f6e7ad7d3136?w=200&h=150&fit=crop",
+        "active": True
+    },
+    {
+        "id": "tip-2",
+        "title": "Buy groceries in bulk",
+        "savings": "₹120/month",
+        "image": "https://images.unsplash.com/photo-1542838132-92c53300491e?w=200&h=150&fit=crop",
+        "active": True
+    }
+]
+
+# collection -> (documents, mode). "replace" collections take the manifest's
+# fields on every version; "insert" collections (runtime state such as user
+# points) only get documents that don't exist yet.
+SEED_MANIFEST: Dict[str, Tuple[List[Dict[str, Any]], str]] = {
+    products_collection.name: (SAMPLE_PRODUCTS, "replace"),
+    bundles_collection.name: (SAMPLE_BUNDLES, "replace"),
+    users_collection.name: (SAMPLE_USERS, "insert"),
+    loyalty_missions_collection.name: (SAMPLE_MISSIONS, "insert"),
+    meal_plans_collection.name: (SAMPLE_MEAL_PLANS, "replace"),
+    smart_tips_collection.name: (SAMPLE_SMART_TIPS, "replace"),
+}
+
+def _upserts(documents: List[Dict[str, Any]], mode: str, now: datetime) -> List[UpdateOne]:
+    operations = []
+    for document in documents:
+        if mode == "replace":
+            update = {"$set": document, "$setOnInsert": {"created_at": now}}
+        else:
+            update = {"$setOnInsert": {**document, "created_at": now}}
+        operations.append(UpdateOne({"id": document["id"]}, update, upsert=True))
+    return operations
+
+async def _applied_version() -> int:
+    state = await job_state_collection.find_one({"id": SEED_JOB_ID}, {"_id": 0, "version": 1})
+    return state.get("version", 0) if state else 0
+
+async def apply_seed_manifest():
+    """Upsert every manifest collection in parallel, one unordered bulk_write each, then record the version"""
+    now = datetime.utcnow()
+    await asyncio.gather(*(
+        db[name].bulk_write(_upserts(documents, mode, now), ordered=False)
+        for name, (documents, mode) in SEED_MANIFEST.items()
+    ))
+    await job_state_collection.update_one(
+        {"id": SEED_JOB_ID}, {"$max": {"version": SEED_VERSION}, "$set": {"applied_at": now}}, upsert=True
+    )
+
+async def init_sample_data(wait_timeout: float = 30.0, poll: float = 0.5):
+    """Apply the seed manifest once per version across all workers.
+
+    Workers that find the current version recorded skip straight past. One
+    worker wins the seed lease and applies the manifest. The rest wait, up to
+    `wait_timeout`, for the winner to record the version, so no worker starts
+    serving (or indexing) before the sample data exists.
+    """
+    if await _applied_version() >= SEED_VERSION:
+        return
+    # Shorter than the wait, so a lease left by a crashed worker lapses while the others still poll
+    lease = MongoLease(SEED_JOB_ID, ttl=timedelta(seconds=wait_timeout / 2))
+    deadline = asyncio.get_running_loop().time() + wait_timeout
+    while True:
+        if await lease.acquire():
+            try:
+                # Another worker may have finished between our check and the acquire
+                if await _applied_version() < SEED_VERSION:
+                    await apply_seed_manifest()
+                    logger.info(f"Applied seed manifest version {SEED_VERSION}")
+            finally:
+                await lease.release()
+            return
+        await asyncio.sleep(poll)
+        if await _applied_version() >= SEED_VERSION:
+            return
+        if asyncio.get_running_loop().time() >= deadline:
+            logger.warning(f"Seed manifest version {SEED_VERSION} not applied after {wait_timeout}s; continuing")
+            return
@@ -0,0 +1,60 @@
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Type
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+# Trusted fast path for documents read from our own collections.
+#
+# Route handlers that return models pay for validation twice: once building the
+# model, and again when FastAPI dumps it and validates the dump against
+# response_model. Documents we wrote ourselves already match the model, so hot
+# list routes shape them with a precompiled RowSerializer and return the bytes
+# directly. The response_model stays on the route for the OpenAPI schema.
+
+def _dump_model(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """orjson encoding that also accepts (nested) pydantic models"""
+    return orjson.dumps(content, default=_dump_model)
+
+def trusted_response(content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """JSON response that skips FastAPI's response_model validation"""
+    return Response(content=dumps(content), media_type="application/json", headers=headers)
+
+class RowSerializer:
+    """Shape stored documents into a flat model's JSON fields without validating them.
+
+    Field names, aliases and defaults are read from the model once. A document
+    missing a required field falls back to full validation, so malformed rows
+    still fail the same way they did before.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.keys = tuple(field.alias or name for name, field in model.model_fields.items())
+        self._defaults = {
+            field.alias or name: field
+            for name, field in model.model_fields.items()
+            if not field.is_required()
+        }
+
+    def __call__(self, document: Mapping[str, Any]) -> Dict[str, Any]:
+        try:
+            return {key: document[key] for key in self.keys}
+        except KeyError:
+            pass
+        row = {}
+        for key in self.keys:
+            if key in document:
+                row[key] = document[key]
+            elif key in self._defaults:
+                row[key] = self._defaults[key].get_default(call_default_factory=True)
+            else:
+                return self.model(**document).model_dump(by_alias=True)
+        return row
+
+    def many(self, documents: Iterable[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+        return [self(document) for document in documents]
@@ -1,25 +1,101 @@
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
+import asyncio
 import os
 import logging
 from pathlib import Path
 
 # Import routes
 from routes import users, products, cart, missions, meal_plans, recommendations
-from database import init_sample_data
+import database
+from database import (
+    ensure_indexes, index_report, pool_stats,
+    products_collection, users_collection, orders_collection, cart_items_collection
+)
+from cache import catalog_cache
+from http_cache import catalog_versions
+from seed import init_sample_data
+from pagination import NEXT_CURSOR_HEADER
+from metrics import MetricsMiddleware, registry
+from services.search import product_search_index
+from services.vector_index import product_vector_index
+from services.trending import trending_engine
+from services.recommender import co_purchase_recommender
+from services.refill import refill_predictor
+from services.missions import mission_engine
+from services.points import points_ledger
+from services.catalog_snapshot import catalog_snapshot
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Readiness fails once this share of the connection pool is checked out
+MAX_POOL_SATURATION = float(os.environ.get("HEALTH_MAX_POOL_SATURATION", "0.9"))
+HEALTH_PING_TIMEOUT_SECONDS = float(os.environ.get("HEALTH_PING_TIMEOUT_SECONDS", "2"))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the Mongo pool, create indexes and seed, run the background workers, then tear it all down"""
+    app.state.ready = False
+    await database.warm_up()
+    await ensure_indexes()
+    await init_sample_data()
+    logger.info("✅ Database initialized with sample data")
+
+    # Long-running in-process workers, cancelled on shutdown
+    app.state.background_tasks = [
+        asyncio.create_task(product_search_index.keep_fresh(
+            products_collection, float(os.environ.get("SEARCH_INDEX_REFRESH_SECONDS", "30"))
+        )),
+        asyncio.create_task(product_vector_index.keep_fresh(
+            products_collection, float(os.environ.get("VECTOR_INDEX_REFRESH_SECONDS", "60"))
+        )),
+        asyncio.create_task(trending_engine.run(
+            users_collection, products_collection, float(os.environ.get("TRENDING_REFRESH_SECONDS", "30"))
+        )),
+        asyncio.create_task(co_purchase_recommender.keep_fresh(
+            orders_collection, cart_items_collection,
+            float(os.environ.get("RECOMMENDER_REFRESH_SECONDS", "60")),
+            float(os.environ.get("RECOMMENDER_REBUILD_SECONDS", "3600"))
+        )),
+        asyncio.create_task(refill_predictor.keep_fresh(
+            float(os.environ.get("REFILL_JOB_INTERVAL_SECONDS", "900"))
+        )),
+        asyncio.create_task(mission_engine.run(float(os.environ.get("MISSION_FLUSH_SECONDS", "1")))),
+        asyncio.create_task(points_ledger.run(float(os.environ.get("POINTS_FLUSH_SECONDS", "1")))),
+        asyncio.create_task(catalog_snapshot.keep_fresh(
+            products_collection, float(os.environ.get("CATALOG_SNAPSHOT_REFRESH_SECONDS", "30"))
+        )),
+        asyncio.create_task(catalog_versions.keep_fresh(float(os.environ.get("CATALOG_VERSIONS_POLL_SECONDS", "1")))),
+    ]
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        for task in app.state.background_tasks:
+            task.cancel()
+        try:
+            await points_ledger.flush()
+        except Exception as e:
+            # Entries stay in the ledger and are replayed on the next start
+            logger.warning(f"Final points flush failed: {e}")
+        database.close()
 
 # Create the main app without a prefix
-app = FastAPI(title="Walmart SmartCommerce+ API", version="1.0.0")
+app = FastAPI(
+    title="Walmart SmartCommerce+ API", version="1.0.0", lifespan=lifespan, default_response_class=ORJSONResponse
+)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -31,7 +107,41 @@ async def root():
 
 @api_router.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "walmart-smartcommerce-api"}
+    """Readiness probe: 503 until startup finishes, when Mongo is unreachable, or when the pool is saturated"""
+    pool = pool_stats.snapshot()
+    body = {"status": "healthy", "service": "walmart-smartcommerce-api", "pool": pool}
+    if not getattr(app.state, "ready", False):
+        body["status"] = "starting"
+    elif pool["saturation"] >= MAX_POOL_SATURATION:
+        body["status"] = "saturated"
+    else:
+        try:
+            body["mongo_ping_ms"] = round(await database.ping(HEALTH_PING_TIMEOUT_SECONDS), 3)
+        except Exception as e:
+            logger.warning(f"Health check ping failed: {e}")
+            body["status"] = "unavailable"
+    return JSONResponse(body, status_code=200 if body["status"] == "healthy" else 503)
+
+@api_router.get("/health/indexes")
+async def index_health():
+    """Report missing, unused and undeclared indexes per collection"""
+    return {"collections": await index_report()}
+
+@api_router.get("/health/cache")
+async def cache_health():
+    """Catalog cache size and hit/miss counters, plus the in-process mission and points buffers"""
+    return {
+        **catalog_cache.stats(),
+        "product_lookups": products.product_lookups.stats(),
+        "catalog_snapshot": catalog_snapshot.stats(),
+        "mission_engine": mission_engine.stats(),
+        "points_ledger": points_ledger.stats(),
+    }
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request and MongoDB command metrics in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 # Include all route modules
 api_router.include_router(users.router)
@@ -50,21 +160,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database with sample data on startup"""
-    await init_sample_data()
-    logger.info("✅ Database initialized with sample data")
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+# Added last so it is outermost and times the whole stack
+app.add_middleware(MetricsMiddleware)
@@ -0,0 +1 @@
+# Services package for Walmart SmartCommerce+ API
\ No newline at end of file
@@ -0,0 +1,29 @@
+from typing import List
+from models import Bundle, BundleWithProducts, Product
+from database import products_collection
+
+async def hydrate_bundles(bundles: List[Bundle]) -> List[BundleWithProducts]:
+    """Attach each bundle's products using one $in query across all bundles.
+
+    original_price, savings and items_count are recomputed from the live
+    product documents so they can't drift from the catalog.
+    """
+    product_ids = {product_id for bundle in bundles for product_id in bundle.product_ids}
+    products = {}
+    if product_ids:
+        async for product in products_collection.find({"id": {"$in": list(product_ids)}}, {"_id": 0}):
+            products[product["id"]] = Product(**product)
+
+    hydrated = []
+    for bundle in bundles:
+        found = [products[product_id] for product_id in bundle.product_ids if product_id in products]
+        original_price = sum(product.original_price or product.price for product in found)
+        hydrated.append(BundleWithProducts(
+            **bundle.dict(exclude={"original_price", "savings", "items_count"}),
+            original_price=original_price,
+            savings=max(original_price - bundle.price, 0),
+            items_count=len(found),
+            products=found,
+            missing_product_ids=[product_id for product_id in bundle.product_ids if product_id not in products]
+        ))
+    return hydrated
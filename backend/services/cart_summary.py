@@ -0,0 +1,45 @@
+from models import CartItem, CartSummary, CartTotals
+from database import cart_items_collection
+
+def _totals_stage():
+    return {"$group": {
+        "_id": None,
+        "line_items": {"$sum": 1},
+        "total_items": {"$sum": "$quantity"},
+        "total_amount": {"$sum": {"$multiply": ["$price", "$quantity"]}},
+    }}
+
+def _totals_from(groups, user_id: str) -> CartTotals:
+    totals = groups[0] if groups else {}
+    return CartTotals(
+        user_id=user_id,
+        line_items=totals.get("line_items", 0),
+        total_items=totals.get("total_items", 0),
+        total_amount=totals.get("total_amount", 0),
+    )
+
+async def get_cart_totals(user_id: str) -> CartTotals:
+    """Totals over the whole cart, computed in Mongo without transferring item payloads"""
+    groups = await cart_items_collection.aggregate([
+        {"$match": {"user_id": user_id}},
+        _totals_stage(),
+    ]).to_list(1)
+    return _totals_from(groups, user_id)
+
+async def get_cart_summary(user_id: str, limit: int = 100) -> CartSummary:
+    """First `limit` cart items plus totals over the whole cart, in one $facet round trip"""
+    result = await cart_items_collection.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$facet": {
+            "items": [{"$limit": limit}, {"$project": {"_id": 0}}],
+            "totals": [_totals_stage()],
+        }},
+    ]).to_list(1)
+    facets = result[0] if result else {"items": [], "totals": []}
+    totals = _totals_from(facets["totals"], user_id)
+    # Items come straight from our own collection, so they are not re-validated
+    return CartSummary.model_construct(
+        items=[CartItem.model_construct(**item) for item in facets["items"]],
+        total_items=totals.total_items,
+        total_amount=totals.total_amount
+    )
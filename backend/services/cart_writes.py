@@ -0,0 +1,166 @@
+from typing import Dict, List
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from models import CartItem, CartItemCreate, CartOperation, CartOperationResult
+from database import cart_items_collection, products_collection, bundles_collection
+
+DUPLICATE_KEY_ERROR = 11000
+
+def cart_item_upsert(user_id: str, item_data: CartItemCreate):
+    """Build the (filter, update) pair that adds item_data to a user's cart in one write"""
+    new_item = CartItem(**item_data.dict(exclude={"user_id"}), user_id=user_id).dict(
+        exclude={"user_id", "product_id", "quantity"}
+    )
+    return (
+        {"user_id": user_id, "product_id": item_data.product_id},
+        {"$inc": {"quantity": item_data.quantity}, "$setOnInsert": new_item}
+    )
+
+def _item_filter(user_id: str, operation: CartOperation):
+    if operation.item_id:
+        return {"user_id": user_id, "id": operation.item_id}
+    return {"user_id": user_id, "product_id": operation.product_id}
+
+async def apply_cart_batch(user_id: str, operations: List[CartOperation]) -> List[CartOperationResult]:
+    """Apply add/update/remove operations with one unordered bulk_write.
+
+    Bundle adds expand to their product_ids, and adds that don't carry
+    name/price/image are filled from the catalog; both lookups are single $in queries.
+    Update/remove targets are resolved with one more, and those matching no
+    cart item (nor a product added in the same batch) report "not_found", as
+    the single-item endpoints 404. Writes are unordered, so operations touching the same item in one batch
+    have no guaranteed order.
+    """
+    results = [CartOperationResult(index=index, op=operation.op, status="ok")
+               for index, operation in enumerate(operations)]
+
+    def fail(index: int, detail: str):
+        results[index].status = "error"
+        results[index].detail = detail
+        results[index].product_ids = []
+
+    def needs_lookup(operation: CartOperation):
+        return bool(operation.bundle_id) or None in (operation.product_name, operation.price, operation.image)
+
+    bundle_ids = {op.bundle_id for op in operations if op.op == "add" and op.bundle_id}
+    bundles = {}
+    if bundle_ids:
+        async for bundle in bundles_collection.find(
+            {"id": {"$in": list(bundle_ids)}}, {"_id": 0, "id": 1, "product_ids": 1}
+        ):
+            bundles[bundle["id"]] = bundle["product_ids"]
+
+    # Product ids each add operation expands to
+    adds: Dict[int, List[str]] = {}
+    for index, operation in enumerate(operations):
+        if operation.op == "add":
+            if operation.bundle_id:
+                if operation.bundle_id not in bundles:
+                    fail(index, "Bundle not found")
+                    continue
+                adds[index] = bundles[operation.bundle_id]
+            elif operation.product_id:
+                adds[index] = [operation.product_id]
+            else:
+                fail(index, "add requires product_id or bundle_id")
+                continue
+            if operation.quantity <= 0:
+                fail(index, "add requires a positive quantity")
+                adds.pop(index)
+        elif operation.op in ("update", "remove"):
+            if not (operation.item_id or operation.product_id):
+                fail(index, f"{operation.op} requires item_id or product_id")
+        else:
+            fail(index, f"Unknown operation {operation.op!r}")
+
+    lookup_ids = {
+        product_id
+        for index, product_ids in adds.items() if needs_lookup(operations[index])
+        for product_id in product_ids
+    }
+    products = {}
+    if lookup_ids:
+        async for product in products_collection.find(
+            {"id": {"$in": list(lookup_ids)}}, {"_id": 0, "id": 1, "name": 1, "price": 1, "image": 1}
+        ):
+            products[product["id"]] = product
+
+    targeted = [index for index, operation in enumerate(operations)
+                if operation.op in ("update", "remove") and results[index].status == "ok"]
+    if targeted:
+        item_ids = {operations[index].item_id for index in targeted if operations[index].item_id}
+        product_ids = {operations[index].product_id for index in targeted if not operations[index].item_id}
+        existing_items, existing_products = set(), {product_id for ids in adds.values() for product_id in ids}
+        async for item in cart_items_collection.find(
+            {"user_id": user_id, "$or": [{"id": {"$in": list(item_ids)}}, {"product_id": {"$in": list(product_ids)}}]},
+            {"_id": 0, "id": 1, "product_id": 1},
+        ):
+            existing_items.add(item["id"])
+            existing_products.add(item["product_id"])
+        for index in targeted:
+            operation = operations[index]
+            if operation.item_id:
+                found = operation.item_id in existing_items
+            else:
+                found = operation.product_id in existing_products
+            if not found:
+                results[index].status = "not_found"
+                results[index].detail = "Cart item not found"
+
+    requests = []
+    owners = []  # operation index for each request
+    for index, operation in enumerate(operations):
+        if results[index].status != "ok":
+            continue
+        if operation.op == "add":
+            for product_id in adds[index]:
+                product = products.get(product_id)
+                if product:
+                    item_data = CartItemCreate(
+                        user_id=user_id, product_id=product_id, product_name=product["name"],
+                        price=product["price"], image=product["image"], quantity=operation.quantity
+                    )
+                elif not needs_lookup(operation):
+                    item_data = CartItemCreate(
+                        user_id=user_id, product_id=product_id, product_name=operation.product_name,
+                        price=operation.price, image=operation.image, quantity=operation.quantity
+                    )
+                else:
+                    fail(index, f"Product {product_id} not found")
+                    break
+                filter_query, update = cart_item_upsert(user_id, item_data)
+                requests.append(UpdateOne(filter_query, update, upsert=True))
+                owners.append(index)
+                results[index].product_ids.append(product_id)
+        elif operation.op == "update" and operation.quantity > 0:
+            requests.append(UpdateOne(_item_filter(user_id, operation), {"$set": {"quantity": operation.quantity}}))
+            owners.append(index)
+        else:
+            # remove, or update to quantity <= 0
+            requests.append(DeleteOne(_item_filter(user_id, operation)))
+            owners.append(index)
+
+    # A failed bundle expansion must not leave its other products queued
+    kept = [i for i, owner in enumerate(owners) if results[owner].status == "ok"]
+    requests = [requests[i] for i in kept]
+    owners = [owners[i] for i in kept]
+
+    for attempt in range(2):
+        if not requests:
+            break
+        try:
+            await cart_items_collection.bulk_write(requests, ordered=False)
+            break
+        except BulkWriteError as e:
+            retry = []
+            for error in e.details["writeErrors"]:
+                position = error["index"]
+                if error["code"] == DUPLICATE_KEY_ERROR and attempt == 0:
+                    # Lost an upsert race; the retry takes the $inc path
+                    retry.append(position)
+                else:
+                    fail(owners[position], error.get("errmsg", "Write failed"))
+            requests = [requests[position] for position in retry]
+            owners = [owners[position] for position in retry]
+
+    return results
@@ -0,0 +1,381 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import os
+import numpy as np
+import watermarks
+
+logger = logging.getLogger(__name__)
+
+SORTS = ("discount", "price_asc", "price_desc", "newest")
+PROJECTION = {"_id": 0, "id": 1, "price": 1, "original_price": 1, "in_stock": 1, "category": 1, "created_at": 1}
+# Rows added since the last compaction are scanned directly; past this many, compact
+COMPACT_TAIL_ROWS = int(os.environ.get("CATALOG_SNAPSHOT_COMPACT_ROWS", "16384"))
+COLUMNS = {
+    "price": np.int32,
+    "original_price": np.int32,  # 0 when there is none
+    "discount": np.float32,  # percent off original_price
+    "in_stock": bool,
+    "category": np.int16,  # code into CatalogSnapshot.categories
+    "created_at": "datetime64[ms]",
+    "slot": np.int32,  # insertion number; index into the id list
+    "live": bool,  # False once an update has re-added the product to the tail
+}
+
+def sort_keys(columns: Dict[str, np.ndarray], sort: str, rows) -> np.ndarray:
+    """Ascending int64 keys for `sort` at `rows`"""
+    if sort == "discount":
+        return -np.round(columns["discount"][rows] * 100).astype(np.int64)  # basis points
+    if sort == "price_asc":
+        return columns["price"][rows].astype(np.int64)
+    if sort == "price_desc":
+        return -columns["price"][rows].astype(np.int64)
+    created = columns["created_at"][rows]  # newest first, undated last
+    return -np.where(np.isnat(created), 0, created.astype(np.int64))
+
+def _first_matches(order: np.ndarray, mask: Optional[np.ndarray], stop: int) -> np.ndarray:
+    """The first `stop` rows of `order` that pass `mask`, checking a growing chunk at a time"""
+    if mask is None:
+        return order[:stop]
+    found = []
+    got = 0
+    start, chunk = 0, 4096
+    while got < stop and start < len(order):
+        rows = order[start:start + chunk]
+        hits = rows[mask[rows]]
+        found.append(hits)
+        got += len(hits)
+        start += chunk
+        chunk *= 2
+    return np.concatenate(found)[:stop] if found else order[:0]
+
+def _first_set(mask: Optional[np.ndarray], size: int, stop: int) -> np.ndarray:
+    """Row numbers of the first `stop` set entries of `mask` (of every row when None)"""
+    if mask is None:
+        return np.arange(min(stop, size))
+    found = []
+    got = 0
+    start, chunk = 0, 4096
+    while got < stop and start < size:
+        hits = np.flatnonzero(mask[start:start + chunk]) + start
+        found.append(hits)
+        got += len(hits)
+        start += chunk
+        chunk *= 2
+    return np.concatenate(found)[:stop] if found else np.arange(0)
+
+class CatalogSnapshot:
+    """Columnar copy of the fields product listings filter, sort and facet on.
+
+    Each product is one row across parallel NumPy columns, with categories
+    dictionary-encoded to small integer codes. Compaction clusters rows by
+    category, so a category filter or count is a contiguous slice, and keeps a
+    presorted permutation per sort order, so a page is the first few mask hits
+    along it. Rows added since the last compaction form a short tail that
+    queries scan directly until the next compaction folds it in. Updating a
+    compacted product would break that layout, so its row is retired and the
+    new values go to the tail instead.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._count = 0
+        self._main = 0  # rows [0, _main) are compacted
+        self._dead = 0  # retired compacted rows, dropped by the next compaction
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._ids: List[str] = []  # by slot
+        self._slots: Dict[str, int] = {}
+        self._position = np.zeros(capacity, dtype=np.int32)  # slot -> row
+        self.categories: List[str] = []
+        self._category_codes: Dict[str, int] = {}
+        self._segments = np.zeros(1, dtype=np.int64)  # compacted rows of category c: [_segments[c], _segments[c + 1])
+        self._orders: Dict[str, np.ndarray] = {}
+        self.watermark: Optional[datetime] = None
+        self.ready = False
+        self.compactions = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _reserve(self, rows: int):
+        capacity = len(self._position)
+        if rows <= capacity:
+            return
+        capacity = max(rows, 2 * capacity)
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._count] = column[:self._count]
+            self._columns[name] = grown
+        position = np.zeros(capacity, dtype=np.int32)
+        position[:self._count] = self._position[:self._count]
+        self._position = position
+
+    def _code(self, category: Optional[str]) -> int:
+        category = category or ""
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def add(self, products: Sequence[Dict[str, Any]]):
+        """Insert or update rows for these products (as projected by PROJECTION).
+
+        New products, and new values for compacted ones, are appended to the
+        tail; products already in the tail are updated in place.
+        """
+        if not products:
+            return
+        size = len(products)
+        known = len(self._ids)
+        slots = np.empty(size, dtype=np.int64)
+        for i, product in enumerate(products):
+            slot = self._slots.get(product["id"])
+            if slot is None:
+                slot = self._slots[product["id"]] = len(self._ids)
+                self._ids.append(product["id"])
+            slots[i] = slot
+        existing = slots[slots < known]
+        moved = np.unique(existing[self._position[existing] < self._main])
+        if len(moved):
+            self._columns["live"][self._position[moved]] = False
+            self._dead += len(moved)
+        appended = np.concatenate([np.arange(known, len(self._ids)), moved])
+        self._reserve(self._count + len(appended))
+        self._position[appended] = np.arange(self._count, self._count + len(appended))
+        self._count += len(appended)
+        rows = self._position[slots]
+
+        price = np.fromiter((product.get("price") or 0 for product in products), dtype=np.int32, count=size)
+        original = np.fromiter((product.get("original_price") or 0 for product in products), dtype=np.int32, count=size)
+        created = [product.get("created_at") for product in products]
+        columns = self._columns
+        columns["price"][rows] = price
+        columns["original_price"][rows] = original
+        columns["discount"][rows] = np.where(original > price, 100.0 * (original - price) / np.maximum(original, 1), 0.0)
+        columns["in_stock"][rows] = np.fromiter(
+            (product.get("in_stock", True) for product in products), dtype=bool, count=size
+        )
+        columns["category"][rows] = np.fromiter(
+            (self._code(product.get("category")) for product in products), dtype=np.int16, count=size
+        )
+        columns["created_at"][rows] = np.array(
+            [stamp if isinstance(stamp, datetime) else None for stamp in created], dtype="datetime64[ms]"
+        )
+        columns["slot"][rows] = slots
+        columns["live"][rows] = True
+        stamps = [stamp for stamp in created if isinstance(stamp, datetime)]
+        if stamps:
+            self.watermark = watermarks.advance(self.watermark, max(stamps))
+
+    @staticmethod
+    def _cluster(columns: Dict[str, np.ndarray], categories: int):
+        """Reorder rows by category and presort every sort order; pure NumPy, so it runs off the event loop"""
+        order = np.argsort(columns["category"], kind="stable")
+        clustered = {name: column[order] for name, column in columns.items()}
+        segments = np.searchsorted(clustered["category"], np.arange(categories + 1)).astype(np.int64)
+        orders = {
+            sort: np.argsort(sort_keys(clustered, sort, slice(None)), kind="stable").astype(np.int32)
+            for sort in SORTS
+        }
+        return clustered, segments, orders
+
+    async def compact(self):
+        """Fold the tail into the clustered, presorted rows and drop retired ones.
+
+        Only new products can arrive while the sort runs (updates come from
+        the refresh loop that calls this), so rows appended meanwhile simply
+        become the new tail.
+        """
+        n = self._count
+        if n == self._main and not self._dead:
+            return
+        keep = np.flatnonzero(self._columns["live"][:n])
+        copies = {name: column[:n][keep] for name, column in self._columns.items()}
+        clustered, segments, orders = await asyncio.to_thread(self._cluster, copies, len(self.categories))
+        main, count = len(keep), self._count
+        tail = {name: column[n:count].copy() for name, column in self._columns.items()}
+        for name, column in self._columns.items():
+            column[:main] = clustered[name]
+            column[main:main + count - n] = tail[name]
+        self._position[clustered["slot"]] = np.arange(main, dtype=np.int32)
+        self._position[tail["slot"]] = np.arange(main, main + count - n, dtype=np.int32)
+        self._segments, self._orders, self._main = segments, orders, main
+        self._count, self._dead = main + count - n, 0
+        self.compactions += 1
+
+    def _conditions(self, start: int, stop: int, min_price, max_price, in_stock, min_discount) -> Optional[np.ndarray]:
+        """Which rows in [start, stop) pass the non-category filters; None when there are none"""
+        columns = self._columns
+        tests = []
+        if min_price is not None:
+            tests.append((np.greater_equal, "price", min_price))
+        if max_price is not None:
+            tests.append((np.less_equal, "price", max_price))
+        if in_stock is not None:
+            tests.append((np.equal, "in_stock", in_stock))
+        if min_discount is not None:
+            tests.append((np.greater_equal, "discount", min_discount))
+        mask = None
+        for compare, name, value in tests:
+            if mask is None:
+                mask = compare(columns[name][start:stop], value)
+            else:
+                mask &= compare(columns[name][start:stop], value)
+        return mask
+
+    def browse(
+        self,
+        categories: Optional[Iterable[str]] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        in_stock: Optional[bool] = None,
+        min_discount: Optional[float] = None,
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> Tuple[List[str], int, Dict[str, Any]]:
+        """One page of matching product ids in sort order, the total match count, and facet counts.
+
+        Category counts ignore the category filter itself, so a shopper sees
+        how many results each other category would add.
+        """
+        main, columns = self._main, self._columns
+        filters = (min_price, max_price, in_stock, min_discount)
+        codes = None
+        if categories is not None:
+            codes = sorted({self._category_codes[name] for name in categories if name in self._category_codes})
+
+        # Compacted rows: `others` applies every filter but category, `mask` all of them
+        others = self._conditions(0, main, *filters)
+        if self._dead:
+            live = self._columns["live"][:main]
+            others = live.copy() if others is None else others & live
+        segments = self._segments
+        clustered = len(segments) - 1  # categories that existed at the last compaction
+        category_counts = np.zeros(len(self.categories), dtype=np.int64)
+        for code in range(clustered):
+            start, stop = segments[code], segments[code + 1]
+            category_counts[code] = stop - start if others is None else np.count_nonzero(others[start:stop])
+        if codes is None:
+            mask, total = others, int(category_counts.sum())
+        else:
+            mask = np.zeros(main, dtype=bool)
+            for code in codes:
+                if code < clustered:
+                    start, stop = segments[code], segments[code + 1]
+                    mask[start:stop] = True if others is None else others[start:stop]
+            total = int(sum(category_counts[code] for code in codes if code < clustered))
+
+        # The tail is short enough to filter row by row
+        tail = np.arange(main, self._count)
+        tail_others = self._conditions(main, self._count, *filters)
+        if tail_others is not None:
+            tail = tail[tail_others]
+        category_counts += np.bincount(columns["category"][tail], minlength=len(self.categories))
+        if codes is not None:
+            tail = tail[np.isin(columns["category"][tail], codes)]
+        total += len(tail)
+
+        stop = offset + limit
+        if sort is None:
+            head = _first_set(mask, main, stop)
+            page = np.concatenate([head, tail[:max(stop - len(head), 0)]])[offset:stop]
+        else:
+            # The best `stop` compacted matches plus every tail match contain the page
+            head = _first_matches(self._orders[sort], mask, stop) if main else tail[:0]
+            candidates = np.concatenate([head, tail])
+            page = candidates[np.lexsort((candidates, sort_keys(columns, sort, candidates)))][offset:stop]
+
+        in_stock_column, discounted = columns["in_stock"][:main], columns["discount"][:main] > 0
+        if mask is not None:
+            in_stock_column, discounted = in_stock_column & mask, discounted & mask
+        ranges = [bounds for bounds in (self._price_range(mask), self._tail_price_range(tail)) if bounds]
+        facets = {
+            "categories": {name: int(n) for name, n in zip(self.categories, category_counts) if n and name},
+            "in_stock": int(np.count_nonzero(in_stock_column) + np.count_nonzero(columns["in_stock"][tail])),
+            "discounted": int(np.count_nonzero(discounted) + np.count_nonzero(columns["discount"][tail] > 0)),
+            "price": {"min": min(low for low, _ in ranges), "max": max(high for _, high in ranges)} if ranges else None,
+        }
+        return [self._ids[slot] for slot in columns["slot"][page]], total, facets
+
+    def _price_range(self, mask: Optional[np.ndarray]) -> Optional[Tuple[int, int]]:
+        """Cheapest and dearest compacted match, found by walking the price order from both ends"""
+        if not self._main:
+            return None
+        order = self._orders["price_asc"]
+        low = _first_matches(order, mask, 1)
+        if not len(low):
+            return None
+        high = _first_matches(order[::-1], mask, 1)
+        price = self._columns["price"]
+        return int(price[low[0]]), int(price[high[0]])
+
+    def _tail_price_range(self, tail: np.ndarray) -> Optional[Tuple[int, int]]:
+        if not len(tail):
+            return None
+        prices = self._columns["price"][tail]
+        return int(prices.min()), int(prices.max())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "products": len(self._ids),
+            "tail": self._count - self._main,
+            "retired": self._dead,
+            "categories": len(self.categories),
+            "column_bytes": int(
+                sum(column[:self._count].nbytes for column in self._columns.values())
+                + sum(order.nbytes for order in self._orders.values())
+            ),
+            "compactions": self.compactions,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "ready": self.ready,
+        }
+
+    async def _add_all(self, collection, query: Dict[str, Any], batch_size: int):
+        """Add every product matching `query` that isn't in the snapshot yet, holding one batch at a time"""
+        batch = []
+        async for product in collection.find(query, PROJECTION).batch_size(batch_size):
+            if product["id"] in self._slots:
+                continue
+            batch.append(product)
+            if len(batch) >= batch_size:
+                self.add(batch)
+                batch = []
+                await asyncio.sleep(0)
+        self.add(batch)
+
+    async def load(self, collection, batch_size: int = 5000):
+        """Build the snapshot from the whole collection"""
+        await self._add_all(collection, {}, batch_size)
+        await self.compact()
+        self.ready = True
+        logger.info(f"Catalog snapshot built: {len(self._ids)} products, {len(self.categories)} categories")
+
+    async def refresh(self, collection, batch_size: int = 5000):
+        """Add products other workers created since the watermark, compacting once the tail is long.
+
+        Read in batches like load(), so a bulk import elsewhere doesn't land here as one huge list.
+        """
+        await self._add_all(collection, watermarks.since(self.watermark), batch_size)
+        if self._count - self._main > COMPACT_TAIL_ROWS:
+            await self.compact()
+
+    async def keep_fresh(self, collection, interval: float):
+        """Load (retrying until it succeeds), then refresh every `interval` seconds"""
+        while True:
+            try:
+                await self.load(collection)
+                break
+            except Exception as e:
+                # /products/browse keeps answering 503 until a load completes
+                logger.warning(f"Catalog snapshot load failed, retrying in {interval}s: {e}")
+                await asyncio.sleep(interval)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(collection)
+            except Exception as e:
+                logger.warning(f"Catalog snapshot refresh failed: {e}")
+
+catalog_snapshot = CatalogSnapshot()
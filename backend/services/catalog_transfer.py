@@ -0,0 +1,146 @@
+from typing import AsyncIterator, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import orjson
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from models import Product, ProductCreate, ProductImportError, ProductImportResult
+from database import products_collection
+from serialization import RowSerializer
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.environ.get("CATALOG_EXPORT_BATCH_SIZE", "2000"))
+IMPORT_BATCH_SIZE = int(os.environ.get("CATALOG_IMPORT_BATCH_SIZE", "1000"))
+IMPORT_CONCURRENCY = int(os.environ.get("CATALOG_IMPORT_CONCURRENCY", "4"))
+IMPORT_MAX_ERRORS = 1000
+IMPORT_MAX_LINE_BYTES = 64 * 1024
+
+product_rows = RowSerializer(Product)
+
+async def export_products(category: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Yield the catalog as NDJSON, one chunk per cursor batch.
+
+    Only one batch is held at a time, so memory stays flat however large
+    the catalog is. Ordered by id so an export is reproducible.
+    """
+    filter_query = {"category": category} if category else {}
+    cursor = products_collection.find(filter_query, {"_id": 0}).sort("id", 1).batch_size(EXPORT_BATCH_SIZE)
+    lines: List[bytes] = []
+    async for product in cursor:
+        lines.append(orjson.dumps(product_rows(product)))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+async def _split_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """(line number, line) for each non-blank line of a chunked body"""
+    pending = b""
+    number = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+        if len(pending) > IMPORT_MAX_LINE_BYTES:
+            # Without a newline in sight the body can't be split safely; stop rather than buffer it all
+            raise ValueError(f"Line {number + 1} exceeds {IMPORT_MAX_LINE_BYTES} bytes")
+    if pending.strip():
+        yield number + 1, pending
+
+def _parse_row(line: bytes) -> dict:
+    """Validate one NDJSON row as a new product; an `id` in the row is kept so exports re-import cleanly"""
+    row = orjson.loads(line)
+    if not isinstance(row, dict):
+        raise ValueError("Expected a JSON object")
+    product = Product(**ProductCreate(**row).dict())
+    if isinstance(row.get("id"), str) and row["id"]:
+        product.id = row["id"]
+    return product.dict()
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+class _ImportRun:
+    """Counters and the capped error list for one import"""
+
+    def __init__(self):
+        self.lines = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[ProductImportError] = []
+
+    def fail(self, line: int, error: str, product_id: Optional[str] = None):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(ProductImportError(line=line, id=product_id, error=error))
+
+    def result(self) -> ProductImportResult:
+        self.errors.sort(key=lambda error: error.line)
+        return ProductImportResult(
+            lines=self.lines, inserted=self.inserted, failed=self.failed,
+            errors=self.errors, errors_truncated=self.failed > len(self.errors)
+        )
+
+async def import_products(chunks: AsyncIterator[bytes]) -> ProductImportResult:
+    """Validate NDJSON rows and insert them in unordered batches, several in flight at once.
+
+    Parsing waits whenever IMPORT_CONCURRENCY batches are already being
+    written, so at most that many batches (plus the one being filled) are in
+    memory. Rows are reported by line number when they fail validation or
+    the insert (e.g. a duplicate id).
+    """
+    run = _ImportRun()
+    in_flight = set()
+
+    async def insert(documents: List[dict], line_numbers: List[int]):
+        try:
+            result = await products_collection.insert_many(documents, ordered=False)
+            run.inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            run.inserted += e.details.get("nInserted", 0)
+            for write_error in e.details.get("writeErrors", []):
+                index = write_error["index"]
+                message = "Duplicate product id" if write_error.get("code") == 11000 else write_error.get("errmsg", "")
+                run.fail(line_numbers[index], message, documents[index]["id"])
+
+    async def submit(documents: List[dict], line_numbers: List[int]):
+        nonlocal in_flight
+        if len(in_flight) >= IMPORT_CONCURRENCY:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # surface anything other than per-row write errors
+        in_flight.add(asyncio.create_task(insert(documents, line_numbers)))
+
+    documents: List[dict] = []
+    line_numbers: List[int] = []
+    try:
+        async for number, line in _split_lines(chunks):
+            run.lines = number
+            try:
+                documents.append(_parse_row(line))
+                line_numbers.append(number)
+            except (ValueError, TypeError, ValidationError) as e:  # orjson.JSONDecodeError is a ValueError
+                run.fail(number, _describe(e))
+                continue
+            if len(documents) >= IMPORT_BATCH_SIZE:
+                await submit(documents, line_numbers)
+                documents, line_numbers = [], []
+    except ValueError as e:
+        # Oversized line: keep what was already parsed and report where parsing stopped
+        run.fail(run.lines + 1, str(e))
+    if documents:
+        await submit(documents, line_numbers)
+    if in_flight:
+        await asyncio.wait(in_flight)
+        for task in in_flight:
+            task.result()  # surface anything other than per-row write errors
+    logger.info(f"Product import: {run.inserted} inserted, {run.failed} failed out of {run.lines} lines")
+    return run.result()
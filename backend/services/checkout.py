@@ -0,0 +1,130 @@
+from fastapi import HTTPException
+from typing import Optional, Tuple
+from datetime import datetime, timedelta
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from models import Order, OrderItem
+from database import client, cart_items_collection, orders_collection
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ILLEGAL_OPERATION = 20  # server error code for transactions on a standalone mongod
+_transactions_supported = True
+# A fallback checkout's claim on cart rows is ignored after this long (the checkout died midway)
+CLAIM_TIMEOUT = timedelta(seconds=float(os.environ.get("CHECKOUT_CLAIM_TIMEOUT_SECONDS", "60")))
+
+def _order_from_cart(user_id: str, cart_items, idempotency_key: Optional[str]) -> Order:
+    items = [OrderItem(**item) for item in cart_items]
+    return Order(
+        user_id=user_id,
+        items=items,
+        total_items=sum(item.quantity for item in items),
+        total_amount=sum(item.price * item.quantity for item in items),
+        idempotency_key=idempotency_key
+    )
+
+async def _checkout_in_transaction(user_id: str, idempotency_key: Optional[str]) -> Optional[Order]:
+    """Snapshot, persist and clear the cart atomically; write conflicts with concurrent cart edits are retried"""
+    async def place(session):
+        cart_items = await cart_items_collection.find(
+            {"user_id": user_id}, {"_id": 0}, session=session
+        ).to_list(None)
+        if not cart_items:
+            return None
+        order = _order_from_cart(user_id, cart_items, idempotency_key)
+        await orders_collection.insert_one(order.dict(), session=session)
+        await cart_items_collection.delete_many(
+            {"user_id": user_id, "id": {"$in": [item["id"] for item in cart_items]}}, session=session
+        )
+        return order
+
+    async with await client.start_session() as session:
+        return await session.with_transaction(place)
+
+async def _checkout_with_conditional_move(user_id: str, idempotency_key: Optional[str]) -> Optional[Order]:
+    """Standalone-server fallback: claim the cart rows, persist the order, then remove the claimed quantities.
+
+    The claim is what keeps two concurrent checkouts from both ordering the
+    same cart: only one of them can tag a row, so the other finds nothing to
+    order. Claims left behind by a crashed checkout lapse after CLAIM_TIMEOUT.
+    """
+    checkout_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    await cart_items_collection.update_many(
+        {"user_id": user_id, "$or": [
+            {"checkout_id": {"$exists": False}},
+            {"checkout_at": {"$lt": now - CLAIM_TIMEOUT}},
+        ]},
+        {"$set": {"checkout_id": checkout_id, "checkout_at": now}}
+    )
+    cart_items = await cart_items_collection.find(
+        {"user_id": user_id, "checkout_id": checkout_id}, {"_id": 0, "checkout_id": 0, "checkout_at": 0}
+    ).to_list(None)
+    if not cart_items:
+        return None
+    try:
+        order = _order_from_cart(user_id, cart_items, idempotency_key)
+        await orders_collection.insert_one(order.dict())
+    except BaseException:
+        # Nothing was ordered, so hand the rows back to the cart
+        await cart_items_collection.update_many(
+            {"checkout_id": checkout_id}, {"$unset": {"checkout_id": "", "checkout_at": ""}}
+        )
+        raise
+
+    # Rows still at their claimed quantity are deleted; rows a concurrent add bumped
+    # are decremented by the claimed quantity and released, so nothing added meanwhile is lost.
+    requests = []
+    for item in cart_items:
+        requests.append(DeleteOne({"id": item["id"], "checkout_id": checkout_id, "quantity": item["quantity"]}))
+        requests.append(UpdateOne(
+            {"id": item["id"], "checkout_id": checkout_id, "quantity": {"$gt": item["quantity"]}},
+            {"$inc": {"quantity": -item["quantity"]}, "$unset": {"checkout_id": "", "checkout_at": ""}}
+        ))
+    await cart_items_collection.bulk_write(requests, ordered=True)
+    return order
+
+async def _find_order(user_id: str, idempotency_key: str) -> Optional[Order]:
+    order = await orders_collection.find_one(
+        {"user_id": user_id, "idempotency_key": idempotency_key}, {"_id": 0}
+    )
+    return Order(**order) if order else None
+
+async def place_order(user_id: str, idempotency_key: Optional[str] = None) -> Tuple[Order, bool]:
+    """Turn the user's cart into a persisted order.
+
+    Returns (order, replayed); replayed is True when the idempotency key
+    matched an earlier checkout and its stored order is returned instead.
+    """
+    global _transactions_supported
+
+    if idempotency_key:
+        existing = await _find_order(user_id, idempotency_key)
+        if existing:
+            return existing, True
+
+    try:
+        order = None
+        if _transactions_supported:
+            try:
+                order = await _checkout_in_transaction(user_id, idempotency_key)
+            except OperationFailure as e:
+                if e.code != ILLEGAL_OPERATION:
+                    raise
+                _transactions_supported = False
+                logger.info("Transactions unavailable; checkout falls back to conditional cart moves")
+        if not _transactions_supported:
+            order = await _checkout_with_conditional_move(user_id, idempotency_key)
+    except DuplicateKeyError:
+        # A concurrent request with the same idempotency key placed the order first
+        existing = await _find_order(user_id, idempotency_key)
+        if not existing:
+            raise
+        return existing, True
+
+    if order is None:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    return order, False
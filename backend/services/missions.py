@@ -0,0 +1,218 @@
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import loyalty_missions_collection, mission_progress_collection, products_collection
+import events
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+SNACK_CATEGORIES = {"snacks", "food"}
+
+def _brand(product: Dict[str, Any]) -> Optional[str]:
+    # Products have no brand field yet; the leading word of the name stands in for it
+    if product.get("brand"):
+        return product["brand"].lower()
+    words = (product.get("name") or "").split()
+    return words[0].lower() if words else None
+
+# mission_type -> what a product contributes; progress counts distinct values new to the user
+MISSION_RULES: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    "snacks": lambda product: product["id"] if product.get("category") in SNACK_CATEGORIES else None,
+    "brands": _brand,
+    "categories": lambda product: product.get("category"),
+}
+
+Event = Tuple[str, List[str], datetime]  # user id, product ids, when
+
+def plan_updates(
+    batch: Iterable[Event],
+    products: Dict[str, Dict[str, Any]],
+    seen: Dict[str, Dict[str, List[str]]],
+    missions: Dict[str, List[str]],
+) -> Dict[str, UpdateOne]:
+    """One upsert per user covering every event in the batch.
+
+    `seen` holds each user's already-counted values per mission type and
+    `missions` lists the active mission ids per type. Every new value is
+    $addToSet into the user's seen list and $inc'ed onto each mission of that
+    type, so one write fans out to all matching missions. The filter requires
+    the new values to still be unseen; if another worker counted them first,
+    the write matches nothing and the user is replanned.
+    """
+    keys: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+    first_at: Dict[str, datetime] = {}
+    for user_id, product_ids, at in batch:
+        first_at[user_id] = min(first_at.get(user_id, at), at)
+        for product_id in product_ids:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            for mission_type, rule in MISSION_RULES.items():
+                value = rule(product)
+                if value:
+                    keys[user_id][mission_type].add(value)
+
+    now = datetime.utcnow()
+    updates = {}
+    for user_id, by_type in keys.items():
+        user_seen = seen.get(user_id, {})
+        filter_query: Dict[str, Any] = {"user_id": user_id}
+        add, inc = {}, {}
+        for mission_type, values in by_type.items():
+            new = sorted(values.difference(user_seen.get(mission_type, ())))
+            if not new:
+                continue
+            filter_query[f"seen.{mission_type}"] = {"$nin": new}
+            add[f"seen.{mission_type}"] = {"$each": new}
+            for mission_id in missions.get(mission_type, ()):
+                inc[f"progress.{mission_id}"] = len(new)
+        if not add:
+            continue
+        update = {
+            "$addToSet": add,
+            "$min": {"first_activity_at": first_at[user_id]},
+            "$set": {"updated_at": now},
+        }
+        if inc:
+            update["$inc"] = inc
+        updates[user_id] = UpdateOne(filter_query, update, upsert=True)
+    return updates
+
+class MissionEngine:
+    """Per-user mission progress driven by cart and checkout events.
+
+    Event handlers only enqueue. A background loop drains the queue in
+    batches; each batch costs one $in for product details, one $in for the
+    users' progress documents and one unordered bulk_write.
+    """
+
+    def __init__(self, batch_size: int = 1000, mission_ttl: float = 30.0):
+        self.batch_size = batch_size
+        self.mission_ttl = mission_ttl
+        self._queue: Deque[Event] = deque(maxlen=200000)
+        self._wakeup = asyncio.Event()
+        self._missions: Dict[str, List[str]] = {}
+        self._missions_loaded_at: Optional[float] = None
+        self.processed = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    def on_cart_item_added(self, event: Dict[str, Any]):
+        self._enqueue((event["user_id"], [event["product_id"]], event["at"]))
+
+    def on_order_placed(self, event: Dict[str, Any]):
+        self._enqueue((event["user_id"], [item["product_id"] for item in event["items"]], event["at"]))
+
+    def _enqueue(self, event: Event):
+        self._queue.append(event)
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def subscribe(self):
+        events.subscribe(events.CART_ITEM_ADDED, self.on_cart_item_added)
+        events.subscribe(events.ORDER_PLACED, self.on_order_placed)
+
+    async def missions_by_type(self) -> Dict[str, List[str]]:
+        """Active mission ids per mission_type, reloaded every `mission_ttl` seconds"""
+        if self._missions_loaded_at is None or time.monotonic() - self._missions_loaded_at > self.mission_ttl:
+            missions = defaultdict(list)
+            async for mission in loyalty_missions_collection.find(
+                {"active": True}, {"_id": 0, "id": 1, "mission_type": 1}
+            ):
+                missions[mission["mission_type"]].append(mission["id"])
+            self._missions = dict(missions)
+            self._missions_loaded_at = time.monotonic()
+        return self._missions
+
+    async def process(self, batch: List[Event], attempts: int = 3):
+        """Apply a batch of events, replanning users whose seen values changed underneath us"""
+        started = time.perf_counter()
+        missions = await self.missions_by_type()
+        product_ids = list({product_id for _, product_ids, _ in batch for product_id in product_ids})
+        products = {
+            product["id"]: product
+            async for product in products_collection.find(
+                {"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "name": 1, "category": 1, "brand": 1}
+            )
+        }
+
+        pending = batch
+        for _ in range(attempts):
+            user_ids = list({user_id for user_id, _, _ in pending})
+            seen = {
+                doc["user_id"]: doc.get("seen", {})
+                async for doc in mission_progress_collection.find(
+                    {"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "seen": 1}
+                )
+            }
+            updates = plan_updates(pending, products, seen, missions)
+            if not updates:
+                break
+            conflicted = set()
+            user_order = list(updates)
+            try:
+                await mission_progress_collection.bulk_write(list(updates.values()), ordered=False)
+            except BulkWriteError as e:
+                # The filter missed an existing document (a racing worker counted the values), so
+                # the upsert collided with the unique user_id index
+                for error in e.details.get("writeErrors", []):
+                    if error.get("code") != DUPLICATE_KEY:
+                        raise
+                    conflicted.add(user_order[error["index"]])
+            if not conflicted:
+                break
+            pending = [event for event in pending if event[0] in conflicted]
+        else:
+            logger.warning(f"Gave up on mission progress for {len(conflicted)} users after {attempts} attempts")
+
+        self.processed += len(batch)
+        self.batches += 1
+        self.busy_seconds += time.perf_counter() - started
+
+    async def drain(self):
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            await self.process(batch)
+
+    async def run(self, interval: float):
+        """Subscribe to events and process them every `interval` seconds, or sooner once a
+        full batch is queued"""
+        self.subscribe()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.drain()
+            except Exception as e:
+                logger.warning(f"Mission progress update failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "processed": self.processed,
+            "batches": self.batches,
+            "events_per_second": round(self.processed / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+        }
+
+async def get_user_progress(user_id: str) -> List[Dict[str, Any]]:
+    """Active missions with this user's progress, capped at each mission's target"""
+    missions, progress = await asyncio.gather(
+        loyalty_missions_collection.find({"active": True}, {"_id": 0}).to_list(100),
+        mission_progress_collection.find_one({"user_id": user_id}, {"_id": 0, "progress": 1}),
+    )
+    counts = (progress or {}).get("progress", {})
+    for mission in missions:
+        mission["user_progress"] = min(counts.get(mission["id"], 0), mission["target"])
+        mission["completed"] = mission["user_progress"] >= mission["target"]
+    return missions
+
+mission_engine = MissionEngine()
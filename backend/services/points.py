@@ -0,0 +1,237 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+import uuid
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models import PointsLedgerEntry
+from database import points_ledger_collection, users_collection
+
+logger = logging.getLogger(__name__)
+
+# How many flush ids a user document remembers to make re-applying a flush a no-op;
+# must exceed the flushes one user can receive before a stuck flush is replayed
+APPLIED_FLUSHES_KEPT = 100
+
+class PointsLedger:
+    """Write-behind loyalty points.
+
+    Every change is first appended to the points_ledger collection. That insert
+    is the durable record, and no request touches the hot user document.
+    Changes arriving while an insert is in flight are group-committed: the
+    next batch checks its users with one query and inserts with one
+    insert_many, so a burst costs two round trips rather than two per event.
+    Deltas then wait in an in-process buffer and are applied in one bulk_write
+    of per-user $incs once `max_entries` accumulate or every flush interval.
+
+    A flush claims its entries with a flush id, sums them per user and applies
+    each sum guarded by that id, which the user document remembers. Only then
+    does it mark the entries applied. replay() re-runs interrupted flushes and
+    claims stale unclaimed entries, so a crash between any two steps neither
+    loses nor double-counts points.
+    """
+
+    def __init__(self, max_entries: int = 500, stale_after: timedelta = timedelta(minutes=1)):
+        self.max_entries = max_entries
+        self.stale_after = stale_after
+        self._buffer: Dict[str, List[Tuple[str, int]]] = defaultdict(list)  # user id -> (entry id, delta)
+        self._pending: Dict[str, int] = defaultdict(int)  # user id -> summed deltas not yet on the user document
+        self._in_flight: Dict[str, Dict[str, int]] = {}  # flush id -> its share of _pending, until its $incs are sent
+        self._buffered = 0
+        self._writes: List[Tuple[PointsLedgerEntry, asyncio.Future]] = []  # waiting for the next insert_many
+        self._writing = False
+        self._writer: Optional[asyncio.Future] = None
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self.flushes = 0
+        self.entries_flushed = 0
+        self.ledger_writes = 0
+
+    def pending(self, user_id: str) -> int:
+        """Points added by this worker that are not on the user document yet.
+
+        Other workers' pending points are invisible here until they flush.
+        """
+        return self._pending.get(user_id, 0)
+
+    async def add(self, user_id: str, delta: int, reason: str = "api") -> Optional[PointsLedgerEntry]:
+        """Durably record a points change; None when the user doesn't exist"""
+        entry = PointsLedgerEntry(user_id=user_id, delta=delta, reason=reason)
+        future = asyncio.get_running_loop().create_future()
+        self._writes.append((entry, future))
+        if not self._writing:
+            # A task rather than this request, so a disconnecting client can't strand the batch
+            self._writing = True
+            self._writer = asyncio.ensure_future(self._write_queued())
+        return await future
+
+    async def _write_queued(self):
+        try:
+            while self._writes:
+                batch, self._writes = self._writes, []
+                try:
+                    accepted, rejected = await self._write(batch)
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for entry, future in batch:
+                    if future.done():
+                        continue
+                    if entry.id in rejected:
+                        future.set_exception(rejected[entry.id])
+                    else:
+                        future.set_result(entry if entry.id in accepted else None)
+        finally:
+            self._writing = False
+
+    async def _write(
+        self, batch: List[Tuple[PointsLedgerEntry, asyncio.Future]]
+    ) -> Tuple[Set[str], Dict[str, Exception]]:
+        """Insert the entries of known users and buffer the ones that landed for the next flush.
+
+        Returns the ids inserted and, for a partially failed insert, the error of each rejected id.
+        """
+        users = await users_collection.distinct("id", {"id": {"$in": list({entry.user_id for entry, _ in batch})}})
+        known = set(users)
+        entries = [entry for entry, _ in batch if entry.user_id in known]
+        rejected: Dict[str, Exception] = {}
+        if entries:
+            try:
+                await points_ledger_collection.insert_many([entry.dict() for entry in entries], ordered=False)
+            except BulkWriteError as e:
+                # Unordered: every entry not listed in writeErrors was inserted
+                for error in e.details.get("writeErrors", []):
+                    rejected[entries[error["index"]].id] = BulkWriteError({"writeErrors": [error]})
+                entries = [entry for entry in entries if entry.id not in rejected]
+            self.ledger_writes += 1
+        for entry in entries:
+            self._buffer[entry.user_id].append((entry.id, entry.delta))
+            self._pending[entry.user_id] += entry.delta
+        self._buffered += len(entries)
+        if self._buffered >= self.max_entries:
+            self._full.set()
+        return {entry.id for entry in entries}, rejected
+
+    def _release(self, flush_id: str) -> Dict[str, int]:
+        """Stop counting a flush's deltas as pending; they are about to land on the user documents"""
+        sums = self._in_flight.pop(flush_id, {})
+        for user_id, delta in sums.items():
+            self._pending[user_id] -= delta
+            if not self._pending[user_id]:
+                del self._pending[user_id]
+        return sums
+
+    def _hold(self, flush_id: str, sums: Dict[str, int]):
+        """Undo _release after the user write failed; the next replay of the flush releases again"""
+        if sums:
+            self._in_flight[flush_id] = sums
+            for user_id, delta in sums.items():
+                self._pending[user_id] += delta
+
+    async def _apply(self, flush_id: str) -> int:
+        """Apply one claimed flush; safe to repeat"""
+        sums = await points_ledger_collection.aggregate([
+            {"$match": {"applied": False, "flush_id": flush_id}},
+            {"$group": {"_id": "$user_id", "delta": {"$sum": "$delta"}, "entries": {"$sum": 1}}},
+        ]).to_list(None)
+        # Drop the deltas from pending() before they land, so profile reads never count them twice
+        released = self._release(flush_id)
+        if not sums:
+            return 0
+        try:
+            await users_collection.bulk_write([
+                UpdateOne(
+                    {"id": group["_id"], "points_flushes": {"$ne": flush_id}},
+                    {
+                        "$inc": {"points": group["delta"]},
+                        "$push": {"points_flushes": {"$each": [flush_id], "$slice": -APPLIED_FLUSHES_KEPT}},
+                    },
+                )
+                for group in sums
+            ], ordered=False)
+        except Exception:
+            self._hold(flush_id, released)
+            raise
+        await points_ledger_collection.update_many(
+            {"applied": False, "flush_id": flush_id}, {"$set": {"applied": True}}
+        )
+        return sum(group["entries"] for group in sums)
+
+    async def flush(self):
+        """Apply everything buffered so far in one claim, one aggregation and one bulk_write"""
+        async with self._lock:
+            if not self._buffered:
+                return
+            buffer, self._buffer, self._buffered = self._buffer, defaultdict(list), 0
+            self._full.clear()
+            flush_id = str(uuid.uuid4())
+            try:
+                await points_ledger_collection.update_many(
+                    {"id": {"$in": [entry_id for entries in buffer.values() for entry_id, _ in entries]}, "flush_id": None},
+                    {"$set": {"flush_id": flush_id}},
+                )
+            except Exception:
+                # Nothing claimed; the next flush tries these entries again
+                for user_id, entries in buffer.items():
+                    self._buffer[user_id].extend(entries)
+                    self._buffered += len(entries)
+                raise
+            # From here the ledger owns these deltas; a failed flush stays pending until replay() applies it
+            self._in_flight[flush_id] = {
+                user_id: sum(delta for _, delta in entries) for user_id, entries in buffer.items()
+            }
+            self.entries_flushed += await self._apply(flush_id)
+            self.flushes += 1
+
+    async def replay(self):
+        """Finish flushes interrupted by a crash and apply entries nobody claimed"""
+        stuck = await points_ledger_collection.distinct("flush_id", {"applied": False, "flush_id": {"$ne": None}})
+        # Unclaimed entries older than any live buffer belong to a worker that died before flushing
+        flush_id = str(uuid.uuid4())
+        orphaned = await points_ledger_collection.update_many(
+            {"applied": False, "flush_id": None, "created_at": {"$lt": datetime.utcnow() - self.stale_after}},
+            {"$set": {"flush_id": flush_id}},
+        )
+        if orphaned.modified_count:
+            stuck.append(flush_id)
+        replayed = 0
+        for flush_id in stuck:
+            replayed += await self._apply(flush_id)
+        if replayed:
+            logger.info(f"Replayed {replayed} points ledger entries from {len(stuck)} flushes")
+
+    async def run(self, interval: float):
+        """Replay the ledger, then flush on size or every `interval` seconds, replaying again
+        every `stale_after` to pick up failed flushes"""
+        replayed_at = None
+        while True:
+            try:
+                if replayed_at is None or datetime.utcnow() - replayed_at >= self.stale_after:
+                    await self.replay()
+                    replayed_at = datetime.utcnow()
+            except Exception as e:
+                logger.warning(f"Points ledger replay failed: {e}")
+            try:
+                await asyncio.wait_for(self._full.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Points ledger flush failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffered": self._buffered,
+            "in_flight_flushes": len(self._in_flight),
+            "flushes": self.flushes,
+            "entries_flushed": self.entries_flushed,
+            "ledger_writes": self.ledger_writes,
+        }
+
+points_ledger = PointsLedger(max_entries=int(os.environ.get("POINTS_FLUSH_MAX_ENTRIES", "500")))
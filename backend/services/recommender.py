@@ -0,0 +1,223 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import asyncio
+import logging
+import time
+import numpy as np
+import watermarks
+
+logger = logging.getLogger(__name__)
+
+ORDER_PROJECTION = {"_id": 0, "id": 1, "items.product_id": 1, "created_at": 1}
+
+class CoPurchaseRecommender:
+    """Item-item co-occurrence recommender over baskets (orders and carts).
+
+    Products get dense indices in first-seen order. Co-occurrence counts live
+    in CSR arrays (indptr, indices, data), where row i holds the products
+    bought together with product i. Newly added baskets collect as pending
+    (row, col) pairs. Queries read those pending pairs too, and they are
+    merged into the CSR once `merge_threshold` of them pile up.
+    """
+
+    def __init__(self, max_basket: int = 50, merge_threshold: int = 200000):
+        self.max_basket = max_basket  # pairs grow quadratically; trim pathological baskets
+        self.merge_threshold = merge_threshold
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._data = np.zeros(0, dtype=np.float32)
+        self._frequency = np.zeros(0, dtype=np.float32)  # baskets containing each product
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_pairs = 0
+        self._pending_arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None  # concatenated lazily
+        self.baskets = 0
+        self.watermark: Optional[datetime] = None  # newest order created_at seen
+        self._at_watermark: Set[str] = set()  # ids of orders counted in the watermark's millisecond
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def nnz(self) -> int:
+        return len(self._indices)
+
+    def _encode(self, basket: Sequence[str]) -> np.ndarray:
+        rows = []
+        for product_id in dict.fromkeys(basket):
+            row = self._index.get(product_id)
+            if row is None:
+                row = self._index[product_id] = len(self._ids)
+                self._ids.append(product_id)
+            rows.append(row)
+        return np.array(rows[:self.max_basket], dtype=np.int32)
+
+    @staticmethod
+    def _pairs(baskets: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Every ordered (i, j), i != j pair within each basket, generated per basket size"""
+        by_size: Dict[int, List[np.ndarray]] = {}
+        for basket in baskets:
+            if len(basket) > 1:
+                by_size.setdefault(len(basket), []).append(basket)
+        rows, cols = [], []
+        for size, group in by_size.items():
+            matrix = np.stack(group)
+            left, right = np.nonzero(~np.eye(size, dtype=bool))
+            rows.append(matrix[:, left].ravel())
+            cols.append(matrix[:, right].ravel())
+        if not rows:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return np.concatenate(rows), np.concatenate(cols)
+
+    def add_baskets(self, baskets: Iterable[Sequence[str]]):
+        """Count co-occurrences for new baskets of product ids"""
+        encoded = [self._encode(basket) for basket in baskets]
+        if not encoded:
+            return
+        self.baskets += len(encoded)
+        if len(self._ids) > len(self._frequency):
+            self._frequency = np.concatenate([self._frequency, np.zeros(len(self._ids) - len(self._frequency), dtype=np.float32)])
+        self._frequency += np.bincount(np.concatenate(encoded), minlength=len(self._ids)).astype(np.float32)
+
+        rows, cols = self._pairs(encoded)
+        if len(rows):
+            self._pending.append((rows, cols))
+            self._pending_pairs += len(rows)
+            self._pending_arrays = None
+        if self._pending_pairs >= self.merge_threshold:
+            self.merge()
+
+    def merge(self):
+        """Fold pending pairs into the CSR arrays, summing duplicates"""
+        if not self._pending:
+            return
+        n = len(self._ids)
+        existing_rows = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int64), np.diff(self._indptr))
+        rows = np.concatenate([existing_rows] + [pending[0].astype(np.int64) for pending in self._pending])
+        cols = np.concatenate([self._indices.astype(np.int64)] + [pending[1].astype(np.int64) for pending in self._pending])
+        weights = np.concatenate([self._data] + [np.ones(len(pending[0]), dtype=np.float32) for pending in self._pending])
+        self._pending, self._pending_pairs, self._pending_arrays = [], 0, None
+
+        # Row-major keys sort straight into CSR order
+        keys, inverse = np.unique(rows * n + cols, return_inverse=True)
+        self._data = np.bincount(inverse, weights=weights).astype(np.float32)
+        self._indices = (keys % n).astype(np.int32)
+        self._indptr = np.searchsorted(keys // n, np.arange(n + 1)).astype(np.int64)
+
+    def _pending_concatenated(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._pending_arrays is None:
+            if self._pending:
+                self._pending_arrays = (np.concatenate([rows for rows, _ in self._pending]),
+                                        np.concatenate([cols for _, cols in self._pending]))
+            else:
+                self._pending_arrays = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+        return self._pending_arrays
+
+    def recommend(self, product_ids: Sequence[str], k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (product id, score) bought together with any of `product_ids`.
+
+        Co-occurrence counts are summed over the query items and divided by
+        sqrt(frequency) so best sellers don't top every list.
+        """
+        rows = np.unique([self._index[p] for p in product_ids if p in self._index]).astype(np.int64)
+        if not len(rows):
+            return []
+
+        # Gather the CSR slices of all query rows in one pass
+        csr_rows = rows[rows < len(self._indptr) - 1]
+        starts = self._indptr[csr_rows]
+        lengths = self._indptr[csr_rows + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        cols, weights = self._indices[positions], self._data[positions]
+
+        pending_rows, pending_cols = self._pending_concatenated()
+        if len(pending_rows):
+            matched = pending_cols[np.isin(pending_rows, rows)]
+            cols = np.concatenate([cols, matched])
+            weights = np.concatenate([weights, np.ones(len(matched), dtype=np.float32)])
+
+        candidates, inverse = np.unique(cols, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights) / np.sqrt(self._frequency[candidates])
+        scores[np.isin(candidates, rows)] = 0
+        if len(candidates) > k:
+            top = np.argpartition(scores, -k)[-k:]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(self._ids[candidates[i]], float(scores[i])) for i in order if scores[i] > 0]
+
+    def swap(self, other: "CoPurchaseRecommender"):
+        """Adopt another instance's model, e.g. one rebuilt off to the side"""
+        self.__dict__.update(other.__dict__)
+
+    def _advance_watermark(self, order: Dict[str, Any]):
+        created_at = order.get("created_at")
+        if not isinstance(created_at, datetime):
+            return
+        created_at = watermarks.truncate(created_at)
+        if self.watermark is None or created_at > self.watermark:
+            self.watermark, self._at_watermark = created_at, set()
+        if created_at == self.watermark:
+            self._at_watermark.add(order.get("id"))
+
+    async def build(self, orders_collection, cart_items_collection, batch_size: int = 20000):
+        """Rebuild from every persisted order plus every open cart, then swap the new model in"""
+        started = time.perf_counter()
+        # Defer merging to one pass at the end instead of re-sorting the CSR every threshold
+        fresh = CoPurchaseRecommender(self.max_basket, merge_threshold=2 ** 62)
+        baskets = []
+        cursor = orders_collection.find({}, ORDER_PROJECTION)
+        async for order in cursor.batch_size(batch_size):
+            baskets.append([item["product_id"] for item in order.get("items", [])])
+            fresh._advance_watermark(order)
+            if len(baskets) >= batch_size:
+                await asyncio.to_thread(fresh.add_baskets, baskets)
+                baskets = []
+        carts = cart_items_collection.aggregate([
+            {"$group": {"_id": "$user_id", "products": {"$addToSet": "$product_id"}}}
+        ])
+        async for cart in carts:
+            baskets.append(cart["products"])
+            if len(baskets) >= batch_size:
+                await asyncio.to_thread(fresh.add_baskets, baskets)
+                baskets = []
+        await asyncio.to_thread(fresh.add_baskets, baskets)
+        await asyncio.to_thread(fresh.merge)
+        fresh.merge_threshold = self.merge_threshold
+        self.swap(fresh)
+        logger.info(
+            f"Co-purchase model built from {self.baskets} baskets: {len(self)} products, "
+            f"{self.nnz} pairs in {time.perf_counter() - started:.1f}s"
+        )
+
+    async def refresh(self, orders_collection, batch_size: int = 5000):
+        """Count orders placed since the watermark, skipping ones already counted in its millisecond"""
+        baskets = []
+        cursor = orders_collection.find(watermarks.since(self.watermark), ORDER_PROJECTION)
+        async for order in cursor.batch_size(batch_size):
+            if order.get("id") in self._at_watermark:
+                continue
+            baskets.append([item["product_id"] for item in order.get("items", [])])
+            self._advance_watermark(order)
+            if len(baskets) >= batch_size:
+                self.add_baskets(baskets)
+                baskets = []
+                await asyncio.sleep(0)
+        self.add_baskets(baskets)
+
+    async def keep_fresh(self, orders_collection, cart_items_collection, interval: float, rebuild_interval: float):
+        """Full build, then incremental order updates every `interval` seconds and a
+        full rebuild (picking up cart changes) every `rebuild_interval`"""
+        built_at = None
+        while True:
+            try:
+                if built_at is None or time.monotonic() - built_at >= rebuild_interval:
+                    await self.build(orders_collection, cart_items_collection)
+                    built_at = time.monotonic()
+                else:
+                    await self.refresh(orders_collection)
+            except Exception as e:
+                logger.warning(f"Co-purchase model refresh failed: {e}")
+            await asyncio.sleep(interval)
+
+co_purchase_recommender = CoPurchaseRecommender()
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import os
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+import watermarks
+from database import orders_collection, refill_alerts_collection, job_state_collection
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "refill_alerts"
+# Alerts surface this many days before the predicted reorder date
+REFILL_ALERT_HORIZON_DAYS = int(os.environ.get("REFILL_ALERT_HORIZON_DAYS", "7"))
+MIN_INTERVAL = pd.Timedelta(days=1)  # same-day repeats are one shopping trip, not a cycle
+DAY = np.timedelta64(1, "D")
+
+def alert_id(user_id: str, product_id: str) -> str:
+    """Deterministic id, so reruns update a user's alert for a product instead of adding one"""
+    return f"refill-{user_id}-{product_id}"
+
+def discount_label(prices: pd.Series) -> pd.Series:
+    """About 5% of the last price, rounded to ₹10 with a ₹10 floor"""
+    amounts = (np.round(prices.fillna(0).to_numpy(dtype=float) * 0.05 / 10) * 10).clip(min=10).astype(int)
+    return pd.Series([f"₹{amount} Off" for amount in amounts], index=prices.index)
+
+def predict_refills(purchases: pd.DataFrame, now: datetime) -> pd.DataFrame:
+    """One row per (user, product) bought at least twice, with its reorder prediction.
+
+    `purchases` has one row per purchased line: user_id, product_id,
+    product_name, image, price, purchased_at. The reorder interval is the
+    median gap between purchases, and everything is computed with grouped
+    column operations over all users at once.
+    """
+    keys = ["user_id", "product_id"]
+    purchases = (purchases.drop_duplicates(keys + ["purchased_at"])
+                 .sort_values(keys + ["purchased_at"], kind="stable"))
+    purchases["gap"] = purchases.groupby(keys, sort=False)["purchased_at"].diff()
+    stats = purchases.groupby(keys, sort=False).agg(
+        purchases=("purchased_at", "size"),
+        last_purchase=("purchased_at", "max"),
+        interval=("gap", "median"),
+        product_name=("product_name", "last"),
+        image=("image", "last"),
+        price=("price", "last"),
+    ).reset_index()
+    stats = stats[(stats["purchases"] >= 2) & (stats["interval"] >= MIN_INTERVAL)].copy()
+
+    stats["due_at"] = stats["last_purchase"] + stats["interval"]
+    remaining = (stats["due_at"] - pd.Timestamp(now)).to_numpy() / DAY
+    stats["days_left"] = np.ceil(remaining).clip(min=0).astype(int)
+    # Overdue by more than a whole cycle: the user has probably stopped buying it
+    stats["active"] = remaining > -(stats["interval"].to_numpy() / DAY)
+    stats["discount"] = discount_label(stats["price"])
+    return stats
+
+class RefillPredictor:
+    """Batch job that turns order history into refill alerts.
+
+    Each run only reloads the history of users who ordered since the previous
+    run (the watermark lives in job_state). All their predictions are written
+    back in one unordered bulk_write, upserted on deterministic ids, so a
+    repeated or concurrent run is harmless.
+    """
+
+    async def _watermark(self) -> Optional[datetime]:
+        state = await job_state_collection.find_one({"id": JOB_ID})
+        return state.get("watermark") if state else None
+
+    async def _purchases(self, user_ids: Optional[List[str]]) -> pd.DataFrame:
+        match: Dict[str, Any] = {} if user_ids is None else {"user_id": {"$in": user_ids}}
+        rows = await orders_collection.aggregate([
+            {"$match": match},
+            {"$unwind": "$items"},
+            {"$project": {
+                "_id": 0,
+                "user_id": 1,
+                "purchased_at": "$created_at",
+                "product_id": "$items.product_id",
+                "product_name": "$items.product_name",
+                "image": "$items.image",
+                "price": "$items.price",
+            }},
+        ]).to_list(None)
+        columns = ["user_id", "product_id", "product_name", "image", "price", "purchased_at"]
+        frame = pd.DataFrame(rows, columns=columns)
+        frame["purchased_at"] = pd.to_datetime(frame["purchased_at"])
+        return frame
+
+    async def run(self, full: bool = False) -> Dict[str, Any]:
+        """Recompute alerts for users with new orders (every user when `full` or on the first run)"""
+        now = datetime.utcnow()
+        watermark = None if full else await self._watermark()
+        user_ids = None
+        if watermark is not None:
+            # Re-reading the watermark's millisecond is harmless: alerts upsert by deterministic id
+            user_ids = await orders_collection.distinct("user_id", watermarks.since(watermarks.truncate(watermark)))
+            if not user_ids:
+                return {"users": 0, "alerts": 0, "active": 0}
+
+        purchases = await self._purchases(user_ids)
+        if purchases.empty:
+            return {"users": 0, "alerts": 0, "active": 0}
+        predictions = await asyncio.to_thread(predict_refills, purchases, now)
+
+        operations = [
+            UpdateOne(
+                {"id": alert_id(row.user_id, row.product_id)},
+                {
+                    "$set": {
+                        "user_id": row.user_id,
+                        "product_id": row.product_id,
+                        "product_name": row.product_name,
+                        "image": row.image if isinstance(row.image, str) else "",  # missing images come back as NaN
+                        "discount": row.discount,
+                        "days_left": int(row.days_left),
+                        "due_at": row.due_at.to_pydatetime(),
+                        "active": bool(row.active),
+                    },
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            )
+            for row in predictions.itertuples(index=False)
+        ]
+        if operations:
+            await refill_alerts_collection.bulk_write(operations, ordered=False)
+
+        await job_state_collection.update_one(
+            {"id": JOB_ID},
+            {"$max": {"watermark": purchases["purchased_at"].max().to_pydatetime()}, "$set": {"last_run_at": now}},
+            upsert=True,
+        )
+        result = {
+            "users": int(purchases["user_id"].nunique()),
+            "alerts": len(operations),
+            "active": int(predictions["active"].sum()),
+        }
+        logger.info(f"Refill alerts: {result['alerts']} predictions for {result['users']} users")
+        return result
+
+    async def keep_fresh(self, interval: float):
+        """Run the job every `interval` seconds"""
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.warning(f"Refill alert job failed: {e}")
+            await asyncio.sleep(interval)
+
+def visible_alert_filter(user_id: str, now: datetime) -> Dict[str, Any]:
+    """Active alerts due within the horizon; alerts without a prediction are always shown"""
+    cutoff = now + timedelta(days=REFILL_ALERT_HORIZON_DAYS)
+    return {"user_id": user_id, "active": True, "due_at": {"$not": {"$gt": cutoff}}}
+
+def days_left(due_at: Optional[datetime], stored: int, now: datetime) -> int:
+    """Days until the predicted reorder, as of now rather than as of the last job run"""
+    if due_at is None:
+        return stored
+    return max(0, int(np.ceil((due_at - now) / timedelta(days=1))))
+
+refill_predictor = RefillPredictor()
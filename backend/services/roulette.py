@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+import logging
+import os
+import random
+import time
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models import RouletteConfig, RouletteReward, RouletteSpin
+from database import roulette_config_collection, roulette_limits_collection, roulette_spins_collection
+from services.cart_summary import get_cart_totals
+from cache import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+CONFIG_ID = "default"
+MIN_CART_VALUE = int(os.environ.get("ROULETTE_MIN_CART_VALUE", "500"))
+SPINS_PER_DAY = int(os.environ.get("ROULETTE_SPINS_PER_DAY", "3"))
+
+# Used until a configuration is saved
+DEFAULT_REWARDS = [
+    RouletteReward(label="10% Off Next Order", weight=15),
+    RouletteReward(label="Free Delivery", weight=20),
+    RouletteReward(label="₹50 Cashback", weight=10),
+    RouletteReward(label="2x Points", weight=15),
+    RouletteReward(label="₹100 Off ₹500", weight=5),
+    RouletteReward(label="Free Sample Box", weight=10),
+    RouletteReward(label="Weekend Special", weight=10),
+    RouletteReward(label="Spin Again!", weight=15),
+]
+
+class AliasTable:
+    """Walker/Vose alias method: O(n) to build, O(1) per weighted sample"""
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [weight * n / total for weight in weights]
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.probability[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        # Whatever is left over is 1.0 up to rounding error
+
+    def sample(self, rng: random.Random) -> int:
+        column = rng.randrange(len(self.probability))
+        return column if rng.random() < self.probability[column] else self.alias[column]
+
+class RouletteWheel:
+    """The current reward configuration and its alias table.
+
+    The configuration is re-read at most every `config_ttl` seconds (one load
+    at a time), and the table is rebuilt only when its version changes.
+    """
+
+    def __init__(self, config_ttl: float = 10.0):
+        self.config_ttl = config_ttl
+        self._rng = random.SystemRandom()
+        self._config = RouletteConfig(rewards=DEFAULT_REWARDS)
+        self._table = AliasTable([reward.weight for reward in DEFAULT_REWARDS])
+        self._loaded_at: Optional[float] = None
+        self._loads = SingleFlight()
+        self.rebuilds = 0
+
+    def _install(self, config: RouletteConfig):
+        if config.version != self._config.version:
+            self._table = AliasTable([reward.weight for reward in config.rewards])
+            self.rebuilds += 1
+        self._config = config
+
+    async def _reload(self):
+        document = await roulette_config_collection.find_one({"id": CONFIG_ID}, {"_id": 0, "id": 0})
+        if document:
+            self._install(RouletteConfig(**document))
+        self._loaded_at = time.monotonic()
+
+    async def config(self) -> RouletteConfig:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.config_ttl:
+            await self._loads.do("config", self._reload)
+        return self._config
+
+    async def update(self, rewards: List[RouletteReward]) -> RouletteConfig:
+        """Replace the rewards and bump the version other workers watch for"""
+        document = await roulette_config_collection.find_one_and_update(
+            {"id": CONFIG_ID},
+            {
+                "$set": {"rewards": [reward.dict() for reward in rewards], "updated_at": datetime.utcnow()},
+                "$inc": {"version": 1},
+            },
+            projection={"_id": 0, "id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        config = RouletteConfig(**document)
+        self._install(config)
+        self._loaded_at = time.monotonic()
+        return config
+
+    async def draw(self) -> Tuple[RouletteReward, int]:
+        config = await self.config()
+        return config.rewards[self._table.sample(self._rng)], config.version
+
+async def _take_spin(user_id: str, now: datetime) -> int:
+    """Atomically count a spin against today's allowance; returns spins used.
+
+    The filter only matches while the counter is under the limit. Once it is
+    not, the upsert collides with the unique (user_id, window) index. The same
+    collision happens when two first spins of the day race, so retry once
+    before treating it as the limit.
+    """
+    window = now.strftime("%Y-%m-%d")
+    expires_at = datetime(now.year, now.month, now.day) + timedelta(days=2)  # TTL cleanup of old windows
+    for _ in range(2):
+        try:
+            counter = await roulette_limits_collection.find_one_and_update(
+                {"user_id": user_id, "window": window, "spins": {"$lt": SPINS_PER_DAY}},
+                {"$inc": {"spins": 1}, "$setOnInsert": {"expires_at": expires_at}},
+                projection={"_id": 0, "spins": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return counter["spins"]
+        except DuplicateKeyError:
+            continue
+    raise HTTPException(status_code=429, detail=f"Daily limit of {SPINS_PER_DAY} spins reached")
+
+async def spin(user_id: str) -> Tuple[RouletteSpin, int]:
+    """Check eligibility, consume a spin, draw a reward and record it; returns the spin and spins left"""
+    totals = await get_cart_totals(user_id)
+    if totals.total_amount <= MIN_CART_VALUE:
+        raise HTTPException(
+            status_code=403, detail=f"Spin unlocks when your cart value is over ₹{MIN_CART_VALUE}"
+        )
+    now = datetime.utcnow()
+    used = await _take_spin(user_id, now)
+    reward, version = await roulette_wheel.draw()
+    entry = RouletteSpin(
+        user_id=user_id, reward=reward.label, config_version=version, cart_total=totals.total_amount, created_at=now
+    )
+    await roulette_spins_collection.insert_one(entry.dict())
+    return entry, SPINS_PER_DAY - used
+
+roulette_wheel = RouletteWheel()
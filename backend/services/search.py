@@ -0,0 +1,273 @@
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import math
+import re
+import unicodedata
+import numpy as np
+import watermarks
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of a token by the field it appears in
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+# Product fields kept in memory so results need no database round trip
+SUMMARY_FIELDS = ("id", "name", "price", "original_price", "image", "category", "in_stock")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents ("Crème" -> "creme")"""
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text)) if text else []
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"^{term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def max_typos(term: str) -> int:
+    """Edit distance tolerated for a query term: none for short terms, 2 for long ones"""
+    if len(term) <= 3:
+        return 0
+    return 1 if len(term) <= 7 else 2
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up with limit + 1 once it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class ProductSearchIndex:
+    """In-memory BM25 inverted index over product name, category and description.
+
+    Postings are compact typed arrays appended as products arrive, so the index
+    grows incrementally; scoring runs vectorized over the postings with NumPy.
+    Query terms missing from the vocabulary are matched to nearby terms via a
+    trigram index and bounded edit distance.
+    """
+
+    k1 = 1.2
+    b = 0.75
+    typo_penalty = 0.5  # score multiplier per edit
+
+    def __init__(self):
+        self._ids: List[str] = []  # dense doc number -> product id
+        self._doc_numbers: Dict[str, int] = {}
+        self._summaries: List[Optional[Dict[str, Any]]] = []
+        self._lengths = np.zeros(1024, dtype=np.float32)
+        self._live = np.zeros(1024, dtype=bool)
+        self._total_length = 0.0
+        self._live_count = 0
+        self._postings: Dict[str, Tuple[array, array]] = {}  # term -> (doc numbers, weighted tf)
+        self._trigram_terms: Dict[Tuple[str, int], Set[str]] = defaultdict(set)  # (trigram, len) -> terms
+        self._fuzzy_cache: Dict[str, List[Tuple[str, int]]] = {}
+        # term -> (postings length, deletions, average length, live doc numbers, BM25 saturation)
+        self._term_cache: Dict[str, Tuple[int, int, float, np.ndarray, np.ndarray]] = {}
+        self._deletions = 0
+        self._scores = np.zeros(1024, dtype=np.float32)  # scratch accumulator, all zeros between queries
+        self.watermark: Optional[datetime] = None  # newest created_at indexed
+
+    def __len__(self):
+        return self._live_count
+
+    def add(self, product: Dict[str, Any]):
+        """Index a product; re-adding an id replaces the earlier version"""
+        previous = self._doc_numbers.get(product["id"])
+        if previous is not None and self._live[previous]:
+            self._live[previous] = False
+            self._summaries[previous] = None
+            self._deletions += 1
+            self._total_length -= float(self._lengths[previous])
+            self._live_count -= 1
+
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field)):
+                weights[token] += weight
+
+        number = len(self._ids)
+        if number == len(self._lengths):
+            self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+            self._live = np.concatenate([self._live, np.zeros_like(self._live)])
+            self._scores = np.zeros(len(self._lengths), dtype=np.float32)
+        self._ids.append(product["id"])
+        self._doc_numbers[product["id"]] = number
+        summary = {field: product.get(field) for field in SUMMARY_FIELDS}
+        summary["in_stock"] = product.get("in_stock", True)
+        self._summaries.append(summary)
+        length = float(sum(weights.values()))
+        self._lengths[number] = length
+        self._live[number] = True
+        self._total_length += length
+        self._live_count += 1
+
+        for term, tf in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("i"), array("f"))
+                for gram in trigrams(term):
+                    self._trigram_terms[(gram, len(term))].add(term)
+                self._fuzzy_cache.clear()
+            postings[0].append(number)
+            postings[1].append(tf)
+
+        self.watermark = watermarks.advance(self.watermark, product.get("created_at"))
+
+    def add_many(self, products: Iterable[Dict[str, Any]]):
+        for product in products:
+            self.add(product)
+
+    def _fuzzy_terms(self, token: str) -> List[Tuple[str, int]]:
+        """Vocabulary terms within max_typos(token) edits, with their distance"""
+        cached = self._fuzzy_cache.get(token)
+        if cached is not None:
+            return cached
+        limit = max_typos(token)
+        matches = []
+        if limit:
+            grams = trigrams(token)
+            shared = Counter()
+            for length in range(len(token) - limit, len(token) + limit + 1):
+                for gram in grams:
+                    shared.update(self._trigram_terms.get((gram, length), ()))
+            # q-gram lemma: each edit destroys at most 3 trigrams
+            needed = max(len(grams) - 3 * limit, 1)
+            for term, count in shared.items():
+                if count >= needed:
+                    distance = edit_distance(token, term, limit)
+                    if distance <= limit:
+                        matches.append((term, distance))
+        if len(self._fuzzy_cache) > 10000:
+            self._fuzzy_cache.clear()
+        self._fuzzy_cache[token] = matches
+        return matches
+
+    def _term_scores(self, term: str, average_length: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Live doc numbers containing term and their BM25 term-frequency saturation.
+
+        Cached until the term gains postings, a document is replaced, or the
+        average document length drifts by more than 1%.
+        """
+        numbers_buffer, tf_buffer = self._postings[term]
+        cached = self._term_cache.get(term)
+        if (cached and cached[0] == len(numbers_buffer) and cached[1] == self._deletions
+                and abs(cached[2] - average_length) <= 0.01 * average_length):
+            return cached[3], cached[4]
+
+        numbers = np.frombuffer(numbers_buffer, dtype=np.int32).copy()
+        tf = np.frombuffer(tf_buffer, dtype=np.float32).copy()
+        live = self._live[numbers]
+        numbers, tf = numbers[live], tf[live]
+        norm = self.k1 * (1 - self.b + self.b * self._lengths[numbers] / average_length)
+        saturation = (tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+        if len(self._term_cache) >= 4096:
+            self._term_cache.clear()
+        self._term_cache[term] = (len(numbers_buffer), self._deletions, average_length, numbers, saturation)
+        return numbers, saturation
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[Dict[str, Any], float]]:
+        """Return up to `limit` (product summary, BM25 score) pairs, best first"""
+        if not self._live_count:
+            return []
+        terms = {}  # term -> weight
+        for token in dict.fromkeys(tokenize(query)):
+            if token in self._postings:
+                terms[token] = 1.0
+            else:
+                for term, distance in self._fuzzy_terms(token):
+                    terms[term] = max(terms.get(term, 0.0), self.typo_penalty ** distance)
+        if not terms:
+            return []
+
+        average_length = self._total_length / self._live_count
+        parts = []
+        for term, weight in terms.items():
+            numbers, saturation = self._term_scores(term, average_length)
+            if len(numbers):
+                idf = math.log(1 + (self._live_count - len(numbers) + 0.5) / (len(numbers) + 0.5))
+                parts.append((numbers, saturation * np.float32(weight * idf)))
+        if not parts:
+            return []
+
+        if len(parts) == 1:
+            candidates, scores = parts[0]
+            keep = limit
+        else:
+            # Accumulate into the scratch array, touching only matched documents.
+            # A document matching several terms appears once per term, so taking
+            # limit * len(parts) occurrences is enough to hold the top `limit` distinct ones.
+            candidates = np.concatenate([numbers for numbers, _ in parts])
+            try:
+                for numbers, contribution in parts:
+                    self._scores[numbers] += contribution
+                scores = self._scores[candidates]
+            finally:
+                self._scores[candidates] = 0
+            keep = limit * len(parts)
+
+        if len(candidates) > keep:
+            top = np.argpartition(scores, -keep)[-keep:]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        results = []
+        seen = set()
+        for position in order:
+            number = int(candidates[position])
+            if number not in seen:
+                seen.add(number)
+                results.append((self._summaries[number], float(scores[position])))
+                if len(results) == limit:
+                    break
+        return results
+
+    async def load(self, collection, batch_size: int = 5000):
+        """Index every product in `collection`, yielding to the event loop between batches"""
+        count = 0
+        cursor = collection.find({}, {"_id": 0, "description": 1, "created_at": 1, **{f: 1 for f in SUMMARY_FIELDS}})
+        async for product in cursor.batch_size(batch_size):
+            self.add(product)
+            count += 1
+            if count % batch_size == 0:
+                await asyncio.sleep(0)
+        logger.info(f"Search index built with {count} products")
+
+    async def refresh(self, collection, batch_size: int = 5000):
+        """Index products other workers created since the watermark, skipping ids already indexed"""
+        count = 0
+        async for product in collection.find(watermarks.since(self.watermark), {"_id": 0}).batch_size(batch_size):
+            if product["id"] not in self._doc_numbers:
+                self.add(product)
+            count += 1
+            if count % batch_size == 0:
+                await asyncio.sleep(0)
+
+    async def keep_fresh(self, collection, interval: float):
+        """Load the index, retrying until it succeeds, then refresh it every `interval` seconds"""
+        while True:
+            try:
+                await self.load(collection)
+                break
+            except Exception as e:
+                logger.warning(f"Search index load failed, retrying in {interval}s: {e}")
+                await asyncio.sleep(interval)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(collection)
+            except Exception as e:
+                logger.warning(f"Search index refresh failed: {e}")
+
+product_search_index = ProductSearchIndex()
@@ -0,0 +1,200 @@
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+import numpy as np
+from models import Product
+import events
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = "*"  # pseudo-location aggregating every event
+
+class LocationCounters:
+    """Time-bucketed product counters for one location.
+
+    Row `b` of the (buckets x products) matrix counts events in time bucket b;
+    rows are reused round-robin, so the matrix always covers the last
+    `buckets * bucket_seconds` seconds. Products get dense column numbers the
+    first time they are seen in this location, and lose them again once all
+    their buckets have rolled out of the window (see compact).
+    """
+
+    def __init__(self, buckets: int):
+        self.buckets = buckets
+        self.counts = np.zeros((buckets, 64), dtype=np.float32)
+        self.products: List[str] = []
+        self.columns: Dict[str, int] = {}
+        self.epoch: Optional[int] = None  # absolute bucket number of the newest row
+
+    def advance(self, epoch: int):
+        """Rotate the ring to `epoch`, clearing the rows that fall out of the window"""
+        if self.epoch is None:
+            self.epoch = epoch
+            return
+        for skipped in range(self.epoch + 1, min(epoch, self.epoch + self.buckets) + 1):
+            self.counts[skipped % self.buckets] = 0
+        self.epoch = max(self.epoch, epoch)
+
+    def add(self, product_id: str, epoch: int, weight: float):
+        if self.epoch is not None and epoch <= self.epoch - self.buckets:
+            return  # older than the window
+        self.advance(epoch)
+        column = self.columns.get(product_id)
+        if column is None:
+            column = self.columns[product_id] = len(self.products)
+            self.products.append(product_id)
+            if column == self.counts.shape[1]:
+                self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)], axis=1)
+        self.counts[epoch % self.buckets, column] += weight
+
+    def compact(self):
+        """Drop products with no events left in the window and shrink the matrix to fit"""
+        live = np.flatnonzero(self.counts[:, :len(self.products)].any(axis=0))
+        if len(live) == len(self.products):
+            return
+        capacity = 64
+        while capacity < len(live):
+            capacity *= 2
+        counts = np.zeros((self.buckets, capacity), dtype=np.float32)
+        counts[:, :len(live)] = self.counts[:, live]
+        self.counts = counts
+        self.products = [self.products[column] for column in live]
+        self.columns = {product_id: column for column, product_id in enumerate(self.products)}
+
+    def top(self, decay: np.ndarray, n: int) -> List[str]:
+        """Products with the highest decay-weighted counts; decay[a] weighs a bucket `a` buckets old"""
+        if not self.products:
+            return []
+        # Reorder the per-age weights onto ring rows: row r is (epoch - r) % buckets old
+        ages = (self.epoch - np.arange(self.buckets)) % self.buckets
+        scores = decay[ages] @ self.counts[:, :len(self.products)]
+        nonzero = np.flatnonzero(scores)
+        if len(nonzero) > n:
+            nonzero = nonzero[np.argpartition(scores[nonzero], -n)[-n:]]
+        return [self.products[column] for column in nonzero[np.argsort(-scores[nonzero], kind="stable")]]
+
+class TrendingEngine:
+    """Location-aware trending products from cart-add and checkout events.
+
+    Event handlers only enqueue, so publishing is free on the request path.
+    A background loop drains the queue into per-location ring buffers and
+    recomputes a snapshot of the top products per location; reads are a
+    dict lookup into that snapshot.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: int = 3600,
+        buckets: int = 24,
+        half_life_seconds: float = 6 * 3600,
+        top_n: int = 10,
+        cart_weight: float = 1.0,
+        order_weight: float = 3.0,
+    ):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.top_n = top_n
+        self.cart_weight = cart_weight
+        self.order_weight = order_weight
+        self.decay = (0.5 ** (np.arange(buckets) * bucket_seconds / half_life_seconds)).astype(np.float32)
+        self._queue: Deque[Tuple[str, str, float, float]] = deque(maxlen=200000)  # user, product, weight, ts
+        self._locations: Dict[str, LocationCounters] = {}
+        self._user_locations: Dict[str, str] = {}
+        self._snapshot: Dict[str, List[Product]] = {}
+        self._fallback: List[Product] = []
+        self.refreshed_at: Optional[datetime] = None
+
+    @staticmethod
+    def normalize_location(location: str) -> str:
+        return location.strip().lower()
+
+    def on_cart_item_added(self, event: Dict[str, Any]):
+        self._queue.append((event["user_id"], event["product_id"], self.cart_weight * event["quantity"], time.time()))
+
+    def on_order_placed(self, event: Dict[str, Any]):
+        now = time.time()
+        for item in event["items"]:
+            self._queue.append((event["user_id"], item["product_id"], self.order_weight * item["quantity"], now))
+
+    def subscribe(self):
+        events.subscribe(events.CART_ITEM_ADDED, self.on_cart_item_added)
+        events.subscribe(events.ORDER_PLACED, self.on_order_placed)
+
+    def trending(self, location: str) -> List[Product]:
+        """Precomputed top products for a location, falling back to the global ranking"""
+        return (self._snapshot.get(self.normalize_location(location))
+                or self._snapshot.get(GLOBAL)
+                or self._fallback)
+
+    async def load_fallback(self, products_collection):
+        """Until events arrive, trending means a few popular categories"""
+        self._fallback = [Product(**product) for product in await products_collection.find(
+            {"category": {"$in": ["food", "electronics", "beauty"]}}, {"_id": 0}
+        ).limit(self.top_n).to_list(self.top_n)]
+
+    def _counters(self, location: str) -> LocationCounters:
+        counters = self._locations.get(location)
+        if counters is None:
+            counters = self._locations[location] = LocationCounters(self.buckets)
+        return counters
+
+    async def ingest(self, users_collection):
+        """Drain queued events into the ring buffers, resolving user locations in one query"""
+        pending = [self._queue.popleft() for _ in range(len(self._queue))]
+        if not pending:
+            return
+        unknown = {user_id for user_id, _, _, _ in pending if user_id not in self._user_locations}
+        if unknown:
+            if len(self._user_locations) > 500000:
+                self._user_locations.clear()
+            async for user in users_collection.find({"id": {"$in": list(unknown)}}, {"_id": 0, "id": 1, "location": 1}):
+                self._user_locations[user["id"]] = self.normalize_location(user.get("location") or "")
+
+        for user_id, product_id, weight, timestamp in pending:
+            epoch = int(timestamp // self.bucket_seconds)
+            self._counters(GLOBAL).add(product_id, epoch, weight)
+            location = self._user_locations.get(user_id)
+            if location:
+                self._counters(location).add(product_id, epoch, weight)
+
+    async def refresh(self, users_collection, products_collection):
+        """Ingest pending events and rebuild the per-location snapshot"""
+        await self.ingest(users_collection)
+        epoch = int(time.time() // self.bucket_seconds)
+        rankings = {}
+        for location, counters in list(self._locations.items()):
+            counters.advance(epoch)
+            counters.compact()
+            if not counters.products:
+                del self._locations[location]  # quiet for a whole window; recreated on its next event
+                continue
+            rankings[location] = counters.top(self.decay, self.top_n)
+
+        wanted = {product_id for ranking in rankings.values() for product_id in ranking}
+        products = {}
+        if wanted:
+            async for product in products_collection.find({"id": {"$in": list(wanted)}}, {"_id": 0}):
+                products[product["id"]] = Product(**product)
+        # Reloaded every time, so it tracks catalog edits and fills up once products exist
+        await self.load_fallback(products_collection)
+
+        self._snapshot = {
+            location: [products[product_id] for product_id in ranking if product_id in products]
+            for location, ranking in rankings.items()
+        }
+        self.refreshed_at = datetime.utcnow()
+
+    async def run(self, users_collection, products_collection, interval: float):
+        """Subscribe to events and refresh the snapshot every `interval` seconds"""
+        self.subscribe()
+        while True:
+            try:
+                await self.refresh(users_collection, products_collection)
+            except Exception as e:
+                logger.warning(f"Trending refresh failed: {e}")
+            await asyncio.sleep(interval)
+
+trending_engine = TrendingEngine()
@@ -0,0 +1,327 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import os
+import zlib
+import numpy as np
+import watermarks
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 256
+
+def hashed_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """CPU-only stand-in for an image/text encoder.
+
+    Words and padded character trigrams are hashed (crc32, so stable across
+    processes) into `dim` signed buckets and the result is L2-normalized.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    features = []
+    for word in text.lower().split():
+        features.append(word)
+        padded = f"#{word}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    if not features:
+        return vector
+    hashes = np.array([zlib.crc32(feature.encode()) for feature in features], dtype=np.uint32)
+    signs = np.where(hashes & 1, 1.0, -1.0).astype(np.float32)
+    np.add.at(vector, (hashes >> 1) % dim, signs)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def product_text(product: Dict[str, Any]) -> str:
+    return " ".join(filter(None, (product.get("name"), product.get("category"), product.get("description"))))
+
+class VectorIndex:
+    """Top-k cosine similarity over fixed-width float32 embeddings.
+
+    Vectors are unit-normalized rows persisted as a .npy file (ids in a
+    sidecar text file). Loaded rows stay memory-mapped as the base; rows
+    added afterwards go to an in-memory tail that queries scan alongside it,
+    and persist() folds the tail into the file off the event loop. Below
+    `ivf_threshold` rows queries scan everything; above it an IVF
+    partitioning (k-means centroids) limits each query to `nprobe` lists.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        dim: int = EMBEDDING_DIM,
+        embed: Callable[[str], np.ndarray] = hashed_embedding,
+        ivf_threshold: int = 50000,
+        nprobe: int = 8,
+    ):
+        self.path = Path(path) if path else None
+        self.dim = dim
+        self.embed = embed
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._base = np.zeros((0, dim), dtype=np.float32)  # rows [0, _base_count), memory-mapped once loaded
+        self._base_count = 0
+        self._tail = np.zeros((1024, dim), dtype=np.float32)  # rows [_base_count, _count)
+        self._count = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._ivf: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, int]] = None  # centroids, order, offsets, rows covered
+        self._rewrites: Optional[List[int]] = None  # rows replaced while persist() writes the file
+        self.dirty = False
+        self.watermark: Optional[datetime] = None
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, product_id: str):
+        return product_id in self._rows
+
+    def _reserve(self, rows: int):
+        needed = rows - self._base_count
+        if needed <= len(self._tail):
+            return
+        grown = np.zeros((max(needed, 2 * len(self._tail), 1024), self.dim), dtype=np.float32)
+        grown[:self._count - self._base_count] = self._tail[:self._count - self._base_count]
+        self._tail = grown
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Vectors at these row numbers, gathered from the base and the tail"""
+        base_count, base, tail = self._base_count, self._base, self._tail
+        if not len(rows) or rows.max() < base_count:
+            return base[rows]
+        if rows.min() >= base_count:
+            return tail[rows - base_count]
+        in_base = rows < base_count
+        vectors = np.empty((len(rows), self.dim), dtype=np.float32)
+        vectors[in_base] = base[rows[in_base]]
+        vectors[~in_base] = tail[rows[~in_base] - base_count]
+        return vectors
+
+    def _between(self, start: int, stop: int) -> np.ndarray:
+        """Rows [start, stop) without gathering when they sit on one side of the base/tail split"""
+        base_count = self._base_count
+        if stop <= base_count:
+            return self._base[start:stop]
+        if start >= base_count:
+            return self._tail[start - base_count:stop - base_count]
+        return np.concatenate([self._base[start:base_count], self._tail[:stop - base_count]])
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray):
+        """Insert or replace vectors; rows are normalized so dot product is cosine similarity"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        self._reserve(self._count + len(ids))
+        for product_id, vector in zip(ids, vectors):
+            row = self._rows.get(product_id)
+            if row is None:
+                row = self._rows[product_id] = self._count
+                self._ids.append(product_id)
+                self._count += 1
+            elif self._rewrites is not None:
+                self._rewrites.append(row)
+            if row < self._base_count:
+                self._base[row] = vector  # copy-on-write: only the touched page leaves the mapping
+            else:
+                self._tail[row - self._base_count] = vector
+        self.dirty = True
+
+    @property
+    def needs_ivf(self) -> bool:
+        """Rows added since the last IVF build are scanned exhaustively; retrain once they exceed 10%"""
+        if self._count < self.ivf_threshold:
+            return False
+        return self._ivf is None or self._count - self._ivf[3] > 0.1 * self._ivf[3]
+
+    def rebuild_ivf(self):
+        """Partition the current rows; safe to run in a worker thread while adds continue"""
+        self._ivf = self._build_ivf(self._vectors, self._between, self._count)
+
+    def add_products(self, products: Sequence[Dict[str, Any]]):
+        if not products:
+            return
+        self.add([product["id"] for product in products],
+                 np.stack([self.embed(product_text(product)) for product in products]))
+        for product in products:
+            self.watermark = watermarks.advance(self.watermark, product.get("created_at"))
+
+    @staticmethod
+    def _build_ivf(
+        vectors: Callable[[np.ndarray], np.ndarray],
+        between: Callable[[int, int], np.ndarray],
+        count: int,
+        iterations: int = 8,
+        seed: int = 0,
+    ):
+        """Spherical k-means on a sample, then bucket every row by its nearest centroid"""
+        lists = max(int(np.sqrt(count)), 1)
+        rng = np.random.default_rng(seed)
+        # ~40 training points per centroid is plenty for coarse partitioning
+        sample = vectors(np.sort(rng.choice(count, size=min(40 * lists, count), replace=False)))
+        centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = np.where(norms > 0, sums / np.where(norms == 0, 1, norms), centroids)
+
+        assignment = np.empty(count, dtype=np.int64)
+        for start in range(0, count, 65536):
+            stop = min(start + 65536, count)
+            assignment[start:stop] = np.argmax(between(start, stop) @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(lists + 1))
+        logger.info(f"Built IVF index with {lists} lists over {count} vectors")
+        return centroids, order, offsets, count
+
+    def search(self, queries: np.ndarray, k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Top-k (id, cosine similarity) per query row, scored with batched matrix products"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        if not self._count:
+            return [[] for _ in queries]
+
+        if self._ivf is None:
+            base_count = self._base_count
+            scores = np.hstack([
+                queries @ self._base[:base_count].T, queries @ self._tail[:self._count - base_count].T
+            ])
+            return [self._top_k(np.arange(self._count), row, k) for row in scores]
+
+        centroids, order, offsets, covered = self._ivf
+        probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :self.nprobe]
+        tail = np.arange(covered, self._count)
+        results = []
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists] + [tail])
+            results.append(self._top_k(candidates, self._vectors(candidates) @ query, k))
+        return results
+
+    def _top_k(self, rows: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        if len(rows) > k:
+            top = np.argpartition(scores, -k)[-k:]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return [(self._ids[rows[i]], float(scores[i])) for i in order]
+
+    def _ids_path(self) -> Path:
+        return self.path.with_suffix(".ids.txt")
+
+    def save(self, count: Optional[int] = None, chunk: int = 65536) -> np.ndarray:
+        """Atomically replace the persisted file with rows [0, count) and map it back.
+
+        Rows are streamed in chunks, so this never holds a second copy of the
+        index; safe to run in a worker thread while adds continue.
+        """
+        count = self._count if count is None else count
+        ids = self._ids[:count]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp.npy")
+        matrix = np.lib.format.open_memmap(temporary, mode="w+", dtype=np.float32, shape=(count, self.dim))
+        for start in range(0, count, chunk):
+            matrix[start:start + chunk] = self._between(start, min(start + chunk, count))
+        matrix.flush()
+        del matrix
+        self._ids_path().with_suffix(".tmp").write_text("\n".join(ids))
+        os.replace(self._ids_path().with_suffix(".tmp"), self._ids_path())
+        os.replace(temporary, self.path)
+        return self._map(count)
+
+    def _map(self, count: int) -> np.ndarray:
+        if not count:
+            return np.zeros((0, self.dim), dtype=np.float32)  # an empty file can't be mapped
+        return np.load(self.path, mmap_mode="c")
+
+    async def persist(self):
+        """Write the index to disk off the event loop, then fold the in-memory tail into the mapped file"""
+        if not self.path:
+            return
+        count = self._count
+        self.dirty = False
+        self._rewrites = []
+        try:
+            base = await asyncio.to_thread(self.save, count)
+        except Exception:
+            self.dirty = True
+            raise
+        finally:
+            rewrites, self._rewrites = self._rewrites, None
+        # Rows replaced during the write may have reached the file in their old form
+        rewritten = np.array(sorted({row for row in rewrites if row < count}), dtype=np.int64)
+        if len(rewritten):
+            base[rewritten] = self._vectors(rewritten)
+        remaining = self._count - count
+        tail = np.zeros((max(2 * remaining, 1024), self.dim), dtype=np.float32)
+        tail[:remaining] = self._between(count, self._count)
+        self._base, self._base_count, self._tail = base, count, tail
+
+    def load(self) -> bool:
+        """Memory-map a previously saved index; returns False when there is none"""
+        if not self.path or not self.path.exists() or not self._ids_path().exists():
+            return False
+        header = np.load(self.path, mmap_mode="r")
+        shape = header.shape
+        del header
+        ids = self._ids_path().read_text().split("\n") if shape[0] else []
+        if len(shape) != 2 or shape[1] != self.dim or len(ids) != shape[0]:
+            logger.warning(f"Ignoring vector index at {self.path}: shape {shape} does not match")
+            return False
+        self._base = self._map(len(ids))
+        self._base_count = self._count = len(ids)
+        self._tail = np.zeros((1024, self.dim), dtype=np.float32)
+        self._ids = ids
+        self._rows = {product_id: row for row, product_id in enumerate(ids)}
+        self._ivf = None
+        return True
+
+    async def sync(self, collection, query: Optional[Dict[str, Any]] = None, batch_size: int = 2000):
+        """Embed every product matching `query` that the index doesn't know yet"""
+        batch = []
+        projection = {"_id": 0, "id": 1, "name": 1, "category": 1, "description": 1, "created_at": 1}
+        async for product in collection.find(query or {}, projection).batch_size(batch_size):
+            if product["id"] not in self._rows:
+                batch.append(product)
+            else:
+                self.watermark = watermarks.advance(self.watermark, product.get("created_at"))
+            if len(batch) >= batch_size:
+                self.add_products(batch)
+                batch = []
+                await asyncio.sleep(0)
+        self.add_products(batch)
+
+    async def refresh(self, collection):
+        """Embed products created since the watermark"""
+        await self.sync(collection, watermarks.since(self.watermark))
+
+    async def keep_fresh(self, collection, interval: float):
+        """Load or build the index, then every `interval` seconds embed new products,
+        repartition and persist"""
+        self.load()
+        while True:
+            try:
+                await self.sync(collection)
+                break
+            except Exception as e:
+                logger.warning(f"Vector index sync failed, retrying in {interval}s: {e}")
+                await asyncio.sleep(interval)
+        while True:
+            try:
+                if self.needs_ivf:
+                    await asyncio.to_thread(self.rebuild_ivf)
+                if self.dirty:
+                    await self.persist()
+            except Exception as e:
+                logger.warning(f"Vector index maintenance failed: {e}")
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(collection)
+            except Exception as e:
+                logger.warning(f"Vector index refresh failed: {e}")
+
+# Unset: the index lives in memory only and is rebuilt from Mongo on every start
+product_vector_index = VectorIndex(
+    path=os.environ.get("VECTOR_INDEX_PATH") or None,
+    ivf_threshold=int(os.environ.get("VECTOR_INDEX_IVF_THRESHOLD", "50000")),
+)
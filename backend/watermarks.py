@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+def truncate(moment: datetime) -> datetime:
+    """`moment` at Mongo's millisecond precision.
+
+    A watermark taken from an in-process datetime (a local add) must not sit
+    past rows stored in the same millisecond, or a `$gte` read would skip them.
+    """
+    return moment.replace(microsecond=moment.microsecond // 1000 * 1000)
+
+def advance(watermark: Optional[datetime], candidate: Any) -> Optional[datetime]:
+    """The later of `watermark` and `candidate` (ignored unless it is a datetime), truncated"""
+    if not isinstance(candidate, datetime):
+        return watermark
+    candidate = truncate(candidate)
+    return candidate if watermark is None or candidate > watermark else watermark
+
+def since(watermark: Optional[datetime], field: str = "created_at") -> Dict[str, Any]:
+    """Filter for rows at or after the watermark (everything when there is none).
+
+    Re-reading the watermark's own millisecond catches rows committed in it
+    after the last read; callers skip the ones they already have.
+    """
+    return {field: {"$gte": watermark}} if watermark else {}
@@ -7,8 +7,10 @@ Tests all API endpoints with detailed validation
 import requests
 import json
 import sys
+import time
 from typing import Dict, Any
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -128,6 +130,25 @@ class WalmartAPITester:
             except Exception as e:
                 self.log_test(f"GET /api/products/?category={category}", False, f"Error: {str(e)}")
 
+        # Test browsing the catalog snapshot with filters, sorting and facets
+        try:
+            response = requests.get(f"{API_BASE}/products/browse?category=food,beauty&in_stock=true&sort=discount", timeout=10)
+            if response.status_code == 200:
+                result = response.json()
+                facets = result["facets"]
+                in_categories = all(product["category"] in ("food", "beauty") for product in result["products"])
+                if in_categories and result["total"] >= len(result["products"]) and "categories" in facets:
+                    self.log_test("GET /api/products/browse", True,
+                                f"{result['total']} matches, categories: {facets['categories']}, price range: {facets['price']}")
+                else:
+                    self.log_test("GET /api/products/browse", False, "Products or facets don't match the filters", result)
+            elif response.status_code == 503:
+                self.log_test("GET /api/products/browse", True, "Catalog snapshot still loading (503)")
+            else:
+                self.log_test("GET /api/products/browse", False, f"Status: {response.status_code}", response.text)
+        except Exception as e:
+            self.log_test("GET /api/products/browse", False, f"Error: {str(e)}")
+
         # Test trending products for Chennai
         try:
             response = requests.get(f"{API_BASE}/products/trending/location?location=Chennai", timeout=10)
@@ -256,6 +277,83 @@ class WalmartAPITester:
             except Exception as e:
                 self.log_test("DELETE /api/cart/user-1/items/{item_id}", False, f"Error: {str(e)}")
 
+    def test_cart_concurrency(self):
+        """Stress concurrent adds of the same product to check the atomic upsert"""
+        print("=== Testing Cart Concurrency ===")
+        
+        concurrent_adds = 200
+        item = {
+            "user_id": self.sample_user_id,
+            "product_id": "prod-3",
+            "product_name": "Organic Face Wash",
+            "price": 299,
+            "image": "https://images.unsplash.com/photo-1556228720-195a672e8a03?w=200&h=150&fit=crop",
+            "quantity": 1
+        }
+
+        try:
+            requests.delete(f"{API_BASE}/cart/{self.sample_user_id}/clear", timeout=10)
+
+            def add_item(_):
+                return requests.post(f"{API_BASE}/cart/{self.sample_user_id}/items", json=item, timeout=30)
+
+            with ThreadPoolExecutor(max_workers=50) as executor:
+                responses = list(executor.map(add_item, range(concurrent_adds)))
+            failures = [r for r in responses if r.status_code != 200]
+
+            response = requests.get(f"{API_BASE}/cart/{self.sample_user_id}", timeout=10)
+            rows = [i for i in response.json().get('items', []) if i['product_id'] == item['product_id']]
+            quantity = rows[0]['quantity'] if rows else 0
+
+            if not failures and len(rows) == 1 and quantity == concurrent_adds:
+                self.log_test(f"POST /api/cart/user-1/items x{concurrent_adds} (concurrent)", True,
+                            f"Single cart row with quantity {quantity}")
+            else:
+                self.log_test(f"POST /api/cart/user-1/items x{concurrent_adds} (concurrent)", False,
+                            f"Failed requests: {len(failures)}, rows: {len(rows)}, quantity: {quantity}")
+        except Exception as e:
+            self.log_test(f"POST /api/cart/user-1/items x{concurrent_adds} (concurrent)", False, f"Error: {str(e)}")
+        finally:
+            requests.delete(f"{API_BASE}/cart/{self.sample_user_id}/clear", timeout=10)
+
+    def test_roulette_concurrency(self):
+        """Fire concurrent spins for one eligible user to check the atomic daily limit"""
+        print("=== Testing Roulette Concurrency ===")
+        
+        concurrent_spins = 200
+        user_id = f"spin-test-{int(time.time())}"  # fresh user, so today's allowance is untouched
+        item = {
+            "user_id": user_id,
+            "product_id": "prod-2",
+            "product_name": "Bluetooth Neckband",
+            "price": 899,
+            "image": "https://images.unsplash.com/photo-1484704849700-f032a568e944?w=200&h=150&fit=crop",
+            "quantity": 1
+        }
+
+        try:
+            requests.post(f"{API_BASE}/cart/{user_id}/items", json=item, timeout=10)
+
+            def spin(_):
+                return requests.post(f"{API_BASE}/missions/roulette/spin?user_id={user_id}", timeout=30)
+
+            with ThreadPoolExecutor(max_workers=50) as executor:
+                responses = list(executor.map(spin, range(concurrent_spins)))
+            won = [r for r in responses if r.status_code == 200]
+            limited = [r for r in responses if r.status_code == 429]
+
+            if won and len(won) + len(limited) == concurrent_spins and len({r.json()['spin_id'] for r in won}) == len(won):
+                self.log_test(f"POST /api/missions/roulette/spin x{concurrent_spins} (concurrent)", True,
+                            f"{len(won)} spins granted, {len(limited)} rate limited")
+            else:
+                self.log_test(f"POST /api/missions/roulette/spin x{concurrent_spins} (concurrent)", False,
+                            f"Granted: {len(won)}, limited: {len(limited)}, "
+                            f"other: {[r.status_code for r in responses if r.status_code not in (200, 429)][:5]}")
+        except Exception as e:
+            self.log_test(f"POST /api/missions/roulette/spin x{concurrent_spins} (concurrent)", False, f"Error: {str(e)}")
+        finally:
+            requests.delete(f"{API_BASE}/cart/{user_id}/clear", timeout=10)
+
     def test_loyalty_missions(self):
         """Test loyalty missions endpoints"""
         print("=== Testing Loyalty Missions ===")
@@ -289,7 +387,11 @@ class WalmartAPITester:
             if response.status_code == 200:
                 result = response.json()
                 self.log_test("POST /api/missions/roulette/spin", True, 
-                            f"Reward: {result.get('reward', '')}")
+                            f"Reward: {result.get('reward', '')}, spins left: {result.get('spins_left')}")
+            elif response.status_code in (403, 429):
+                # Not eligible (cart value) or out of spins for today: the gate itself is working
+                self.log_test("POST /api/missions/roulette/spin", True,
+                            f"Spin refused: {response.json().get('detail', '')}")
             else:
                 self.log_test("POST /api/missions/roulette/spin", False, f"Status: {response.status_code}", response.text)
         except Exception as e:
@@ -310,6 +412,19 @@ class WalmartAPITester:
         except Exception as e:
             self.log_test("GET /api/meal-plans/", False, f"Error: {str(e)}")
 
+        # Test conditional GET: replaying the ETag should get an empty 304
+        try:
+            response = requests.get(f"{API_BASE}/meal-plans/", timeout=10)
+            etag = response.headers.get("ETag")
+            revalidated = requests.get(f"{API_BASE}/meal-plans/", headers={"If-None-Match": etag or ""}, timeout=10)
+            if etag and revalidated.status_code == 304 and not revalidated.content:
+                self.log_test("GET /api/meal-plans/ If-None-Match", True, f"ETag {etag} answered with 304")
+            else:
+                self.log_test("GET /api/meal-plans/ If-None-Match", False,
+                            f"ETag: {etag}, Status: {revalidated.status_code}", revalidated.text)
+        except Exception as e:
+            self.log_test("GET /api/meal-plans/ If-None-Match", False, f"Error: {str(e)}")
+
         # Test meal plans by goal type
         goals = ["Weight Loss", "Family Dinners", "High Protein"]
         for goal in goals:
@@ -382,7 +497,7 @@ class WalmartAPITester:
                 recommendations = response.json()
                 recs = recommendations.get('recommendations', {})
                 self.log_test("GET /api/recommendations/personalized/user-1", True, 
-                            f"Top products: {len(recs.get('top_products', []))}, Switches: {len(recs.get('suggested_switches', []))}")
+                            f"Suggested products: {len(recs.get('suggested_products', []))}, based on {len(recs.get('based_on', []))} recent items")
             else:
                 self.log_test("GET /api/recommendations/personalized/user-1", False, f"Status: {response.status_code}", response.text)
         except Exception as e:
@@ -432,6 +547,8 @@ class WalmartAPITester:
         self.test_user_management()
         self.test_products_and_bundles()
         self.test_cart_operations()
+        self.test_cart_concurrency()
+        self.test_roulette_concurrency()
         self.test_loyalty_missions()
         self.test_meal_planning()
         self.test_recommendations()
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend runs from its own directory with top-level imports (`from database import ...`)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# database.py creates a Motor client at import time; it connects lazily, so unit tests never need Mongo
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "unit_tests")
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+import asyncio
+import random
+import pytest
+from services.catalog_snapshot import CatalogSnapshot
+
+NOW = datetime(2026, 1, 1)
+
+def product(product_id, price, category, original_price=None, in_stock=True, age_minutes=None):
+    created_at = None if age_minutes is None else NOW - timedelta(minutes=age_minutes)
+    return {"id": product_id, "price": price, "original_price": original_price, "in_stock": in_stock,
+            "category": category, "created_at": created_at}
+
+CATALOG = [
+    product("rice", 120, "food", 150, age_minutes=5),  # 20% off
+    product("dal", 90, "food", age_minutes=1),
+    product("oil", 200, "food", 400, in_stock=False, age_minutes=30),  # 50% off
+    product("phone", 9000, "electronics", 10000, age_minutes=2),  # 10% off
+    product("cable", 150, "electronics", in_stock=False),
+    product("soap", 40, "beauty", 50, age_minutes=10),  # 20% off
+]
+
+def build(layout):
+    snapshot = CatalogSnapshot()
+    if layout == "tail":
+        snapshot.add(CATALOG)
+    elif layout == "compacted":
+        snapshot.add(CATALOG)
+        asyncio.run(snapshot.compact())
+    else:  # compacted rows, a tail, and a compacted product updated into the tail
+        snapshot.add(CATALOG[:4])
+        asyncio.run(snapshot.compact())
+        snapshot.add(CATALOG[4:])
+        snapshot.add([product("dal", 95, "food", age_minutes=1)])
+        snapshot.add([product("dal", 90, "food", age_minutes=1)])
+    return snapshot
+
+@pytest.fixture(params=["tail", "compacted", "mixed"])
+def snapshot(request):
+    return build(request.param)
+
+def everything(snapshot, **kwargs):
+    ids, total, facets = snapshot.browse(limit=100, **kwargs)
+    assert len(ids) == total
+    return ids, facets
+
+def test_no_filters_returns_every_product(snapshot):
+    ids, facets = everything(snapshot)
+    assert sorted(ids) == sorted(p["id"] for p in CATALOG)
+    assert facets == {
+        "categories": {"food": 3, "electronics": 2, "beauty": 1},
+        "in_stock": 4,
+        "discounted": 4,
+        "price": {"min": 40, "max": 9000},
+    }
+
+def test_filters_combine(snapshot):
+    assert sorted(everything(snapshot, categories=["food", "beauty"])[0]) == ["dal", "oil", "rice", "soap"]
+    assert sorted(everything(snapshot, min_price=100, max_price=200)[0]) == ["cable", "oil", "rice"]
+    assert sorted(everything(snapshot, in_stock=False)[0]) == ["cable", "oil"]
+    assert sorted(everything(snapshot, min_discount=20)[0]) == ["oil", "rice", "soap"]
+    assert everything(snapshot, categories=["food"], in_stock=True, min_discount=1)[0] == ["rice"]
+
+def test_unknown_categories_match_nothing(snapshot):
+    ids, total, facets = snapshot.browse(categories=["toys"])
+    assert (ids, total) == ([], 0)
+    assert facets["price"] is None
+
+def test_category_facets_ignore_the_category_filter(snapshot):
+    _, facets = everything(snapshot, categories=["beauty"], max_price=200)
+    assert facets["categories"] == {"food": 3, "electronics": 1, "beauty": 1}
+    assert facets["price"] == {"min": 40, "max": 40}
+    assert facets["in_stock"] == 1
+
+@pytest.mark.parametrize("sort, expected", [
+    ("price_asc", ["soap", "dal", "rice", "cable", "oil", "phone"]),
+    ("price_desc", ["phone", "oil", "cable", "rice", "dal", "soap"]),
+    ("newest", ["dal", "phone", "rice", "soap", "oil", "cable"]),  # undated last
+])
+def test_sorts(snapshot, sort, expected):
+    assert everything(snapshot, sort=sort)[0] == expected
+
+def test_discount_sort_puts_the_biggest_discount_first(snapshot):
+    ids = everything(snapshot, sort="discount")[0]
+    assert ids[0] == "oil"
+    assert set(ids[1:3]) == {"rice", "soap"}
+    assert ids[3] == "phone"
+
+def test_pages_tile_the_sorted_results(snapshot):
+    pages = [snapshot.browse(sort="price_asc", offset=offset, limit=4)[0] for offset in (0, 4)]
+    assert pages == [["soap", "dal", "rice", "cable"], ["oil", "phone"]]
+
+def test_updates_replace_the_earlier_values():
+    snapshot = build("compacted")
+    snapshot.add([product("soap", 500, "food")])
+    ids, facets = everything(snapshot, categories=["beauty"])
+    assert ids == []
+    assert facets["categories"] == {"food": 4, "electronics": 2}
+    assert everything(snapshot, sort="price_desc", categories=["food"])[0][0] == "soap"
+    asyncio.run(snapshot.compact())
+    assert everything(snapshot, categories=["food"], min_price=500)[0] == ["soap"]
+    assert len(snapshot) == len(CATALOG)
+
+def test_random_catalog_matches_brute_force():
+    rng = random.Random(11)
+    catalog = {}
+
+    def random_product(i, categories="abcd"):
+        price = rng.randint(1, 3000)
+        return product(f"p{i}", price, rng.choice(categories),
+                       original_price=price + rng.randint(1, 500) if rng.random() < 0.5 else None,
+                       in_stock=rng.random() < 0.7,
+                       age_minutes=rng.randint(0, 500) if rng.random() < 0.9 else None)
+
+    snapshot = CatalogSnapshot()
+    def add(products):
+        catalog.update((p["id"], p) for p in products)
+        snapshot.add(products)
+    add([random_product(i) for i in range(600)])
+    asyncio.run(snapshot.compact())
+    add([random_product(i) for i in range(600, 700)] + [random_product(i, "e") for i in (3, 50, 650)])
+
+    def discount(p):
+        original = p["original_price"] or 0
+        return 100 * (original - p["price"]) / original if original > p["price"] else 0
+
+    for _ in range(100):
+        filters = {}
+        if rng.random() < 0.5:
+            filters["categories"] = rng.sample("abcdez", rng.randint(1, 3))
+        if rng.random() < 0.4:
+            filters["min_price"] = rng.randint(0, 1500)
+        if rng.random() < 0.4:
+            filters["max_price"] = rng.randint(1000, 3500)
+        if rng.random() < 0.4:
+            filters["in_stock"] = rng.random() < 0.5
+        if rng.random() < 0.3:
+            filters["min_discount"] = rng.choice([5, 20])
+        sort = rng.choice([None, "price_asc", "price_desc"])
+
+        def matches(p, by_category=True):
+            return ((not by_category or "categories" not in filters or p["category"] in filters["categories"])
+                    and p["price"] >= filters.get("min_price", 0)
+                    and p["price"] <= filters.get("max_price", 10 ** 9)
+                    and ("in_stock" not in filters or p["in_stock"] == filters["in_stock"])
+                    and discount(p) >= filters.get("min_discount", 0) - 1e-3)
+
+        expected = [p for p in catalog.values() if matches(p)]
+        ids, total, facets = snapshot.browse(**filters, sort=sort, limit=1000)
+        assert total == len(expected)
+        assert sorted(ids) == sorted(p["id"] for p in expected)
+        if sort:
+            prices = [catalog[i]["price"] for i in ids]
+            assert prices == sorted(prices, reverse=sort == "price_desc")
+        counts = {}
+        for p in catalog.values():
+            if matches(p, by_category=False):
+                counts[p["category"]] = counts.get(p["category"], 0) + 1
+        assert facets["categories"] == counts
+        assert facets["in_stock"] == sum(p["in_stock"] for p in expected)
@@ -0,0 +1,42 @@
+import pytest
+from metrics import Histogram
+
+def histogram(*values, bounds=(1.0, 2.0, 4.0)):
+    result = Histogram(bounds)
+    for value in values:
+        result.observe(value)
+    return result
+
+def test_empty_histogram_reports_zero():
+    assert histogram().quantile(0.5) == 0.0
+
+def test_values_on_a_bound_fall_in_that_bucket():
+    assert histogram(1.0, 2.0, 4.0, 5.0).counts == [1, 1, 1, 1]
+
+def test_quantiles_interpolate_inside_the_bucket():
+    h = histogram(*[1.5] * 10)  # all in (1, 2]
+    assert h.quantile(0.5) == pytest.approx(1.5)
+    assert h.quantile(0.9) == pytest.approx(1.9)
+    assert h.quantile(1.0) == pytest.approx(2.0)
+
+def test_quantiles_walk_across_buckets():
+    h = histogram(*[0.5] * 50, *[3.0] * 50)
+    assert h.quantile(0.25) == pytest.approx(0.5)
+    assert h.quantile(0.5) == pytest.approx(1.0)
+    assert h.quantile(0.75) == pytest.approx(3.0)
+    assert h.quantile(0.99) == pytest.approx(3.96)
+
+def test_empty_buckets_are_skipped():
+    h = histogram(0.5, 3.5)
+    assert h.quantile(0.5) == pytest.approx(1.0)
+    assert h.quantile(0.75) == pytest.approx(3.0)
+
+def test_overflow_is_capped_at_the_last_bound():
+    h = histogram(10.0, 20.0)
+    assert h.quantile(0.5) == 4.0
+    assert h.quantile(0.99) == 4.0
+
+def test_count_and_sum_track_observations():
+    h = histogram(0.5, 1.5, 100.0)
+    assert h.count == 3
+    assert h.sum == pytest.approx(102.0)
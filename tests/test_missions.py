@@ -0,0 +1,49 @@
+from datetime import datetime
+from services.missions import plan_updates
+
+PRODUCTS = {
+    "p1": {"id": "p1", "name": "Lays Classic Chips", "category": "snacks"},
+    "p2": {"id": "p2", "name": "Lays Masala Chips", "category": "snacks"},
+    "p3": {"id": "p3", "name": "Dove Soap", "category": "beauty", "brand": "Dove"},
+    "p4": {"id": "p4", "name": "", "category": "home"},
+}
+MISSIONS = {"snacks": ["m-snack"], "brands": ["m-brand-1", "m-brand-2"], "categories": ["m-cat"]}
+EARLY, LATE = datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 10)
+
+def test_one_upsert_per_user_covers_every_event_in_the_batch():
+    updates = plan_updates([("u1", ["p1"], LATE), ("u1", ["p2", "p3"], EARLY)], PRODUCTS, {}, MISSIONS)
+    assert list(updates) == ["u1"]
+    update = updates["u1"]
+    assert update._upsert
+    assert update._doc["$addToSet"] == {
+        "seen.snacks": {"$each": ["p1", "p2"]},
+        "seen.brands": {"$each": ["dove", "lays"]},
+        "seen.categories": {"$each": ["beauty", "snacks"]},
+    }
+    assert update._doc["$inc"] == {
+        "progress.m-snack": 2, "progress.m-brand-1": 2, "progress.m-brand-2": 2, "progress.m-cat": 2,
+    }
+    assert update._doc["$min"] == {"first_activity_at": EARLY}
+
+def test_values_already_seen_are_not_counted_again():
+    seen = {"u1": {"snacks": ["p1"], "brands": ["lays"], "categories": ["snacks", "beauty"]}}
+    update = plan_updates([("u1", ["p1", "p2", "p3"], EARLY)], PRODUCTS, seen, MISSIONS)["u1"]
+    assert update._doc["$addToSet"] == {"seen.snacks": {"$each": ["p2"]}, "seen.brands": {"$each": ["dove"]}}
+    assert "progress.m-cat" not in update._doc["$inc"]
+    assert update._filter == {
+        "user_id": "u1", "seen.snacks": {"$nin": ["p2"]}, "seen.brands": {"$nin": ["dove"]},
+    }
+
+def test_users_with_nothing_new_get_no_write():
+    seen = {"u1": {"snacks": ["p1"], "brands": ["lays"], "categories": ["snacks"]}}
+    assert plan_updates([("u1", ["p1"], EARLY)], PRODUCTS, seen, MISSIONS) == {}
+
+def test_unknown_products_and_empty_names_are_skipped():
+    updates = plan_updates([("u1", ["missing"], EARLY), ("u2", ["p4"], EARLY)], PRODUCTS, {}, MISSIONS)
+    assert list(updates) == ["u2"]
+    assert updates["u2"]._doc["$addToSet"] == {"seen.categories": {"$each": ["home"]}}
+
+def test_progress_is_tracked_even_without_active_missions():
+    update = plan_updates([("u1", ["p1"], EARLY)], PRODUCTS, {}, {})["u1"]
+    assert "$inc" not in update._doc
+    assert update._doc["$addToSet"]["seen.snacks"] == {"$each": ["p1"]}
@@ -0,0 +1,69 @@
+from datetime import datetime
+import pytest
+from services.recommender import CoPurchaseRecommender
+
+BASKETS = [
+    ["milk", "bread", "eggs"],
+    ["milk", "bread"],
+    ["milk", "bread"],
+    ["milk", "cereal"],
+    ["beer", "chips"],
+]
+
+def model(baskets=BASKETS, **kwargs):
+    recommender = CoPurchaseRecommender(**kwargs)
+    recommender.add_baskets(baskets)
+    return recommender
+
+def test_recommends_what_is_bought_together_best_first():
+    recommendations = model().recommend(["milk"], k=10)
+    assert [product_id for product_id, _ in recommendations] == ["bread", "eggs", "cereal"]
+    assert recommendations[0][1] == pytest.approx(3 / 3 ** 0.5)
+
+def test_never_recommends_the_query_items_or_unrelated_products():
+    products = [product_id for product_id, _ in model().recommend(["milk", "bread"], k=10)]
+    assert "milk" not in products and "bread" not in products
+    assert "beer" not in products and "chips" not in products
+
+def test_scores_sum_over_query_items():
+    recommender = model()
+    single = dict(recommender.recommend(["bread"], k=10))
+    combined = dict(recommender.recommend(["bread", "cereal"], k=10))
+    assert combined["milk"] == pytest.approx(single["milk"] * 4 / 3)
+
+def test_k_caps_results():
+    assert len(model().recommend(["milk"], k=2)) == 2
+
+def test_unknown_products_get_nothing():
+    assert model().recommend(["caviar"]) == []
+
+def test_pending_pairs_match_merged_results():
+    pending = model(merge_threshold=10 ** 9)
+    assert pending._pending
+    merged = model(merge_threshold=10 ** 9)
+    merged.merge()
+    assert not merged._pending
+    assert pending.recommend(["milk"], k=10) == merged.recommend(["milk"], k=10)
+
+def test_incremental_baskets_add_to_merged_counts():
+    recommender = model()
+    recommender.merge()
+    recommender.add_baskets([["cereal", "bread"], ["cereal", "bread"]])
+    assert recommender.recommend(["cereal"], k=1)[0][0] == "bread"
+    assert recommender.baskets == len(BASKETS) + 2
+
+def test_duplicates_in_a_basket_count_once_and_long_baskets_are_trimmed():
+    recommender = model([["a", "a", "b"], ["c", "d", "e"]], max_basket=2)
+    assert recommender.recommend(["a"]) == [("b", pytest.approx(1.0))]
+    assert [product_id for product_id, _ in recommender.recommend(["c"])] == ["d"]
+
+def test_watermark_is_millisecond_truncated_and_remembers_its_orders():
+    recommender = CoPurchaseRecommender()
+    recommender._advance_watermark({"id": "o1", "created_at": datetime(2026, 1, 1, 0, 0, 0, 123456)})
+    recommender._advance_watermark({"id": "o2", "created_at": datetime(2026, 1, 1, 0, 0, 0, 123999)})
+    assert recommender.watermark == datetime(2026, 1, 1, 0, 0, 0, 123000)
+    assert recommender._at_watermark == {"o1", "o2"}
+    recommender._advance_watermark({"id": "o3", "created_at": datetime(2026, 1, 1, 0, 0, 1)})
+    assert recommender._at_watermark == {"o3"}
+    recommender._advance_watermark({"id": "o0", "created_at": datetime(2025, 1, 1)})
+    assert recommender.watermark == datetime(2026, 1, 1, 0, 0, 1)
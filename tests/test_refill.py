@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+import pandas as pd
+from services.refill import days_left, discount_label, predict_refills
+
+NOW = datetime(2026, 3, 1, 12, 0)
+
+def purchases(*rows):
+    frame = pd.DataFrame(rows, columns=["user_id", "product_id", "purchased_at"])
+    frame["product_name"] = frame["product_id"].str.title()
+    frame["image"] = ""
+    frame["price"] = 200.0
+    frame["purchased_at"] = pd.to_datetime(frame["purchased_at"])
+    return frame
+
+def prediction(result, user_id, product_id):
+    rows = result[(result["user_id"] == user_id) & (result["product_id"] == product_id)]
+    assert len(rows) == 1
+    return rows.iloc[0]
+
+def test_interval_is_the_median_gap_and_due_date_follows_the_last_purchase():
+    result = predict_refills(purchases(
+        ("u1", "milk", NOW - timedelta(days=30)),
+        ("u1", "milk", NOW - timedelta(days=23)),
+        ("u1", "milk", NOW - timedelta(days=13)),
+        ("u1", "milk", NOW - timedelta(days=6)),
+    ), NOW)
+    row = prediction(result, "u1", "milk")
+    assert row["purchases"] == 4
+    assert row["interval"] == pd.Timedelta(days=7)
+    assert row["due_at"] == pd.Timestamp(NOW + timedelta(days=1))
+    assert row["days_left"] == 1
+    assert row["active"]
+
+def test_single_purchases_and_same_day_repeats_are_not_cycles():
+    result = predict_refills(purchases(
+        ("u1", "soap", NOW - timedelta(days=10)),
+        ("u1", "rice", NOW - timedelta(days=5, hours=3)),
+        ("u1", "rice", NOW - timedelta(days=5)),
+    ), NOW)
+    assert result.empty
+
+def test_duplicate_lines_collapse_into_one_purchase():
+    stamp = NOW - timedelta(days=4)
+    result = predict_refills(purchases(
+        ("u1", "tea", NOW - timedelta(days=8)), ("u1", "tea", stamp), ("u1", "tea", stamp),
+    ), NOW)
+    assert prediction(result, "u1", "tea")["purchases"] == 2
+
+def test_users_are_predicted_independently():
+    result = predict_refills(purchases(
+        ("u1", "milk", NOW - timedelta(days=4)), ("u1", "milk", NOW - timedelta(days=2)),
+        ("u2", "milk", NOW - timedelta(days=20)), ("u2", "milk", NOW - timedelta(days=10)),
+    ), NOW)
+    assert prediction(result, "u1", "milk")["interval"] == pd.Timedelta(days=2)
+    assert prediction(result, "u2", "milk")["days_left"] == 0
+
+def test_overdue_by_a_whole_cycle_is_inactive():
+    result = predict_refills(purchases(
+        ("u1", "oil", NOW - timedelta(days=40)),
+        ("u1", "oil", NOW - timedelta(days=30)),
+        ("u2", "oil", NOW - timedelta(days=25)),
+        ("u2", "oil", NOW - timedelta(days=15)),
+    ), NOW)
+    assert not prediction(result, "u1", "oil")["active"]  # due 20 days ago, cycle is 10
+    assert prediction(result, "u2", "oil")["active"]  # due 5 days ago
+    assert prediction(result, "u2", "oil")["days_left"] == 0
+
+def test_discount_is_five_percent_rounded_to_ten_with_a_floor():
+    labels = discount_label(pd.Series([1000.0, 50.0, None, 1290.0]))
+    assert list(labels) == ["₹50 Off", "₹10 Off", "₹10 Off", "₹60 Off"]
+
+def test_days_left_counts_from_now():
+    assert days_left(NOW + timedelta(days=2, hours=1), 9, NOW) == 3
+    assert days_left(NOW - timedelta(days=1), 9, NOW) == 0
+    assert days_left(None, 9, NOW) == 9
@@ -0,0 +1,47 @@
+from collections import Counter
+import random
+import pytest
+from models import RouletteConfig, RouletteReward
+from services.roulette import DEFAULT_REWARDS, AliasTable, RouletteWheel
+
+def implied_distribution(table):
+    """Exact probability of each outcome encoded by the table"""
+    n = len(table.probability)
+    mass = [0.0] * n
+    for column, probability in enumerate(table.probability):
+        mass[column] += probability / n
+        mass[table.alias[column]] += (1 - probability) / n
+    return mass
+
+@pytest.mark.parametrize("weights", [
+    [1, 1, 1, 1],
+    [15, 20, 10, 15, 5, 10, 10, 15],
+    [0.1, 1000, 3],
+    [7],
+])
+def test_table_encodes_the_weights_exactly(weights):
+    total = sum(weights)
+    assert implied_distribution(AliasTable(weights)) == pytest.approx([w / total for w in weights])
+
+def test_sampling_follows_the_weights():
+    weights = [reward.weight for reward in DEFAULT_REWARDS]
+    table = AliasTable(weights)
+    rng = random.Random(3)
+    draws = Counter(table.sample(rng) for _ in range(100000))
+    for index, weight in enumerate(weights):
+        assert draws[index] / 100000 == pytest.approx(weight / sum(weights), abs=0.01)
+
+def test_samples_stay_in_range():
+    table = AliasTable([1, 2, 3])
+    rng = random.Random(0)
+    assert {table.sample(rng) for _ in range(1000)} == {0, 1, 2}
+
+def test_wheel_rebuilds_its_table_only_when_the_version_changes():
+    wheel = RouletteWheel()
+    table = wheel._table
+    wheel._install(RouletteConfig(rewards=DEFAULT_REWARDS, version=0))
+    assert wheel._table is table and wheel.rebuilds == 0
+    rewards = [RouletteReward(label="Only Prize", weight=1)]
+    wheel._install(RouletteConfig(rewards=rewards, version=1))
+    assert wheel.rebuilds == 1
+    assert wheel._table.probability == [1.0]
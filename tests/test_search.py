@@ -0,0 +1,64 @@
+import pytest
+from services.search import ProductSearchIndex, edit_distance
+
+def product(product_id, name, category="grocery", description=""):
+    return {"id": product_id, "name": name, "category": category, "description": description, "price": 100}
+
+def index_of(*products):
+    index = ProductSearchIndex()
+    index.add_many(products)
+    return index
+
+def ids(results):
+    return [summary["id"] for summary, _ in results]
+
+def test_name_match_outranks_description_match():
+    index = index_of(
+        product("p1", "Steel Bottle", description="keeps coffee hot"),
+        product("p2", "Coffee Beans", description="dark roast"),
+        product("p3", "Green Tea"),
+    )
+    assert ids(index.search("coffee")) == ["p2", "p1"]
+
+def test_documents_matching_more_terms_rank_first():
+    index = index_of(
+        product("p1", "Organic Rice"),
+        product("p2", "Organic Basmati Rice"),
+        product("p3", "Basmati Flour"),
+    )
+    results = index.search("organic basmati rice")
+    assert ids(results)[0] == "p2"
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+def test_typos_match_through_trigrams_at_a_penalty():
+    index = index_of(product("p1", "Wireless Headphones"), product("p2", "Headphone Stand"))
+    # One edit from "headphones", two from "headphone"
+    assert ids(index.search("headphnes")) == ["p1", "p2"]
+    exact = index.search("headphones")[0][1]
+    typo = index.search("headphnes")[0][1]
+    assert typo == pytest.approx(exact * ProductSearchIndex.typo_penalty)
+
+def test_short_terms_need_an_exact_match():
+    index = index_of(product("p1", "Soap Bar"))
+    assert index.search("sop") == []
+
+def test_limit_caps_results():
+    index = index_of(*(product(f"p{i}", f"Rice Pack {i}") for i in range(30)))
+    assert len(index.search("rice", limit=5)) == 5
+
+def test_re_adding_an_id_replaces_the_earlier_version():
+    index = index_of(product("p1", "Apple Juice"), product("p2", "Apple Pie"))
+    index.add(product("p1", "Orange Juice"))
+    assert len(index) == 2
+    assert ids(index.search("apple")) == ["p2"]
+    assert ids(index.search("orange")) == ["p1"]
+    assert index.search("orange")[0][0]["name"] == "Orange Juice"
+
+def test_accents_fold_to_ascii():
+    index = index_of(product("p1", "Crème Brûlée"))
+    assert ids(index.search("creme brulee")) == ["p1"]
+
+def test_edit_distance_gives_up_past_the_limit():
+    assert edit_distance("kitten", "sitting", 3) == 3
+    assert edit_distance("kitten", "sitting", 1) == 2
@@ -0,0 +1,77 @@
+import numpy as np
+from services.trending import LocationCounters
+
+FLAT = np.ones(4, dtype=np.float32)
+
+def test_top_orders_by_count_within_the_window():
+    counters = LocationCounters(buckets=4)
+    counters.add("a", 10, 1.0)
+    counters.add("b", 10, 3.0)
+    counters.add("c", 11, 2.0)
+    assert counters.top(FLAT, 10) == ["b", "c", "a"]
+    assert counters.top(FLAT, 2) == ["b", "c"]
+
+def test_decay_weighs_recent_buckets_higher():
+    counters = LocationCounters(buckets=4)
+    counters.add("old", 10, 3.0)
+    counters.add("new", 12, 1.0)
+    halving = np.array([1.0, 0.5, 0.25, 0.125], dtype=np.float32)
+    assert counters.top(halving, 2) == ["new", "old"]  # 3 * 0.25 < 1
+    assert counters.top(FLAT, 2) == ["old", "new"]
+
+def test_advance_clears_buckets_that_leave_the_window():
+    counters = LocationCounters(buckets=4)
+    counters.add("a", 10, 1.0)
+    counters.add("b", 12, 1.0)
+    counters.advance(13)
+    assert counters.top(FLAT, 10) == ["a", "b"]
+    counters.advance(14)  # bucket 10 is now five buckets old
+    assert counters.top(FLAT, 10) == ["b"]
+
+def test_advancing_past_the_whole_window_clears_everything():
+    counters = LocationCounters(buckets=4)
+    counters.add("a", 10, 1.0)
+    counters.advance(100)
+    assert counters.top(FLAT, 10) == []
+    assert counters.epoch == 100
+
+def test_events_older_than_the_window_are_dropped():
+    counters = LocationCounters(buckets=4)
+    counters.add("a", 20, 1.0)
+    counters.add("late", 16, 5.0)
+    counters.add("edge", 17, 1.0)
+    assert counters.top(FLAT, 10) == ["a", "edge"]
+
+def test_rotation_never_moves_the_newest_epoch_back():
+    counters = LocationCounters(buckets=4)
+    counters.add("a", 20, 1.0)
+    counters.add("b", 19, 1.0)
+    assert counters.epoch == 20
+    assert sorted(counters.top(FLAT, 10)) == ["a", "b"]
+
+def test_compact_drops_idle_products_and_keeps_counts():
+    counters = LocationCounters(buckets=4)
+    for i in range(100):
+        counters.add(f"p{i}", 10, 1.0)
+    counters.add("keep", 12, 2.0)
+    counters.add("p7", 13, 1.0)
+    counters.advance(14)  # bucket 10 rolls out
+    counters.compact()
+    assert counters.products == ["p7", "keep"]
+    assert counters.columns == {"p7": 0, "keep": 1}
+    assert counters.counts.shape == (4, 64)
+    assert counters.top(FLAT, 10) == ["keep", "p7"]
+
+def test_compact_is_a_no_op_when_every_product_is_live():
+    counters = LocationCounters(buckets=4)
+    counters.add("a", 10, 1.0)
+    counts = counters.counts
+    counters.compact()
+    assert counters.counts is counts
+
+def test_columns_grow_past_the_initial_capacity():
+    counters = LocationCounters(buckets=2)
+    for i in range(200):
+        counters.add(f"p{i}", 1, float(i))
+    assert counters.counts.shape[1] >= 200
+    assert counters.top(np.ones(2, dtype=np.float32), 3) == ["p199", "p198", "p197"]
@@ -0,0 +1,95 @@
+import asyncio
+import numpy as np
+import pytest
+from services.vector_index import VectorIndex
+
+DIM = 16
+
+def random_index(count, seed=0, **kwargs):
+    rng = np.random.default_rng(seed)
+    index = VectorIndex(dim=DIM, **kwargs)
+    index.add([f"p{i}" for i in range(count)], rng.standard_normal((count, DIM)))
+    return index, rng
+
+def brute_force(index, query, k):
+    vectors = index._vectors(np.arange(len(index)))
+    scores = vectors @ (query / np.linalg.norm(query))
+    return [f"p{i}" for i in np.argsort(-scores)[:k]]
+
+def test_exact_search_returns_the_nearest_rows_best_first():
+    index, rng = random_index(500)
+    query = rng.standard_normal(DIM)
+    results = index.search(query, k=5)[0]
+    assert [product_id for product_id, _ in results] == brute_force(index, query, 5)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+def test_a_stored_vector_is_its_own_best_match():
+    index, _ = random_index(200)
+    product_id, score = index.search(index._vectors(np.array([42]))[0], k=1)[0][0]
+    assert product_id == "p42"
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+def test_ivf_probing_every_list_matches_exact_search():
+    index, rng = random_index(900, ivf_threshold=100)
+    queries = rng.standard_normal((5, DIM))
+    exact = index.search(queries, k=10)
+    assert index.needs_ivf
+    index.rebuild_ivf()
+    index.nprobe = len(index._ivf[0])
+    assert [[p for p, _ in row] for row in index.search(queries, k=10)] == [[p for p, _ in row] for row in exact]
+
+def test_ivf_scans_rows_added_after_the_build():
+    index, rng = random_index(900, ivf_threshold=100, nprobe=1)
+    index.rebuild_ivf()
+    late = rng.standard_normal(DIM)
+    index.add(["late"], late[None, :])
+    assert not index.needs_ivf
+    assert index.search(late, k=1)[0][0][0] == "late"
+
+def test_re_adding_an_id_replaces_its_vector():
+    index, rng = random_index(50)
+    replacement = rng.standard_normal(DIM)
+    index.add(["p3"], replacement[None, :])
+    assert len(index) == 50
+    assert index.search(replacement, k=1)[0][0][0] == "p3"
+
+def test_persist_and_load_round_trip(tmp_path):
+    path = tmp_path / "vectors.npy"
+    index, rng = random_index(300, path=path)
+    asyncio.run(index.persist())
+    assert not index.dirty
+    queries = rng.standard_normal((3, DIM))
+
+    loaded = VectorIndex(path=path, dim=DIM)
+    assert loaded.load()
+    assert len(loaded) == 300 and "p299" in loaded
+    for before, after in zip(index.search(queries, k=5), loaded.search(queries, k=5)):
+        assert [p for p, _ in after] == [p for p, _ in before]
+        assert [score for _, score in after] == pytest.approx([score for _, score in before])
+
+def test_rows_added_after_persist_live_in_the_tail(tmp_path):
+    path = tmp_path / "vectors.npy"
+    index, rng = random_index(100, path=path)
+    asyncio.run(index.persist())
+    extra = rng.standard_normal(DIM)
+    index.add(["new"], extra[None, :])
+    assert index.search(extra, k=1)[0][0][0] == "new"
+    asyncio.run(index.persist())
+
+    loaded = VectorIndex(path=path, dim=DIM)
+    assert loaded.load()
+    assert len(loaded) == 101
+    assert loaded.search(extra, k=1)[0][0][0] == "new"
+
+def test_load_ignores_a_file_of_another_width(tmp_path):
+    path = tmp_path / "vectors.npy"
+    index, _ = random_index(10, path=path)
+    asyncio.run(index.persist())
+    assert not VectorIndex(path=path, dim=DIM * 2).load()
+
+def test_without_a_path_nothing_is_written(tmp_path):
+    index, _ = random_index(10)
+    asyncio.run(index.persist())
+    assert index.dirty
+    assert not index.load()